@@ -1,13 +1,17 @@
 import json
 import os
 import logging
+import click
 from flask import Flask, render_template, jsonify
 from werkzeug.middleware.proxy_fix import ProxyFix
-from app.utils.db import init_db, get_db
 from dotenv import load_dotenv
 
+# Load .env before importing app.utils: several modules read their settings at import time
 load_dotenv()
 
+from app.utils.db import init_db, get_db, migrate_on_startup
+from app.utils.config_registry import config_registry
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +32,9 @@ flask_config["ARANGO_USERNAME"] = os.environ.get("ARANGO_USERNAME", flask_config
 flask_config["ARANGO_PASSWORD"] = os.environ.get("ARANGO_ROOT_PASSWORD", flask_config.get("ARANGO_PASSWORD", "examplepassword"))
 flask_config["ARANGO_DB"] = os.environ.get("ARANGO_DB", flask_config.get("ARANGO_DB", "test"))
 
+# Apply schema migrations when a worker or a command starts (disable to run them with `flask migrate` instead)
+flask_config["RUN_MIGRATIONS_ON_STARTUP"] = os.environ.get("RUN_MIGRATIONS_ON_STARTUP", "true").lower() in ("true", "1", "yes")
+
 # Software Viz configuration
 flask_config["SW_VIZ_URL"] = os.environ.get("SW_VIZ_URL", "")
 flask_config["SW_VIZ_TOKEN"] = os.environ.get("SW_VIZ_TOKEN", "")
@@ -36,13 +43,16 @@ app = Flask(__name__, template_folder="templates", static_folder="static")
 
 app.config.update(flask_config)
 
+# Provider settings (inbox URLs, tokens, rate limits) are reloaded from .env on change or on `kill -HUP`
+config_registry.install_sighup_handler()
+
 # Configure ProxyFix for reverse proxy
 app.wsgi_app = ProxyFix(
     app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1
 )
 
 # Import routes after app creation to avoid circular imports
-from app.routes import api_software, api_documents, coar_inbox, api_status
+from app.routes import api_software, api_documents, api_outbox, coar_inbox, api_status
 
 db_manager = init_db(app)
 
@@ -56,6 +66,113 @@ except Exception as e:
     print(f"ArangoDB info: failed to fetch info: {e}")
 
 
+def start_command():
+    """Apply the migrations a worker applies when it starts, before a command uses the stored data."""
+    if app.config["RUN_MIGRATIONS_ON_STARTUP"]:
+        migrate_on_startup(get_db())
+
+
+@app.cli.command("migrate")
+def migrate():
+    """Apply pending database schema migrations, including the offline ones."""
+    from app.utils.migrations import run_migrations
+    result = run_migrations(get_db())
+    print(f"Schema version {result['from_version']} -> {result['to_version']} "
+          f"(applied: {result['applied'] or 'none'})")
+
+
+@app.cli.command("remove-duplicate-documents")
+@click.option("--apply", "apply_removal", is_flag=True, help="Remove the copies instead of only listing them.")
+def remove_duplicate_documents(apply_removal):
+    """List the documents stored several times under one HAL id, and remove the extra copies."""
+    from app.utils import migrations
+    duplicates = migrations.find_duplicate_documents(get_db())
+    for group in duplicates:
+        copies = ", ".join(f"{copy['key']} ({copy['mentions']} mentions)" for copy in group["remove"])
+        if group["hal_id"] is None:
+            print(f"No file_hal_id, fix by hand: {copies}")
+        else:
+            print(f"{group['hal_id']}: keep {group['keep']}, remove {copies}")
+    if not duplicates:
+        print("No duplicate documents")
+    elif apply_removal:
+        print(f"Removed {migrations.remove_duplicate_documents(get_db(), duplicates)} duplicate documents")
+    else:
+        print("Nothing removed, run again with --apply to remove the copies listed above")
+
+
+@app.cli.command("dispatch-outbox")
+@click.option("--batch-size", default=None, type=int, help="Entries claimed per round.")
+@click.option("--poll-interval", default=None, type=float, help="Seconds to wait when nothing is due.")
+@click.option("--once", is_flag=True, help="Exit once the outbox has nothing due.")
+def dispatch_outbox(batch_size, poll_interval, once):
+    """Send the notifications queued in the outbox."""
+    from app.utils.outbox import run_dispatcher, DISPATCH_BATCH_SIZE, DISPATCH_POLL_INTERVAL_SECONDS
+    start_command()
+    run_dispatcher(batch_size or DISPATCH_BATCH_SIZE, poll_interval or DISPATCH_POLL_INTERVAL_SECONDS, once)
+
+
+@app.cli.command("consume-inbox")
+@click.option("--batch-size", default=None, type=int, help="Entries claimed per round.")
+@click.option("--poll-interval", default=None, type=float, help="Seconds to wait when nothing is due.")
+@click.option("--once", is_flag=True, help="Exit once nothing is due.")
+def consume_inbox(batch_size, poll_interval, once):
+    """Process the notifications received by the inbox."""
+    from app.utils.inbox import run_consumer, CONSUMER_BATCH_SIZE, CONSUMER_POLL_INTERVAL_SECONDS
+    start_command()
+    run_consumer(batch_size or CONSUMER_BATCH_SIZE, poll_interval or CONSUMER_POLL_INTERVAL_SECONDS, once)
+
+
+@app.cli.command("blacklist-cleanup")
+@click.option("--term", "terms", multiple=True, help="Blacklist entry to apply (repeatable).")
+@click.option("--all", "all_terms", is_flag=True, help="Apply the whole blacklist.")
+@click.option("--mode", type=click.Choice(["remove", "flag"]), default="flag", show_default=True,
+              help="Remove the matching mentions or flag them as blacklisted.")
+@click.option("--resume", is_flag=True, help="Run the pending and abandoned cleanup jobs instead.")
+def blacklist_cleanup(terms, all_terms, mode, resume):
+    """Apply blacklist terms to the software mentions already stored."""
+    from app.utils.blacklist_jobs import create_cleanup_job, get_job, resume_jobs, run_cleanup_job
+    if not resume and not terms and not all_terms:
+        raise click.UsageError("Give the entries to apply with --term, or --all for the whole blacklist")
+    start_command()
+    if resume:
+        print(f"Completed {resume_jobs()} cleanup jobs")
+        return
+    from app.utils.blacklist_manager import blacklist_manager
+    job_key = create_cleanup_job(terms or blacklist_manager.get_blacklist(), mode)
+    run_cleanup_job(job_key)
+    job = get_job(job_key)
+    print(f"Job {job_key} {job['status']}: {job['progress']}")
+
+
+@app.cli.command("blacklist-check")
+def blacklist_check():
+    """Check that the short blacklist entries only match themselves."""
+    from app.utils.blacklist_manager import blacklist_manager
+    from app.utils.blacklist_matcher import find_short_entry_collisions
+    collisions = find_short_entry_collisions(blacklist_manager.get_blacklist())
+    for term, names in sorted(collisions.items()):
+        print(f"'{term}' also matches {', '.join(repr(name) for name in names)}")
+    if collisions:
+        raise SystemExit(1)
+    print("No blacklist collisions")
+
+
+@app.cli.command("rebuild-software-entities")
+def rebuild_software_entities():
+    """Recompute the software entity counters from the stored mentions."""
+    start_command()
+    print(f"Rebuilt {get_db().rebuild_software_entities()} software entities")
+
+
+@app.cli.command("rebuild-stats")
+def rebuild_stats():
+    """Recompute the statistics counters from the stored data."""
+    start_command()
+    for name, value in sorted(get_db().rebuild_stats().items()):
+        print(f"{name}: {value}")
+
+
 @app.get("/")
 def home():
     try:
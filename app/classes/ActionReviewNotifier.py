@@ -1,6 +1,7 @@
 import requests
 import uuid
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,40 @@ class ActionReviewSoftware:
         return self._payload
 
 
+@lru_cache(maxsize=32)
+def _payload_template(actor_id, actor_name, origin_inbox, target_id, target_inbox) -> dict:
+    """
+    Build the part of the payload that is the same for every notification to a target.
+
+    The template and its nested objects are shared between notifications and never
+    modified: each notification copies the top level and fills in "id" and "object".
+    """
+    return {
+        "@context": [
+            "https://www.w3.org/ns/activitystreams",
+            "https://purl.org/coar/notify"
+        ],
+        "id": None,
+        "type": ['Offer', 'coar-notify:ReviewAction'],
+        "actor": {
+            "id": actor_id,
+            "type": "Service",
+            "name": actor_name,
+        },
+        "origin": {
+            "id": actor_id,
+            "type": "Service",
+            "inbox": origin_inbox,
+        },
+        "target": {
+            "id": target_id,
+            "type": "Service",
+            "inbox": target_inbox,
+        },
+        "object": None,
+    }
+
+
 class ActionReviewNotifier:
 
     # Attribute annotations for static analyzers
@@ -32,48 +67,36 @@ class ActionReviewNotifier:
         target_id,
         target_inbox,
         token=None,
+        session=None,
+        notification_id=None,
     ):
         self.target_inbox = target_inbox
         self.token = token
-
-        # Generate a random UUID (version 4) and convert to URN
-        notification_id = uuid.uuid4().urn
-
-        payload = {
-            "@context": [
-                "https://www.w3.org/ns/activitystreams",
-                "https://purl.org/coar/notify"
-            ],
-            "id": notification_id,
-            "type": ['Offer', 'coar-notify:ReviewAction'],
-            "actor": {
-                "id": actor_id,
-                "type": "Service",
-                "name": actor_name,
-            },
-            "origin": {
-                "id": actor_id,
-                "type": "Service",
-                "inbox": origin_inbox,
-            },
-            "target": {
-                "id": target_id,
-                "type": "Service",
-                "inbox": target_inbox,
+        # Optional pooled session shared across notifications to the same inbox
+        self.session = session
+        # Outcome of the last send(), used to decide whether a failure is worth retrying
+        self.last_status_code = None
+        self.last_error = None
+        self.retry_after = None
+
+        # Id given when queued (recorded for reply correlation), otherwise a random UUID URN
+        notification_id = notification_id or uuid.uuid4().urn
+        self.notification_id = notification_id
+
+        payload = dict(_payload_template(actor_id, actor_name, origin_inbox, target_id, target_inbox))
+        payload["id"] = notification_id
+        payload["object"] = {
+            "id": document_id,
+            "ietf:cite-as": None,
+            "sorg:citation": {
+                "@context": "https://doi.org/10.5063/schema/codemeta-2.0",
+                "type": "SoftwareSourceCode",
+                "name": software_name,
+                "codeRepository": software_repo,
+                "referencePublication": None,
             },
-            "object": {
-                "id": document_id,
-                "ietf:cite-as": None,
-                "sorg:citation": {
-                    "@context": "https://doi.org/10.5063/schema/codemeta-2.0",
-                    "type": "SoftwareSourceCode",
-                    "name": software_name,
-                    "codeRepository": software_repo,
-                    "referencePublication": None,
-                },
-                "mentionType": mention_type,
-                "mentionContext": mention_context,
-            }
+            "mentionType": mention_type,
+            "mentionContext": mention_context,
         }
 
         self.notification = ActionReviewSoftware(payload)
@@ -93,19 +116,28 @@ class ActionReviewNotifier:
 
         # Add timeout to prevent hanging
         resp = None
+        self.last_status_code = None
+        self.last_error = None
+        self.retry_after = None
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=20)
+            resp = (self.session or requests).post(url, headers=headers, json=payload, timeout=20)
+            self.last_status_code = resp.status_code
             resp.raise_for_status()
             return resp
         except requests.exceptions.Timeout:
             logger.error(f"Timeout while sending notification to {url}")
+            self.last_error = "timeout"
             return None
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Connection error while sending to {url}: {e}")
+            self.last_error = f"connection error: {e}"
             return None
         except requests.HTTPError:
             logger.error(f"HTTP error: {resp.status_code} - {resp.text}")
+            self.last_error = f"HTTP {resp.status_code}"
+            self.retry_after = resp.headers.get("Retry-After")
             return None
         except Exception as e:
             logger.error(f"Unexpected error while sending notification to {url}: {e}")
+            self.last_error = str(e)
             return None
@@ -1,6 +1,7 @@
 import requests
 import uuid
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,60 @@ class RelationshipAnnounceSoftware:
         return self._payload
 
 
+# Constant parts of the per-document "context" object, shared and never modified
+_CONTEXT_AUTHOR = {
+    "@type": "Person",
+    "givenName": None,
+    "email": None,
+}
+_CONTEXT_ITEM_TYPE = [
+    "Object",
+    "sorg:ScholarlyArticle",
+]
+_CONTEXT_TYPE = [
+    "Page",
+    "sorg:AboutPage",
+]
+
+
+@lru_cache(maxsize=32)
+def _payload_template(actor_id, actor_name, origin_inbox, target_id, target_inbox) -> dict:
+    """
+    Build the part of the payload that is the same for every notification to a target.
+
+    The template and its nested objects are shared between notifications and never
+    modified: each notification copies the top level and fills in "context", "id" and "object".
+    """
+    return {
+        "@context": [
+            "https://www.w3.org/ns/activitystreams",
+            "https://purl.org/coar/notify"
+        ],
+        "actor": {
+            "id": actor_id,
+            "type": "Organization",
+            "name": actor_name,
+        },
+        "context": None,
+        "id": None,
+        "object": None,
+        "origin": {
+            "id": actor_id,
+            "type": "Service",
+            "inbox": origin_inbox,
+        },
+        "target": {
+            "id": target_id,
+            "type": "Service",
+            "inbox": target_inbox,
+        },
+        "type": [
+            "Announce",
+            "coar-notify:RelationshipAction",
+        ],
+    }
+
+
 class RelationshipAnnounceNotifier:
     # Attribute annotations for static analyzers
     notification: RelationshipAnnounceSoftware
@@ -28,67 +83,42 @@ class RelationshipAnnounceNotifier:
             target_id,
             target_inbox,
             token=None,
+            session=None,
+            notification_id=None,
     ):
         self.target_inbox = target_inbox
         self.token = token
+        # Optional pooled session shared across notifications to the same inbox
+        self.session = session
+        # Outcome of the last send(), used to decide whether a failure is worth retrying
+        self.last_status_code = None
+        self.last_error = None
+        self.retry_after = None
 
-        # Generate a random UUID (version 4) and convert to URN
-        notification_id = uuid.uuid4().urn
-
-        payload = {
-            "@context": [
-                "https://www.w3.org/ns/activitystreams",
-                "https://purl.org/coar/notify"
-            ],
-            "actor": {
-                "id": actor_id,
-                "type": "Organization",
-                "name": actor_name,
-            },
-            "context": {
-                "id": f"https://hal.science/{document_id}",
-                "sorg:name": None,
-                "sorg:author": {
-                    "@type": "Person",
-                    "givenName": None,
-                    "email": None,
-                },
-                "ietf:cite-as": "https://doi.org/XXX/YYY",
-                "ietf:item": {
-                    "id": f"https://hal.science/{document_id}/document",
-                    "mediaType": "application/pdf",
-                    "type": [
-                        "Object",
-                        "sorg:ScholarlyArticle",
-                    ],
-                },
-                "type": [
-                    "Page",
-                    "sorg:AboutPage",
-                ],
-            },
-            "id": notification_id,
-            "object": {
-                "as:object": f"https://hal.science/{document_id}",
-                "as:relationship": "https://w3id.org/codemeta/3.0#citation",
-                "as:subject": software_name,
-                "id": uuid.uuid4().urn,
-                "type": "Relationship",
-            },
-            "origin": {
-                "id": actor_id,
-                "type": "Service",
-                "inbox": origin_inbox,
-            },
-            "target": {
-                "id": target_id,
-                "type": "Service",
-                "inbox": target_inbox,
+        # Id given when queued (recorded for reply correlation), otherwise a random UUID URN
+        notification_id = notification_id or uuid.uuid4().urn
+        self.notification_id = notification_id
+
+        payload = dict(_payload_template(actor_id, actor_name, origin_inbox, target_id, target_inbox))
+        payload["context"] = {
+            "id": f"https://hal.science/{document_id}",
+            "sorg:name": None,
+            "sorg:author": _CONTEXT_AUTHOR,
+            "ietf:cite-as": "https://doi.org/XXX/YYY",
+            "ietf:item": {
+                "id": f"https://hal.science/{document_id}/document",
+                "mediaType": "application/pdf",
+                "type": _CONTEXT_ITEM_TYPE,
             },
-            "type": [
-                "Announce",
-                "coar-notify:RelationshipAction",
-            ],
+            "type": _CONTEXT_TYPE,
+        }
+        payload["id"] = notification_id
+        payload["object"] = {
+            "as:object": f"https://hal.science/{document_id}",
+            "as:relationship": "https://w3id.org/codemeta/3.0#citation",
+            "as:subject": software_name,
+            "id": uuid.uuid4().urn,
+            "type": "Relationship",
         }
 
         self.notification = RelationshipAnnounceSoftware(payload)
@@ -108,19 +138,28 @@ class RelationshipAnnounceNotifier:
 
         # Add timeout to prevent hanging
         resp = None
+        self.last_status_code = None
+        self.last_error = None
+        self.retry_after = None
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=10)
+            resp = (self.session or requests).post(url, headers=headers, json=payload, timeout=10)
+            self.last_status_code = resp.status_code
             resp.raise_for_status()
             return resp
         except requests.exceptions.Timeout:
             logger.error(f"Timeout while sending notification to {url}")
+            self.last_error = "timeout"
             return None
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Connection error while sending to {url}: {e}")
+            self.last_error = f"connection error: {e}"
             return None
         except requests.HTTPError:
             logger.error(f"HTTP error: {resp.status_code} - {resp.text}")
+            self.last_error = f"HTTP {resp.status_code}"
+            self.retry_after = resp.headers.get("Retry-After")
             return None
         except Exception as e:
             logger.error(f"Unexpected error while sending notification to {url}: {e}")
+            self.last_error = str(e)
             return None
@@ -1,33 +1,54 @@
 import logging
 from app.app import app
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context, url_for
 
 from app.auth import require_api_key
-from app.utils.db import get_db
-from app.utils.notification_handler import send_notifications_to_swh, send_notifications_to_hal, \
-    get_software_notifications
+from app.utils.db import DocumentExistsError, get_db, parse_projection
+from app.utils.outbox import OUTBOX_PROVIDERS
+from app.utils.json_stream import dump_json_page
+from app.utils.pagination import MAX_PAGE_SIZE, PAGE_SIZE, clamp_limit, next_page_headers
+from app.utils.response_cache import cached_response, document_tag
 
 logger = logging.getLogger(__name__)
 
 @app.route('/api/documents', methods=['GET'])
 def documents_status():
+    """
+    Get the documents collection status and a page of its documents, ordered by HAL id.
+
+    Query Parameters:
+    - after: cursor of the page, the next_after of the previous page (optional)
+    - limit: page size (default: 100, max: 1000)
+
+    The page is streamed as it is read from the database.
+    """
     try:
         db_manager = get_db()
-        total_count = db_manager.get_collection_count("documents")
+        stats = db_manager.get_stats()
+        total_count = stats["documents"] if stats else db_manager.get_collection_count("documents")
+        limit = clamp_limit(request.args.get('limit', PAGE_SIZE, type=int))
+        documents = db_manager.iter_documents(request.args.get('after'), limit)
         status_info = {
             "collection_name": "documents",
             "total_documents": total_count,
         }
-        return jsonify(status_info)
+        body = dump_json_page(status_info, "documents", documents, limit, lambda doc: doc["file_hal_id"])
+        return Response(stream_with_context(body), mimetype="application/json")
     except Exception as e:
         logger.error(f"Failed to get documents status: {e}")
         return jsonify({"error": "Failed to retrieve documents status"}), 500
 
 @app.route('/api/document/<id>', methods=['GET'])
+@cached_response(lambda id: [document_tag(id)])
 def document_from_id(id):
+    try:
+        fields = parse_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         db_manager = get_db()
-        doc = db_manager.get_document_by_id(id)
+        doc = db_manager.get_document_by_id(id, fields)
         if doc:
             return jsonify(doc)
         else:
@@ -63,7 +84,8 @@ def delete_document(id):
             return jsonify({
                 "status": "deleted",
                 "document_id": id,
-                "software_deleted": deletion_result.get("software_deleted", 0)
+                "software_deleted": deletion_result.get("software_deleted", 0),
+                "notifications_cancelled": deletion_result.get("notifications_cancelled", 0)
             })
         else:
             return jsonify({"error": "Failed to delete document"}), 500
@@ -73,21 +95,36 @@ def delete_document(id):
         return jsonify({"error": "Failed to delete document"}), 500
 
 @app.route('/api/document/<id_document>/software', methods=['GET'])
+@cached_response(lambda id_document: [document_tag(id_document)])
 def document_software_all_from_id(id_document):
+    try:
+        fields = parse_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         db_manager = get_db()
-        result = db_manager.get_document_software(id_document)
-        return jsonify(result)
+        # A document rarely has more mentions than a full page, so it is still returned whole by default
+        limit = request.args.get('limit', MAX_PAGE_SIZE, type=int)
+        page = db_manager.get_document_software(id_document, fields=fields, after=request.args.get('after'),
+                                                limit=limit)
+        return jsonify(page["software"]), 200, next_page_headers(page["next_after"], limit)
     except Exception as e:
         logger.error(f"Failed to get software for document {id_document}: {e}")
         return jsonify({"error": "Failed to retrieve document software"}), 500
 
 @app.route('/api/document/<id_document>/software/<id_software>', methods=['GET'])
+@cached_response(lambda id_document, id_software: [document_tag(id_document)])
 def document_software_from_id(id_document, id_software):
+    try:
+        fields = parse_projection(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         db_manager = get_db()
-        result = db_manager.get_document_software(id_document, id_software)
-        return jsonify(result)
+        result = db_manager.get_document_software(id_document, id_software, fields)
+        return jsonify(result["software"])
     except Exception as e:
         logger.error(f"Failed to get software {id_software} for document {id_document}: {e}")
         return jsonify({"error": "Failed to retrieve document software"}), 500
@@ -104,6 +141,9 @@ def insert_new_document():
     - file: JSON file containing software metadata (required)
     - document_id: HAL identifier for the document (required)
 
+    Notifications to HAL and Software Heritage are queued in the outbox together with the
+    document and sent by the outbox dispatcher; poll the returned outbox URL for their status.
+
     Returns meaningful HTTP status codes.
     """
     # Validate required fields
@@ -116,70 +156,35 @@ def insert_new_document():
 
     file = request.files["file"]
 
+    original_filename = file.filename
     try:
         db_manager = get_db()
-        # Override the filename with the provided document_id for HAL identification
-        original_filename = file.filename
-        inserted = db_manager.insert_document_as_json(document_id, file)  # returns True if inserted, False if duplicate
-
+        inserted = db_manager.insert_document_as_json(document_id, file, notify_providers=OUTBOX_PROVIDERS)
 
-    except Exception as e:
-        logger.error(f"File insertion failed: {e}")
-        return jsonify({"error": f"Insertion failed: {str(e)}"}), 500
-
-    if inserted:
-        notifications = get_software_notifications(document_id)
-
-        notification_results = {}
-        try:
-            hal_result = send_notifications_to_hal(document_id, notifications)
-            notification_results["hal"] = {
-                "sent": hal_result["success_count"],
-                "failed": hal_result["failure_count"]
-            }
-        except Exception as e:
-            logger.error(f"HAL notification failed for {document_id}: {e}")
-            notification_results["hal"] = {
-                "sent": 0,
-                "failed": len(notifications) if notifications else 0,
-                "error": str(e)
-            }
-
-        try:
-            swh_result = send_notifications_to_swh(document_id, notifications)
-            notification_results["swh"] = {
-                "sent": swh_result["success_count"],
-                "failed": swh_result["failure_count"]
-            }
-        except Exception as e:
-            logger.error(f"SWH notification failed for {document_id}: {e}")
-            notification_results["swh"] = {
-                "sent": 0,
-                "failed": len(notifications) if notifications else 0,
-                "error": str(e)
-            }
-
-        total_sent = sum(result.get("sent", 0) for result in notification_results.values())
-        total_failed = sum(result.get("failed", 0) for result in notification_results.values())
-
-        return jsonify({
-            "status": "inserted",
-            "file": original_filename,
-            "document_id": document_id,
-            "notifications": {
-                "summary": {
-                    "total_sent": total_sent,
-                    "total_failed": total_failed,
-                    "total_attempts": total_sent + total_failed
-                },
-                "by_provider": notification_results
-            }
-        }), 201
-    else:
-        # Document already exists
+    except DocumentExistsError:
         return jsonify({
             "status": "exists",
             "message": "Document already exists in the database",
             "document_id": document_id,
             "file": original_filename
-        }), 409
\ No newline at end of file
+        }), 409
+    except ValueError as e:
+        # Invalid JSON, missing mention fields or a document_id that cannot be stored
+        return jsonify({"error": str(e), "document_id": document_id}), 400
+    except Exception as e:
+        logger.error(f"File insertion failed: {e}")
+        return jsonify({"error": f"Insertion failed: {str(e)}"}), 500
+
+    return jsonify({
+        "status": "accepted",
+        "file": original_filename,
+        "document_id": document_id,
+        "document_key": inserted["document_key"],
+        "software_keys": inserted["software_keys"],
+        "duplicates_dropped": inserted.get("duplicates_dropped", 0),
+        "outbox": {
+            "id": document_id,
+            "queued": len(inserted["outbox_keys"]),
+            "status_url": url_for("document_outbox_status", document_id=document_id)
+        }
+    }), 202
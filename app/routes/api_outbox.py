@@ -0,0 +1,86 @@
+import logging
+from app.app import app
+from flask import jsonify, request
+
+from app.auth import require_api_key
+from app.utils.outbox import get_outbox_status, list_dead_letters, replay_dead_letters
+
+logger = logging.getLogger(__name__)
+
+
+@app.route('/api/outbox/<document_id>', methods=['GET'])
+def document_outbox_status(document_id):
+    """
+    Get the delivery status of the notifications queued when a document was uploaded.
+
+    Args:
+        document_id: HAL document identifier, as returned by POST /api/document
+
+    Returns:
+        JSON with per-status counts and the queued notifications
+    """
+    try:
+        status = get_outbox_status(document_id)
+        if status:
+            return jsonify(status)
+        else:
+            return jsonify({"error": "No notifications queued for this document"}), 404
+    except Exception as e:
+        logger.error(f"Failed to get outbox status for {document_id}: {e}")
+        return jsonify({"error": "Failed to retrieve outbox status"}), 500
+
+
+@app.route('/api/outbox/dead-letters', methods=['GET'])
+@require_api_key
+def outbox_dead_letters():
+    """
+    List notifications that were refused by their inbox or exhausted their retries.
+
+    Query Parameters:
+    - document_id: only list the notifications of this document (optional)
+    - limit: page size (default: 100, max: 1000)
+    - after: cursor of the page, the next_after of the previous page (optional)
+
+    Returns:
+        JSON with the dead-lettered notifications
+    """
+    try:
+        limit = request.args.get('limit', 100, type=int)
+        page = list_dead_letters(request.args.get('document_id'), limit, request.args.get('after'))
+    except ValueError:
+        return jsonify({"error": "after must be a cursor returned as next_after"}), 400
+    except Exception as e:
+        logger.error(f"Failed to list dead-lettered notifications: {e}")
+        return jsonify({"error": "Failed to list dead-lettered notifications"}), 500
+
+    return jsonify({"total_count": len(page["entries"]), **page})
+
+
+@app.route('/api/outbox/replay', methods=['POST'])
+@require_api_key
+def replay_outbox_dead_letters():
+    """
+    Queue dead-lettered notifications again.
+
+    JSON Body (all optional, at least one required):
+    - keys: outbox entry keys to replay
+    - document_id: replay the notifications of this document
+    - provider: replay the notifications for this provider (hal, software_heritage)
+    - all: true to replay every dead-lettered notification
+
+    Returns:
+        JSON with the number of notifications queued again
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        keys = data.get('keys')
+        document_id = data.get('document_id')
+        provider = data.get('provider')
+        if not (keys or document_id or provider or data.get('all')):
+            return jsonify({"error": "keys, document_id, provider or all is required in request body"}), 400
+
+        replayed = replay_dead_letters(keys, document_id, provider)
+        return jsonify({"success": True, "replayed": replayed})
+    except Exception as e:
+        logger.error(f"Failed to replay dead-lettered notifications: {e}")
+        return jsonify({"error": "Failed to replay dead-lettered notifications"}), 500
@@ -1,17 +1,24 @@
 import logging
 from app.app import app
 from flask import request, jsonify
-from app.utils.db import get_db
-from app.utils.blacklist_manager import blacklist_manager
+from app.utils.db import get_db, SOFTWARE_ENTITY_RANKINGS
+from app.utils.pagination import PAGE_SIZE, clamp_limit, next_page_headers
+from app.utils.response_cache import cached_response, software_name_tag
+from app.utils.blacklist_manager import blacklist_manager, SEARCH_PREFIX, SEARCH_SUBSTRING
+from app.utils.blacklist_jobs import CLEANUP_MODES, MODE_FLAG, get_job, list_jobs, start_cleanup_job
 from app.auth import require_api_key
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of verification updates accepted by one bulk request
+MAX_VERIFICATION_UPDATES = 1000
+
 @app.route('/api/software', methods=['GET'])
 def software_status():
     try:
         db_manager = get_db()
-        total_count = db_manager.get_collection_count("software")
+        stats = db_manager.get_stats()
+        total_count = stats["mentions"]["total"] if stats else db_manager.get_collection_count("software")
         status_info = {
             "collection_name": "software",
             "total_documents": total_count,
@@ -22,15 +29,59 @@ def software_status():
         return jsonify({"error": "Failed to retrieve software status"}), 500
 
 @app.route('/api/software/name/<name>', methods=['GET'])
+@cached_response(lambda name: [software_name_tag(name)])
 def software_from_id(name):
     try:
         db_manager = get_db()
-        result = db_manager.get_software_by_normalized_name(name)
-        return jsonify(result)
+        limit = request.args.get('limit', PAGE_SIZE, type=int)
+        page = db_manager.get_software_by_normalized_name(name, request.args.get('after'), limit)
+        return jsonify(page["software"]), 200, next_page_headers(page["next_after"], limit)
     except Exception as e:
         logger.error(f"Failed to get software by {name}: {e}")
         return jsonify({"error": "Failed to retrieve software"}), 500
 
+@app.route('/api/software/name/<name>/summary', methods=['GET'])
+@cached_response(lambda name: [software_name_tag(name)])
+def software_summary(name):
+    """
+    Get the mention, document and verification counters of a software name.
+
+    Returns:
+        JSON with the software entity, 404 if the name is unknown
+    """
+    try:
+        entity = get_db().get_software_entity(name)
+        if entity:
+            return jsonify(entity)
+        else:
+            return jsonify({"error": "Software not found"}), 404
+    except Exception as e:
+        logger.error(f"Failed to get software summary for {name}: {e}")
+        return jsonify({"error": "Failed to retrieve software summary"}), 500
+
+@app.route('/api/software/top', methods=['GET'])
+def top_software():
+    """
+    Get the most mentioned software names.
+
+    Query Parameters:
+    - by: mention_count (default), document_count or verified_count
+    - limit: number of names returned (default: 20, max: 1000)
+
+    Returns:
+        JSON with the software entities, highest first
+    """
+    by = request.args.get('by', 'mention_count')
+    if by not in SOFTWARE_ENTITY_RANKINGS:
+        return jsonify({"error": f"by must be one of: {', '.join(SOFTWARE_ENTITY_RANKINGS)}"}), 400
+
+    try:
+        software = get_db().get_top_software(by, request.args.get('limit', 20, type=int))
+        return jsonify({"by": by, "total_count": len(software), "software": software})
+    except Exception as e:
+        logger.error(f"Failed to get top software by {by}: {e}")
+        return jsonify({"error": "Failed to retrieve top software"}), 500
+
 @app.route('/api/software/<id_mention>', methods=['GET'])
 def software_mention_from_id(id_mention):
     try:
@@ -44,6 +95,58 @@ def software_mention_from_id(id_mention):
         logger.error(f"Failed to get software mention {id_mention}: {e}")
         return jsonify({"error": "Failed to retrieve software mention"}), 500
 
+@app.route('/api/software/verification', methods=['POST'])
+@require_api_key
+def bulk_software_verification():
+    """
+    Record author verification for many software mentions in one request.
+
+    All updates are applied in a single database statement; when several touch the
+    same mention, the last one wins.
+
+    JSON Body:
+    - updates: list of {document_id, software_name, accepted} (required, at most 1000)
+
+    Returns:
+        JSON with the result of each update, in request order
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        updates = data.get('updates')
+        if not isinstance(updates, list) or not updates:
+            return jsonify({"error": "updates must be a non-empty list"}), 400
+        if len(updates) > MAX_VERIFICATION_UPDATES:
+            return jsonify({"error": f"At most {MAX_VERIFICATION_UPDATES} updates per request"}), 400
+
+        for index, update in enumerate(updates):
+            if not (isinstance(update, dict) and update.get('document_id') and update.get('software_name')
+                    and isinstance(update.get('accepted'), bool)):
+                return jsonify({
+                    "error": f"updates[{index}] needs document_id, software_name and a boolean accepted"
+                }), 400
+
+        triples = [
+            {
+                'document_id': update['document_id'],
+                'software_name': update['software_name'],
+                'accepted': update['accepted']
+            }
+            for update in updates
+        ]
+        results = get_db().bulk_update_software_verification(triples)
+        if results is None:
+            return jsonify({"error": "Failed to update software verification"}), 500
+
+        return jsonify({
+            "success": True,
+            "total_count": len(results),
+            "updated_count": sum(1 for result in results if result['updated']),
+            "results": [dict(triple, **result) for triple, result in zip(triples, results)]
+        })
+    except Exception as e:
+        logger.error(f"Failed to apply bulk software verification: {e}")
+        return jsonify({"error": "Failed to update software verification"}), 500
+
 
 # Blacklist management endpoints
 @app.route('/api/blacklist', methods=['GET'])
@@ -53,29 +156,50 @@ def get_blacklist():
 
     Query Parameters:
     - search: Search terms (optional)
-    - limit: Maximum number of results (default: 50)
+    - match: substring or prefix (default: substring)
+    - limit: Maximum number of results (default: 50, max: 1000)
+    - after: Cursor returned as next_after by the previous page (optional)
+
+    Without search, all terms are returned unless limit or after is given.
 
     Returns:
         JSON with blacklist data
     """
     try:
         search_query = request.args.get('search', '').strip()
-        limit = int(request.args.get('limit', 50))
+        match = request.args.get('match', SEARCH_SUBSTRING)
+        if match not in (SEARCH_SUBSTRING, SEARCH_PREFIX):
+            return jsonify({"error": f"match must be {SEARCH_SUBSTRING} or {SEARCH_PREFIX}"}), 400
+        try:
+            limit = clamp_limit(int(request.args.get('limit', 50)))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        after = request.args.get('after')
 
         stats = blacklist_manager.get_blacklist_stats()
 
         if search_query:
-            terms = blacklist_manager.search_blacklist(search_query, limit)
+            page = blacklist_manager.page_blacklist(search_query, match, after, limit)
             return jsonify({
                 "stats": stats,
-                "terms": terms,
+                "terms": page["terms"],
                 "search_query": search_query,
+                "match": match,
                 "limit": limit,
-                "total_matches": len(terms)
+                "total_matches": len(page["terms"]),
+                "next_after": page["next_after"]
+            })
+        elif 'limit' in request.args or after is not None:
+            page = blacklist_manager.page_blacklist(after=after, limit=limit)
+            return jsonify({
+                "stats": stats,
+                "terms": page["terms"],
+                "limit": limit,
+                "next_after": page["next_after"]
             })
         else:
-            # Return all terms if no search
-            all_terms = sorted(blacklist_manager.get_blacklist())
+            # Return all terms if no search, already sorted by the search index
+            all_terms = blacklist_manager.search_index().terms
             return jsonify({
                 "stats": stats,
                 "terms": all_terms,
@@ -110,9 +234,11 @@ def add_to_blacklist():
 
     JSON Body:
     - term: term to add to blacklist (required)
+    - apply_to_existing: also clean up the mentions already stored, in a background job (default: false)
+    - mode: what the job does with them, remove or flag (default: flag)
 
     Returns:
-        JSON with operation result
+        JSON with operation result, and the cleanup job_id when one was started
     """
     try:
         data = request.get_json()
@@ -123,12 +249,24 @@ def add_to_blacklist():
         if not term:
             return jsonify({"error": "term cannot be empty"}), 400
 
-        if blacklist_manager.add_to_blacklist(term):
-            return jsonify({
+        mode = data.get('mode', MODE_FLAG)
+        if mode not in CLEANUP_MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(CLEANUP_MODES)}"}), 400
+
+        try:
+            added = blacklist_manager.add_to_blacklist(term)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if added:
+            response = {
                 "success": True,
                 "message": f"Term '{term}' added to blacklist",
                 "term": term
-            }), 201
+            }
+            if data.get('apply_to_existing'):
+                response["job_id"] = start_cleanup_job([term], mode)
+            return jsonify(response), 201
         else:
             return jsonify({
                 "success": False,
@@ -152,6 +290,7 @@ def remove_from_blacklist(term):
     Returns:
         JSON with operation result
     """
+    term = term.strip()
     try:
         if blacklist_manager.remove_from_blacklist(term):
             return jsonify({
@@ -225,9 +364,11 @@ def import_blacklist():
     Form Data:
     - file: CSV file to import (required)
     - overwrite: Whether to overwrite existing blacklist (default: false)
+    - apply_to_existing: Clean up the stored mentions of the added terms in a background job (default: false)
+    - mode: What the job does with them, remove or flag (default: flag)
 
     Returns:
-        JSON with import result
+        JSON with import result, and the cleanup job_id when one was started
     """
     try:
         if 'file' not in request.files:
@@ -238,17 +379,24 @@ def import_blacklist():
             return jsonify({"error": "File must be a CSV file"}), 400
 
         overwrite = request.form.get('overwrite', 'false').lower() in ['true', '1', 'yes']
+        apply_to_existing = request.form.get('apply_to_existing', 'false').lower() in ['true', '1', 'yes']
+        mode = request.form.get('mode', MODE_FLAG)
+        if mode not in CLEANUP_MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(CLEANUP_MODES)}"}), 400
 
         csv_content = file.read().decode('utf-8')
         result = blacklist_manager.import_blacklist_from_csv(csv_content, overwrite)
 
         if result['success']:
-            return jsonify({
+            response = {
                 "success": True,
                 "message": f"Successfully imported {result['imported_terms']} terms",
                 "total_terms": result['total_terms'],
                 "overwrite": result['overwrite']
-            })
+            }
+            if apply_to_existing and result['added_terms']:
+                response["job_id"] = start_cleanup_job(result['added_terms'], mode)
+            return jsonify(response)
         else:
             return jsonify({
                 "success": False,
@@ -257,4 +405,82 @@ def import_blacklist():
 
     except Exception as e:
         logger.error(f"Failed to import blacklist: {e}")
-        return jsonify({"error": "Failed to import blacklist"}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to import blacklist"}), 500
+
+
+@app.route('/api/blacklist/cleanup', methods=['POST'])
+@require_api_key
+def cleanup_blacklisted_software():
+    """
+    Start a background job removing or flagging the stored mentions matched by blacklist terms.
+
+    JSON Body:
+    - terms: blacklist entries to apply
+    - all: true to apply the whole blacklist instead
+    - mode: remove or flag (default: flag)
+
+    Returns:
+        JSON with the job_id, 202
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get('all') is True:
+            terms = sorted(blacklist_manager.get_blacklist())
+        else:
+            terms = data.get('terms')
+            if not terms:
+                return jsonify({"error": "terms is required, or all: true to apply the whole blacklist"}), 400
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            return jsonify({"error": "terms must be a list of strings"}), 400
+
+        mode = data.get('mode', MODE_FLAG)
+        if mode not in CLEANUP_MODES:
+            return jsonify({"error": f"mode must be one of {', '.join(CLEANUP_MODES)}"}), 400
+
+        job_id = start_cleanup_job(terms, mode)
+        return jsonify({"success": True, "job_id": job_id, "terms": len(terms), "mode": mode}), 202
+    except Exception as e:
+        logger.error(f"Failed to start blacklist cleanup: {e}")
+        return jsonify({"error": "Failed to start blacklist cleanup"}), 500
+
+
+@app.route('/api/blacklist/jobs', methods=['GET'])
+def blacklist_cleanup_jobs():
+    """
+    List the most recent blacklist cleanup jobs.
+
+    Query Parameters:
+    - limit: maximum number of jobs returned (default: 20)
+
+    Returns:
+        JSON with the jobs and their progress, newest first
+    """
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        jobs = list_jobs(limit=limit)
+        return jsonify({"total_count": len(jobs), "jobs": jobs})
+    except Exception as e:
+        logger.error(f"Failed to list blacklist cleanup jobs: {e}")
+        return jsonify({"error": "Failed to list blacklist cleanup jobs"}), 500
+
+
+@app.route('/api/blacklist/jobs/<job_id>', methods=['GET'])
+def blacklist_cleanup_job(job_id):
+    """
+    Get the status and progress of a blacklist cleanup job.
+
+    Args:
+        job_id: Job identifier returned when the job was started
+
+    Returns:
+        JSON with the job status and progress
+    """
+    try:
+        job = get_job(job_id)
+        if job:
+            return jsonify(job)
+        else:
+            return jsonify({"error": "Job not found"}), 404
+    except Exception as e:
+        logger.error(f"Failed to get blacklist cleanup job {job_id}: {e}")
+        return jsonify({"error": "Failed to retrieve job"}), 500
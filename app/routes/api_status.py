@@ -44,3 +44,18 @@ def can_upload():
             "message": str(e),
             "can_upload": False
         }), 500
+
+
+@app.route("/api/stats", methods=["GET"])
+def stats_summary():
+    """
+    Counters of documents, software mentions by verification status and notifications
+    sent or failed by provider.
+
+    The counters are maintained as the data changes, so this reads a fixed number of
+    small documents whatever the size of the database.
+    """
+    stats = get_db().get_stats()
+    if stats is None:
+        return jsonify({"error": "Failed to retrieve statistics"}), 500
+    return jsonify(stats)
@@ -1,61 +1,66 @@
 import logging
 
-from flask import request, jsonify, render_template
+from flask import request, jsonify, render_template, stream_template
 
 from app.app import app
-from app.utils.notification_handler import accept_notification, reject_notification, \
-    send_validation_to_viz
+from app.utils.inbox import InvalidNotificationError, find_duplicate, parse_notification, store_notification, \
+    list_notifications, parse_log_cursor, LOG_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
-received_notifications = []
-
 @app.route("/inbox", methods=["POST"])
 def receive_notification():
     """
     COAR Notify inbox.
-    Receives a JSON-LD notification and validates it.
+    Validates a JSON-LD notification, stores it durably and acknowledges it right away.
+    Database updates and the Software Viz push are done by the inbox consumer.
     """
-    notification = request.get_json(force=True)
-    notification_types = notification.get('type', [])
-    logger.info(f"Received COAR notification: {notification_types}")
+    notification = request.get_json(force=True, silent=True)
+    if notification is None:
+        return jsonify({"error": "Request body must be a JSON notification"}), 400
+
+    # Redelivery of a notification this worker already stored: answer without any I/O
+    inbox_id = find_duplicate(notification)
+    if inbox_id:
+        return jsonify({"status": "ok", "duplicate": True, "inbox_id": inbox_id}), 202
 
-    # Store the notification for display
-    received_notifications.append(notification)
+    try:
+        parsed = parse_notification(notification)
+    except InvalidNotificationError as e:
+        logger.warning(f"Rejected invalid COAR notification: {e}")
+        return jsonify({"error": str(e)}), 400
 
-    if type(notification_types) is list:
-        notification_type = notification_types[0]
-    else:
-        notification_type = notification_types
+    logger.info(f"Received COAR notification: {notification.get('type', [])}")
 
-    notification_origin = notification.get("origin", None)
-    if notification_origin and notification_origin["id"] == "https://www.softwareheritage.org/":
+    if parsed['origin_id'] == "https://www.softwareheritage.org/":
         logger.info("Notification originated from Software Heritage is ignored.")
+        try:
+            # Kept in the notification log only
+            store_notification(notification, parsed, ignored=True)
+        except Exception as e:
+            logger.warning(f"Failed to log ignored COAR notification: {e}")
         return jsonify({
             "status": "ok",
-            "type": getattr(notification, "type", None),
-            "actor": notification_origin["id"]
+            "type": parsed['type'],
+            "actor": parsed['origin_id']
         }), 202
 
-    if notification_type in ("Accept", "Reject"):
-        hal_id_full = notification['object']['object']['id']
-        hal_id = hal_id_full.replace('oai:HAL:', '')
-        software_name = notification['object']['object']['sorg:citation']['name']
-
-        notification_accepted = notification_type == "Accept"
+    try:
+        inbox_id, duplicate = store_notification(notification, parsed)
+    except Exception as e:
+        # Not stored: let the sender retry later rather than lose the notification
+        logger.error(f"Failed to store COAR notification: {e}")
+        return jsonify({"error": "Notification could not be stored, retry later"}), 503
 
-        if notification_accepted:
-            accept_notification(notification)
-        else:
-            reject_notification(notification)
-
-        send_validation_to_viz(hal_id, software_name, notification_accepted)
+    if duplicate:
+        return jsonify({"status": "ok", "duplicate": True, "inbox_id": inbox_id}), 202
 
     # Respond with the type and actor info
     return jsonify({
         "status": "ok",
-        "type": getattr(notification, "type", None),
-        "actor": getattr(notification['actor'], "id", None)
+        "type": parsed['type'],
+        "actor": parsed['actor_id'],
+        "inbox_id": inbox_id
     }), 202
 
 @app.route("/inbox", methods=["GET"])
@@ -146,30 +151,108 @@ def inbox_description():
         },
         "responses": {
             "202": {
-                "description": "Notification accepted and processed",
+                "description": "Notification accepted and stored; it is processed asynchronously",
                 "example": {
                     "status": "ok",
                     "type": "Accept",
-                    "actor": "https://orcid.org/0000-0000-0000-0000"
+                    "actor": "https://orcid.org/0000-0000-0000-0000",
+                    "inbox_id": "123456"
                 },
-                "note": "The response contains the notification type and actor ID from the processed notification"
+                "note": "The response contains the notification type and actor ID from the received notification"
             },
             "400": {
                 "description": "Invalid request - no JSON data provided or malformed request",
-                "note": "Occurs when the request doesn't contain valid JSON data"
+                "note": "Occurs when the request doesn't contain valid JSON data or an Accept/Reject lacks object.object.id or sorg:citation.name"
+            },
+            "503": {
+                "description": "The notification could not be stored",
+                "note": "Retry the delivery later"
             }
         },
         "view_notifications": {
             "url": "/notifications",
             "method": "GET",
-            "description": "View all received notifications in a web interface"
+            "description": "View received notifications in a web interface, newest first (filters: type, document_id)"
+        },
+        "list_notifications": {
+            "url": "/api/notifications",
+            "method": "GET",
+            "description": "List received notifications as JSON, paginated with the next_before cursor"
         }
     })
 
 
+def _notification_log_args():
+    """Read the filter and pagination query parameters of the notification log."""
+    before = request.args.get('before')
+    if before:
+        # Rejected here with a 400 rather than by the query
+        parse_log_cursor(before)
+    return {
+        "notification_type": request.args.get('type') or None,
+        "document_id": request.args.get('document_id') or None,
+        "before": before or None,
+        "limit": request.args.get('limit', LOG_PAGE_SIZE, type=int),
+    }
+
+
 @app.route("/notifications", methods=["GET"])
 def show_notifications():
     """
-    Display all received notifications on a web page.
+    Display received notifications on a web page, newest first, one page at a time.
+
+    Query Parameters:
+    - type: only show notifications of this type (optional)
+    - document_id: only show notifications about this document (optional)
+    - before: cursor of the page, from the "Older" link (optional)
+    - limit: page size (default: 50, max: 200)
+    """
+    try:
+        args = _notification_log_args()
+    except ValueError:
+        return jsonify({"error": "before must be a next_before cursor"}), 400
+
+    try:
+        page = list_notifications(**args)
+    except Exception as e:
+        logger.error(f"Failed to list received notifications: {e}")
+        return render_template("error.html", error=str(e)), 500
+
+    # Streamed, so the page is sent while it renders
+    return stream_template("notifications.html",
+                           notifications=page["notifications"],
+                           next_before=page["next_before"],
+                           notification_type=args["notification_type"],
+                           document_id=args["document_id"],
+                           limit=args["limit"])
+
+
+@app.route("/api/notifications", methods=["GET"])
+def list_received_notifications():
+    """
+    List received notifications, newest first.
+
+    Query Parameters:
+    - type: only list notifications of this type (optional)
+    - document_id: only list notifications about this document (optional)
+    - before: 'next_before' value of the previous page (optional)
+    - limit: page size (default: 50, max: 200)
+
+    Returns:
+        JSON with the notifications and the cursor of the next page
     """
-    return render_template("notifications.html", notifications=received_notifications)
+    try:
+        args = _notification_log_args()
+    except ValueError:
+        return jsonify({"error": "before must be a next_before cursor"}), 400
+
+    try:
+        page = list_notifications(**args)
+        return jsonify({
+            "notifications": page["notifications"],
+            "count": len(page["notifications"]),
+            "next_before": page["next_before"],
+        })
+    except Exception as e:
+        logger.error(f"Failed to list received notifications: {e}")
+        return jsonify({"error": "Failed to list received notifications"}), 500
@@ -0,0 +1,351 @@
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.utils.blacklist_matcher import BlacklistMatcher
+from app.utils.db import (get_db, mention_stats, software_entity_key, JOBS_COLLECTION, OUTBOX_COLLECTION,
+                          SOFTWARE_ENTITY_COLLECTION)
+from app.utils.outbox import STATUS_CANCELLED, STATUS_PENDING as OUTBOX_STATUS_PENDING
+from app.utils.response_cache import document_tag, invalidate, software_name_tag
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE_BLACKLIST_CLEANUP = "blacklist_cleanup"
+
+# Job statuses
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# What happens to the stored mentions of a blacklisted name
+MODE_REMOVE = "remove"
+MODE_FLAG = "flag"
+CLEANUP_MODES = (MODE_REMOVE, MODE_FLAG)
+
+# Software mentions removed or flagged per AQL statement
+CLEANUP_BATCH_SIZE = int(os.getenv("BLACKLIST_CLEANUP_BATCH_SIZE", 500))
+# Names handled together; progress is recorded after each group
+CLEANUP_NAME_CHUNK = 100
+# A running job whose progress was not recorded for this long is considered abandoned
+JOB_STALE_MS = 10 * 60 * 1000
+
+# Jobs started from the API run one at a time, in the background of the worker that received them
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blacklist-job")
+_executor_lock = threading.Lock()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def create_cleanup_job(terms: Iterable[str], mode: str = MODE_FLAG) -> str:
+    """
+    Record a job applying blacklist terms to the software mentions already stored.
+
+    Args:
+        terms: Blacklist entries to apply (exact, wildcard or re: entries)
+        mode: 'flag' (default) to mark the mentions as blacklisted, 'remove' to delete them and their edges
+
+    Returns:
+        Key of the job
+    """
+    if mode not in CLEANUP_MODES:
+        raise ValueError(f"Unknown cleanup mode '{mode}'")
+
+    job = {
+        "type": JOB_TYPE_BLACKLIST_CLEANUP,
+        "status": STATUS_PENDING,
+        "terms": sorted(set(terms)),
+        "mode": mode,
+        "created_at": _now_ms(),
+        "updated_at": _now_ms(),
+        "progress": {
+            "matched_names": 0,
+            "processed_names": 0,
+            "software_updated": 0,
+            "edges_removed": 0,
+            "notifications_cancelled": 0,
+        },
+    }
+    query = f"INSERT @job INTO {JOBS_COLLECTION} RETURN NEW._key"
+    return list(get_db().execute_aql_query(query, bind_vars={"job": job}, raw_results=True))[0]
+
+
+def start_cleanup_job(terms: Iterable[str], mode: str = MODE_FLAG) -> str:
+    """
+    Record a cleanup job and run it in the background.
+
+    Args:
+        terms: Blacklist entries to apply
+        mode: 'flag' (default) or 'remove'
+
+    Returns:
+        Key of the job, to follow its progress with get_job
+    """
+    job_key = create_cleanup_job(terms, mode)
+    with _executor_lock:
+        _executor.submit(run_cleanup_job, job_key)
+    logger.info(f"Started blacklist cleanup job {job_key} ({mode})")
+    return job_key
+
+
+def get_job(job_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a job and its progress.
+
+    Args:
+        job_key: Key of the job
+
+    Returns:
+        Job document, or None if not found
+    """
+    query = f"""
+        LET job = DOCUMENT("{JOBS_COLLECTION}", @key)
+        FILTER job != null
+        RETURN UNSET(job, "_id", "_rev", "names")
+    """
+    result = list(get_db().execute_aql_query(query, bind_vars={"key": job_key}, raw_results=True))
+    return result[0] if result else None
+
+
+def list_jobs(job_type: str = JOB_TYPE_BLACKLIST_CLEANUP, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    List the most recent jobs of a type.
+
+    Args:
+        job_type: Type of job
+        limit: Maximum number of jobs returned
+
+    Returns:
+        Jobs, newest first
+    """
+    query = f"""
+        FOR job IN {JOBS_COLLECTION}
+            FILTER job.type == @type
+            SORT job.created_at DESC
+            LIMIT @limit
+            RETURN UNSET(job, "_id", "_rev", "names")
+    """
+    bind_vars = {"type": job_type, "limit": limit}
+    return list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+
+
+def _claim_job(job_key: str, worker_id: str) -> Optional[Dict[str, Any]]:
+    """Mark a pending or abandoned job as running, unless another worker holds it."""
+    query = f"""
+        LET job = DOCUMENT("{JOBS_COLLECTION}", @key)
+        FILTER job != null
+        FILTER job.status == @pending OR (job.status == @running AND job.updated_at < DATE_NOW() - @stale)
+        UPDATE job WITH {{
+            status: @running,
+            worker: @worker_id,
+            started_at: job.started_at || DATE_NOW(),
+            updated_at: DATE_NOW()
+        }} IN {JOBS_COLLECTION} OPTIONS {{ exclusive: true }}
+        RETURN NEW
+    """
+    bind_vars = {
+        "key": job_key,
+        "pending": STATUS_PENDING,
+        "running": STATUS_RUNNING,
+        "stale": JOB_STALE_MS,
+        "worker_id": worker_id,
+    }
+    result = list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+    return result[0] if result else None
+
+
+def _update_job(job_key: str, changes: Dict[str, Any]) -> None:
+    changes = dict(changes, updated_at=_now_ms())
+    query = f"UPDATE @key WITH @changes IN {JOBS_COLLECTION}"
+    get_db().execute_aql_query(query, bind_vars={"key": job_key, "changes": changes})
+
+
+def find_matching_names(matcher: BlacklistMatcher) -> List[str]:
+    """
+    Find the distinct stored software names matched by a blacklist.
+
+    The distinct names are streamed from the software name index, without loading the
+    mentions, and matched as they arrive; only the matching ones are kept.
+
+    Args:
+        matcher: Compiled blacklist terms
+
+    Returns:
+        Matching normalized names, sorted
+    """
+    query = """
+        FOR soft IN software
+            COLLECT name = soft.software_name.normalizedForm OPTIONS { method: "sorted" }
+            RETURN name
+    """
+    names = get_db().iter_aql_query(query)
+    return [name for name in names if isinstance(name, str) and matcher.matches(name)]
+
+
+def _cleanup_names(names: List[str], mode: str, progress: Dict[str, int], job_key: str) -> None:
+    """Remove or flag the mentions of some names, in bounded batches, recording progress after each."""
+    if mode == MODE_REMOVE:
+        query = """
+            FOR soft IN software
+                FILTER soft.software_name.normalizedForm IN @names
+                LIMIT @batch_size
+                LET documents = (
+                    FOR edge IN edge_doc_to_software
+                        FILTER edge._to == soft._id
+                        REMOVE edge IN edge_doc_to_software
+                        RETURN DOCUMENT(OLD._from).file_hal_id
+                )
+                REMOVE soft IN software
+                RETURN {
+                    edges_removed: LENGTH(documents),
+                    documents: documents,
+                    verification: OLD.verification_by_author,
+                    counted: OLD.blacklisted != true
+                }
+        """
+    else:
+        query = """
+            FOR soft IN software
+                FILTER soft.software_name.normalizedForm IN @names
+                FILTER soft.blacklisted != true
+                LIMIT @batch_size
+                LET documents = (FOR doc IN 1..1 INBOUND soft edge_doc_to_software RETURN doc.file_hal_id)
+                UPDATE soft WITH { blacklisted: true, blacklisted_at: DATE_ISO8601(DATE_NOW()) } IN software
+                RETURN {
+                    edges_removed: 0,
+                    documents: documents,
+                    verification: OLD.verification_by_author,
+                    counted: true
+                }
+        """
+
+    db = get_db()
+    while True:
+        bind_vars = {"names": names, "batch_size": CLEANUP_BATCH_SIZE}
+        results = list(db.execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+        progress["software_updated"] += len(results)
+        progress["edges_removed"] += sum(result["edges_removed"] for result in results)
+        # Flagged mentions are no longer counted; removing mentions flagged earlier changes nothing
+        counted = [result for result in results if result["counted"]]
+        db.record_stats(mention_stats(
+            -len(counted),
+            -sum(1 for result in counted if result["verification"] is True),
+            -sum(1 for result in counted if result["verification"] is False)
+        ))
+        # Cached responses of the documents that referenced these mentions are stale
+        invalidate(*{document_tag(hal_id) for result in results for hal_id in result["documents"] if hal_id})
+        _update_job(job_key, {"progress": progress})
+        if len(results) < CLEANUP_BATCH_SIZE:
+            break
+    invalidate(*(software_name_tag(name) for name in names))
+
+    # Every mention of these names is gone or flagged, and no longer counted: so are the counts of their entities
+    query = f"""
+        FOR key IN @keys
+            UPDATE key WITH {{
+                mention_count: 0,
+                document_count: 0,
+                verified_count: 0,
+                rejected_count: 0,
+                pending_count: 0,
+                updated_at: DATE_NOW()
+            }} IN {SOFTWARE_ENTITY_COLLECTION} OPTIONS {{ ignoreErrors: true, exclusive: true }}
+    """
+    db.execute_aql_query(query, bind_vars={"keys": [software_entity_key(name) for name in names]})
+
+    # Notifications not sent yet would announce mentions that are now blacklisted
+    query = f"""
+        FOR entry IN {OUTBOX_COLLECTION}
+            FILTER entry.status == @pending AND entry.software_name IN @names
+            UPDATE entry WITH {{
+                status: @cancelled,
+                cancelled_at: DATE_NOW(),
+                last_error: "Software name blacklisted"
+            }} IN {OUTBOX_COLLECTION}
+            RETURN 1
+    """
+    bind_vars = {"pending": OUTBOX_STATUS_PENDING, "cancelled": STATUS_CANCELLED, "names": names}
+    progress["notifications_cancelled"] += len(list(db.execute_aql_query(query, bind_vars=bind_vars,
+                                                                         raw_results=True)))
+
+
+def run_cleanup_job(job_key: str, worker_id: Optional[str] = None) -> bool:
+    """
+    Run (or resume) a blacklist cleanup job.
+
+    The matching names are computed once and stored on the job; they are then handled
+    in groups of CLEANUP_NAME_CHUNK, so a resumed job continues after the last group
+    recorded. Every step is idempotent, so repeating a group after a crash is harmless.
+
+    Args:
+        job_key: Key of the job
+        worker_id: Identifier of the worker, stored on the job
+
+    Returns:
+        bool: True if the job completed, False if it failed or is held by another worker
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    job = _claim_job(job_key, worker_id)
+    if job is None:
+        logger.info(f"Blacklist cleanup job {job_key} is not pending or is held by another worker")
+        return False
+
+    progress = job["progress"]
+    try:
+        names = job.get("names")
+        if names is None:
+            names = find_matching_names(BlacklistMatcher(job["terms"]))
+            progress["matched_names"] = len(names)
+            _update_job(job_key, {"names": names, "progress": progress})
+            logger.info(f"Blacklist cleanup job {job_key}: {len(names)} stored names match {len(job['terms'])} terms")
+
+        for start in range(progress["processed_names"], len(names), CLEANUP_NAME_CHUNK):
+            chunk = names[start:start + CLEANUP_NAME_CHUNK]
+            _cleanup_names(chunk, job["mode"], progress, job_key)
+            progress["processed_names"] = start + len(chunk)
+            _update_job(job_key, {"progress": progress})
+
+        _update_job(job_key, {"status": STATUS_COMPLETED, "finished_at": _now_ms()})
+        logger.info(f"Blacklist cleanup job {job_key} completed: {progress}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Blacklist cleanup job {job_key} failed: {e}")
+        try:
+            _update_job(job_key, {"status": STATUS_FAILED, "error": str(e), "progress": progress})
+        except Exception as update_error:
+            logger.error(f"Failed to record the failure of job {job_key}: {update_error}")
+        return False
+
+
+def resume_jobs(worker_id: Optional[str] = None) -> int:
+    """
+    Run the cleanup jobs that are pending or were abandoned by a worker that stopped.
+
+    Args:
+        worker_id: Identifier of the worker
+
+    Returns:
+        int: Number of jobs completed
+    """
+    query = f"""
+        FOR job IN {JOBS_COLLECTION}
+            FILTER job.type == @type
+            FILTER job.status == @pending OR (job.status == @running AND job.updated_at < DATE_NOW() - @stale)
+            SORT job.created_at
+            RETURN job._key
+    """
+    bind_vars = {
+        "type": JOB_TYPE_BLACKLIST_CLEANUP,
+        "pending": STATUS_PENDING,
+        "running": STATUS_RUNNING,
+        "stale": JOB_STALE_MS,
+    }
+    job_keys = list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+    return sum(1 for job_key in job_keys if run_cleanup_job(job_key, worker_id))
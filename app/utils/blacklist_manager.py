@@ -1,72 +1,200 @@
 import csv
+import fcntl
+import io
 import logging
 import os
-from typing import List, Set
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, TypeVar
 # from flask import jsonify, request  # Removed unused imports
 from app.auth import require_api_key
+from app.utils.blacklist_matcher import BlacklistMatcher, invalid_term_reason
+from app.utils.blacklist_search import BlacklistSearchIndex
 
 logger = logging.getLogger(__name__)
 
-# Global blacklist cache
-_blacklist_cache: Set[str] = set()
 _blacklist_file_path = "./app/static/data/blacklist.csv"
+# How often each worker checks the blacklist version, in seconds
+BLACKLIST_CHECK_INTERVAL_SECONDS = float(os.getenv("BLACKLIST_CHECK_INTERVAL", 1.0))
+# Search modes of page_blacklist
+SEARCH_SUBSTRING = "substring"
+SEARCH_PREFIX = "prefix"
+# Header names recognized on the first row of a blacklist CSV
+_HEADER_NAMES = ('term', 'word', 'pattern')
+
+T = TypeVar("T")
+
+
+class BlacklistSnapshot(NamedTuple):
+    """Immutable view of one version of the blacklist, shared by every request of a worker."""
+    version: int
+    terms: FrozenSet[str]
+    matcher: BlacklistMatcher
+    loaded_at: str
+
+
+def _read_terms(rows: Iterable[List[str]]) -> Set[str]:
+    """Collect the terms of CSV rows, skipping the first row only if it is a header."""
+    terms = set()
+    for index, row in enumerate(rows):
+        if not row or not row[0].strip():
+            continue
+        term = row[0].strip()
+        if index == 0 and term.lower() in _HEADER_NAMES:
+            continue
+        terms.add(term)
+    return terms
 
 
 class BlacklistManager:
     """
     Centralized blacklist management for filtering software names.
 
-    This class handles loading, caching, and managing the blacklist
-    used to filter out generic or non-software terms from software detection.
+    The CSV file is the single source of truth, with a version stamp stored next to it
+    (`<file>.version`). Changes are made under an exclusive lock on `<file>.lock`: the
+    file is read again, modified, replaced atomically and the version bumped. Every
+    worker holds an immutable snapshot of the terms and their compiled matcher, and
+    replaces it when the version changes, which it checks at most every
+    BLACKLIST_CHECK_INTERVAL_SECONDS. Filtering never touches the disk.
     """
 
-    def __init__(self, blacklist_path: str = None):
+    def __init__(self, blacklist_path: str = None, check_interval: float = BLACKLIST_CHECK_INTERVAL_SECONDS):
         """
         Initialize the blacklist manager.
 
         Args:
             blacklist_path: Path to the blacklist CSV file
+            check_interval: Minimum time between two version checks, in seconds
         """
         self.blacklist_path = blacklist_path or _blacklist_file_path
+        self.version_path = f"{self.blacklist_path}.version"
+        self.lock_path = f"{self.blacklist_path}.lock"
+        self.check_interval = check_interval
+        self._refresh_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._snapshot = BlacklistSnapshot(-1, frozenset(), BlacklistMatcher(()), "")
+        # Built on first use for the snapshot they were derived from
+        self._search_cache: Tuple[Optional[BlacklistSnapshot], Optional[BlacklistSearchIndex]] = (None, None)
+        self._export_cache: Tuple[Optional[BlacklistSnapshot], str] = (None, "")
         self.load_blacklist()
 
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        """Hold the lock shared by every process using this blacklist file."""
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_version(self) -> int:
+        try:
+            with open(self.version_path, encoding="utf-8") as version_file:
+                return int(version_file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _read_file(self) -> Set[str]:
+        if not os.path.exists(self.blacklist_path):
+            logger.warning(f"Blacklist file not found: {self.blacklist_path}")
+            return set()
+        with open(self.blacklist_path, newline="", encoding="utf-8") as csvfile:
+            return _read_terms(csv.reader(csvfile))
+
+    def _replace_file(self, path: str, content: str) -> None:
+        """Write a file atomically, so readers see either the old or the new content."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, path)
+
+    def _publish(self, terms: Iterable[str], version: int,
+                 matcher: Optional[BlacklistMatcher] = None) -> BlacklistSnapshot:
+        """Compile the terms, unless already compiled, and make them the snapshot used by this worker."""
+        terms = frozenset(terms)
+        self._snapshot = BlacklistSnapshot(
+            version, terms, matcher or BlacklistMatcher(terms), datetime.now(timezone.utc).isoformat()
+        )
+        self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def _update(self, change: Callable[[Set[str]], T]) -> T:
+        """
+        Apply a change to the latest terms on disk and publish it to every worker.
+
+        The new terms are compiled before anything is written, and the previous file is
+        restored if writing the new one or its version fails, so the other workers never
+        load a blacklist this worker could not publish.
+
+        Args:
+            change: Function modifying the given set of terms in place
+
+        Returns:
+            What `change` returned
+        """
+        with self._locked(exclusive=True):
+            terms = self._read_file()
+            before = set(terms)
+            result = change(terms)
+            matcher = BlacklistMatcher(terms)
+            version = self._read_version()
+            if terms != before:
+                try:
+                    self._save_blacklist(terms)
+                    self._replace_file(self.version_path, f"{version + 1}\n")
+                except Exception:
+                    self._save_blacklist(before)
+                    raise
+                version += 1
+            self._publish(terms, version, matcher)
+        return result
+
+    def snapshot(self) -> BlacklistSnapshot:
+        """
+        Get the current blacklist snapshot, reloading it first if another worker changed it.
+
+        Returns:
+            BlacklistSnapshot, which must not be modified
+        """
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._refresh_lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._checked_at = time.monotonic()
+                    if self._read_version() != self._snapshot.version:
+                        self.load_blacklist()
+        return self._snapshot
+
     def load_blacklist(self) -> Set[str]:
         """
-        Load blacklist terms from CSV file into cache.
+        Load blacklist terms from CSV file into a new snapshot.
 
         Returns:
             Set of blacklisted terms
         """
-        global _blacklist_cache
-
         try:
-            blacklist = set()
-            if os.path.exists(self.blacklist_path):
-                with open(self.blacklist_path, newline="", encoding="utf-8") as csvfile:
-                    reader = csv.reader(csvfile)
-                    # Skip header if exists
-                    first_row = next(reader, None)
-                    if first_row and first_row[0].lower() in ['term', 'word', 'pattern']:
-                        pass  # Header row, already skipped
-
-                    for row in reader:
-                        if row and row[0]:
-                            # Clean up the term
-                            term = row[0].strip()
-                            if term and term != '':
-                                blacklist.add(term)
-
-                _blacklist_cache = blacklist
-                logger.info(f"Loaded {len(blacklist)} terms from blacklist: {self.blacklist_path}")
-            else:
-                logger.warning(f"Blacklist file not found: {self.blacklist_path}")
-                _blacklist_cache = set()
-
+            with self._locked(exclusive=False):
+                version = self._read_version()
+                terms = self._read_file()
+            snapshot = self._publish(terms, version)
+            logger.info(f"Loaded {len(terms)} terms from blacklist: {self.blacklist_path} (version {version})")
         except Exception as e:
             logger.error(f"Failed to load blacklist from {self.blacklist_path}: {e}")
-            _blacklist_cache = set()
+            snapshot = self._snapshot
 
-        return _blacklist_cache
+        return set(snapshot.terms)
+
+    def get_matcher(self) -> BlacklistMatcher:
+        """
+        Get the compiled blacklist used to filter software names.
+
+        Returns:
+            BlacklistMatcher for the current terms
+        """
+        return self.snapshot().matcher
 
     def get_blacklist(self) -> Set[str]:
         """
@@ -75,19 +203,22 @@ class BlacklistManager:
         Returns:
             Set of blacklisted terms
         """
-        return _blacklist_cache.copy()
+        return set(self.snapshot().terms)
 
     def is_blacklisted(self, term: str) -> bool:
         """
-        Check if a term is in the blacklist.
+        Check if a software name is matched by the blacklist.
+
+        Matching ignores case and punctuation and honours prefix, suffix and regex
+        entries, see BlacklistMatcher.
 
         Args:
-            term: Term to check
+            term: Software name to check
 
         Returns:
             True if term is blacklisted, False otherwise
         """
-        return term in _blacklist_cache
+        return self.snapshot().matcher.matches(term)
 
     def add_to_blacklist(self, term: str) -> bool:
         """
@@ -98,16 +229,26 @@ class BlacklistManager:
 
         Returns:
             True if added successfully, False if already exists
+
+        Raises:
+            ValueError: If the term is not a valid entry, see invalid_term_reason
         """
         if not term or not term.strip():
             return False
 
         term = term.strip()
-        if term in _blacklist_cache:
-            return False
+        reason = invalid_term_reason(term)
+        if reason:
+            raise ValueError(f"Invalid blacklist term '{term}': {reason}")
 
-        _blacklist_cache.add(term)
-        self._save_blacklist()
+        def add(terms: Set[str]) -> bool:
+            if term in terms:
+                return False
+            terms.add(term)
+            return True
+
+        if not self._update(add):
+            return False
         logger.info(f"Added term to blacklist: {term}")
         return True
 
@@ -121,38 +262,41 @@ class BlacklistManager:
         Returns:
             True if removed successfully, False if not found
         """
-        if term not in _blacklist_cache:
+        # Entries are stored stripped, see add_to_blacklist
+        term = (term or "").strip()
+        if not term:
             return False
 
-        _blacklist_cache.remove(term)
-        self._save_blacklist()
+        def remove(terms: Set[str]) -> bool:
+            if term not in terms:
+                return False
+            terms.remove(term)
+            return True
+
+        if not self._update(remove):
+            return False
         logger.info(f"Removed term from blacklist: {term}")
         return True
 
-    def _save_blacklist(self):
-        """Save the current blacklist cache to file."""
-        try:
-            os.makedirs(os.path.dirname(self.blacklist_path), exist_ok=True)
-            with open(self.blacklist_path, "w", newline="", encoding="utf-8") as csvfile:
-                writer = csv.writer(csvfile)
-                # Write header
-                writer.writerow(["term"])
-                # Write all terms
-                for term in sorted(_blacklist_cache):
-                    writer.writerow([term])
-            logger.info(f"Saved {len(_blacklist_cache)} terms to blacklist: {self.blacklist_path}")
-        except Exception as e:
-            logger.error(f"Failed to save blacklist to {self.blacklist_path}: {e}")
+    def _save_blacklist(self, terms: Iterable[str]) -> None:
+        """Save terms to the blacklist file; only called while holding the exclusive lock."""
+        os.makedirs(os.path.dirname(self.blacklist_path) or ".", exist_ok=True)
+        self._replace_file(self.blacklist_path, self._to_csv(terms))
+        logger.info(f"Saved blacklist to {self.blacklist_path}")
 
     def reload_blacklist(self) -> int:
         """
-        Reload the blacklist from file.
+        Reload the blacklist from file, in every worker.
+
+        The version is bumped so that manual edits of the file reach all the workers.
 
         Returns:
             Number of terms loaded
         """
-        blacklist = self.load_blacklist()
-        return len(blacklist)
+        with self._locked(exclusive=True):
+            version = self._read_version() + 1
+            self._replace_file(self.version_path, f"{version}\n")
+        return len(self.load_blacklist())
 
     def get_blacklist_stats(self) -> dict:
         """
@@ -161,13 +305,30 @@ class BlacklistManager:
         Returns:
             Dictionary with blacklist statistics
         """
+        snapshot = self.snapshot()
         return {
-            "total_terms": len(_blacklist_cache),
+            "total_terms": len(snapshot.terms),
+            "pattern_terms": snapshot.matcher.pattern_count,
+            "version": snapshot.version,
             "file_path": self.blacklist_path,
             "file_exists": os.path.exists(self.blacklist_path),
-            "last_loaded": "At startup"  # Could be enhanced with timestamp
+            "last_loaded": snapshot.loaded_at
         }
 
+    def search_index(self) -> BlacklistSearchIndex:
+        """
+        Get the search index of the current blacklist, built once per snapshot.
+
+        Returns:
+            BlacklistSearchIndex, terms sorted case-insensitively
+        """
+        snapshot = self.snapshot()
+        indexed, index = self._search_cache
+        if indexed is not snapshot or index is None:
+            index = BlacklistSearchIndex(snapshot.terms)
+            self._search_cache = (snapshot, index)
+        return index
+
     def search_blacklist(self, query: str, limit: int = 50) -> List[str]:
         """
         Search for terms in the blacklist.
@@ -182,22 +343,32 @@ class BlacklistManager:
         if not query:
             return []
 
-        query_lower = query.lower()
-        matches = [
-            term for term in _blacklist_cache
-            if query_lower in term.lower()
-        ]
-
-        return sorted(matches)[:limit]
+        return self.search_index().substring(query, limit=limit)[0]
 
-    def export_blacklist(self) -> str:
+    def page_blacklist(self, query: Optional[str] = None, match: str = SEARCH_SUBSTRING,
+                       after: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
         """
-        Export blacklist as CSV string.
+        Get a page of blacklist terms, optionally restricted to a search.
+
+        Args:
+            query: Text searched (case-insensitive), all terms when empty
+            match: 'substring' or 'prefix'
+            after: Cursor returned as 'next_after' by the previous page
+            limit: Page size
 
         Returns:
-            CSV string representation of the blacklist
+            Dict with 'terms' and 'next_after' (None on the last page)
         """
-        import io
+        index = self.search_index()
+        if not query:
+            terms, next_after = index.page(after, limit)
+        elif match == SEARCH_PREFIX:
+            terms, next_after = index.prefix(query, after, limit)
+        else:
+            terms, next_after = index.substring(query, after, limit)
+        return {"terms": terms, "next_after": next_after}
+
+    def _to_csv(self, terms: Iterable[str]) -> str:
         output = io.StringIO()
         writer = csv.writer(output)
 
@@ -205,11 +376,27 @@ class BlacklistManager:
         writer.writerow(["term"])
 
         # Write all terms
-        for term in sorted(_blacklist_cache):
+        for term in sorted(terms):
             writer.writerow([term])
 
         return output.getvalue()
 
+    def export_blacklist(self) -> str:
+        """
+        Export blacklist as CSV string.
+
+        The CSV is built once per snapshot and reused until the blacklist changes.
+
+        Returns:
+            CSV string representation of the blacklist
+        """
+        snapshot = self.snapshot()
+        exported, csv_content = self._export_cache
+        if exported is not snapshot:
+            csv_content = self._to_csv(snapshot.terms)
+            self._export_cache = (snapshot, csv_content)
+        return csv_content
+
     def import_blacklist_from_csv(self, csv_content: str, overwrite: bool = False) -> dict:
         """
         Import blacklist from CSV content.
@@ -219,40 +406,33 @@ class BlacklistManager:
             overwrite: Whether to overwrite existing blacklist
 
         Returns:
-            Dictionary with import results
+            Dictionary with import results; 'added_terms' lists the terms that were not
+            in the blacklist before, 'invalid_terms' the ones skipped as invalid
         """
         try:
-            # Parse CSV content
-            import io
-            csv_file = io.StringIO(csv_content)
-            reader = csv.reader(csv_file)
-
-            # Skip header if exists
-            first_row = next(reader, None)
-            if first_row and first_row[0].lower() in ['term', 'word', 'pattern']:
-                pass  # Header row
-
-            new_terms = set()
-            for row in reader:
-                if row and row[0]:
-                    term = row[0].strip()
-                    if term and term != '':
-                        new_terms.add(term)
-
+            new_terms = _read_terms(csv.reader(io.StringIO(csv_content)))
+            invalid_terms = sorted(term for term in new_terms if invalid_term_reason(term))
+            new_terms.difference_update(invalid_terms)
+
+            def merge(terms: Set[str]) -> Tuple[int, Set[str]]:
+                added = new_terms - terms
+                if overwrite:
+                    terms.clear()
+                terms.update(new_terms)
+                return len(terms), added
+
+            total_terms, added_terms = self._update(merge)
             if overwrite:
-                _blacklist_cache = new_terms
-                self._save_blacklist()
                 logger.info(f"Overwrote blacklist with {len(new_terms)} terms")
             else:
-                # Merge with existing blacklist
-                _blacklist_cache.update(new_terms)
-                self._save_blacklist()
-                logger.info(f"Added {len(new_terms)} new terms to blacklist (total: {len(_blacklist_cache)})")
+                logger.info(f"Added {len(new_terms)} new terms to blacklist (total: {total_terms})")
 
             return {
                 "success": True,
                 "imported_terms": len(new_terms),
-                "total_terms": len(_blacklist_cache),
+                "added_terms": sorted(added_terms),
+                "invalid_terms": invalid_terms,
+                "total_terms": total_terms,
                 "overwrite": overwrite
             }
 
@@ -265,4 +445,4 @@ class BlacklistManager:
 
 
 # Global blacklist manager instance
-blacklist_manager = BlacklistManager()
\ No newline at end of file
+blacklist_manager = BlacklistManager()
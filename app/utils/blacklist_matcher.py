@@ -0,0 +1,270 @@
+import logging
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Prefix of blacklist entries holding a regular expression
+REGEX_PREFIX = "re:"
+# Wildcard marking prefix (`term*`), suffix (`*term`) and substring (`*term*`) entries
+WILDCARD = "*"
+
+# Sentinels framing a name so that prefix, suffix and substring entries share one automaton
+_START = "\x02"
+_END = "\x03"
+# Punctuation kept by squash_name because it changes what a name refers to (C#, C++)
+_SIGNIFICANT_PUNCTUATION = frozenset("#+")
+# Exact entries squashed to fewer characters keep their punctuation: "Py-" or "-IO" would otherwise match "py" or "I/O"
+MIN_SQUASHED_LENGTH = 3
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fold_name(name: str) -> str:
+    """
+    Normalize a software name for pattern matching.
+
+    Applies Unicode NFKC normalization and case folding and collapses whitespace, so
+    that "Ｗｅｂ  Audio" and "web audio" compare equal while punctuation is kept.
+
+    Args:
+        name: Software name
+
+    Returns:
+        Folded name
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", name).casefold()).strip()
+
+
+def squash_name(name: str) -> str:
+    """
+    Normalize a software name for exact blacklist lookups.
+
+    Folds the name like fold_name and removes whitespace and punctuation, so that
+    "Mon-goDB", "MongoDB" and "mongo db" compare equal.
+
+    Args:
+        name: Software name
+
+    Returns:
+        Squashed name
+    """
+    return _squash_folded(fold_name(name))
+
+
+def _squash_folded(folded: str) -> str:
+    return "".join(
+        char for char in folded
+        if not char.isspace() and (char in _SIGNIFICANT_PUNCTUATION or not unicodedata.category(char).startswith("P"))
+    )
+
+
+def _exact_key(folded: str) -> str:
+    # Applied to entries and names alike, so a short name is never compared with a squashed entry
+    squashed = _squash_folded(folded)
+    return squashed if len(squashed) >= MIN_SQUASHED_LENGTH else folded
+
+
+def _is_exact_entry(term: str) -> bool:
+    return not (term.startswith(REGEX_PREFIX) or term.startswith(WILDCARD) or term.endswith(WILDCARD))
+
+
+def _compile_expression(expression: str) -> Pattern[str]:
+    # Wrapped as it is in the alternation, so inline global flags such as (?i) are rejected here
+    return re.compile(f"(?:{expression})", re.IGNORECASE)
+
+
+def invalid_term_reason(term: str) -> Optional[str]:
+    """
+    Tell why a blacklist entry cannot be used.
+
+    Args:
+        term: Raw blacklist entry
+
+    Returns:
+        Reason the entry is invalid, or None if it is valid
+    """
+    term = term.strip()
+    if not term:
+        return "empty entry"
+    if term.startswith(REGEX_PREFIX):
+        try:
+            _compile_expression(term[len(REGEX_PREFIX):])
+        except re.error as e:
+            return f"invalid regular expression: {e}"
+        return None
+    if term.startswith(WILDCARD) or term.endswith(WILDCARD):
+        if not fold_name(term.strip(WILDCARD)):
+            return "pattern without any character to match"
+    elif not squash_name(term):
+        # Would match every name made only of punctuation
+        return "entry without any letter or digit"
+    return None
+
+
+class _AhoCorasick:
+    """Aho-Corasick automaton telling whether a text contains any of a set of literal words."""
+
+    def __init__(self, words: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[bool] = [False]
+
+        for word in words:
+            state = 0
+            for char in word:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._terminal.append(False)
+                state = next_state
+            self._terminal[state] = True
+
+        # Breadth-first, so the failure state of a node is always computed before its children
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._terminal[next_state] = self._terminal[next_state] or self._terminal[self._fail[next_state]]
+                queue.append(next_state)
+
+    def search(self, text: str) -> bool:
+        """Return True if any word occurs in `text`, reading it once."""
+        goto, fail, terminal = self._goto, self._fail, self._terminal
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if terminal[state]:
+                return True
+        return False
+
+
+class BlacklistMatcher:
+    """
+    Compiled form of the blacklist.
+
+    Entries are interpreted as:
+    - `term`: exact match, ignoring case, Unicode compatibility forms, whitespace and punctuation
+      (punctuation is kept when fewer than MIN_SQUASHED_LENGTH letters and digits remain)
+    - `term*`, `*term`, `*term*`: prefix, suffix and substring match on the folded name
+    - `re:expression`: case-insensitive regular expression searched in the folded name
+
+    Exact entries are a set lookup. Prefix, suffix and substring entries are compiled into
+    one Aho-Corasick automaton run over the name framed by start and end sentinels, and
+    regular expressions into a single alternation, so checking a name reads it once per
+    structure whatever the number of entries. Expressions with groups are compiled on
+    their own, since their group names and numbers would clash in the alternation.
+    Invalid entries (see invalid_term_reason) are ignored. Instances are immutable once built.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        """
+        Compile the blacklist.
+
+        Args:
+            terms: Raw blacklist entries
+        """
+        exact = set()
+        words = []
+        expressions = []
+        patterns: List[Pattern[str]] = []
+
+        for term in terms:
+            term = term.strip()
+            if not term:
+                continue
+            reason = invalid_term_reason(term)
+            if reason:
+                logger.warning(f"Ignoring blacklist entry '{term}': {reason}")
+                continue
+            if term.startswith(REGEX_PREFIX):
+                expression = term[len(REGEX_PREFIX):]
+                pattern = _compile_expression(expression)
+                if pattern.groups:
+                    patterns.append(pattern)
+                else:
+                    expressions.append(f"(?:{expression})")
+                continue
+
+            leading, trailing = term.startswith(WILDCARD), term.endswith(WILDCARD)
+            literal = fold_name(term.strip(WILDCARD))
+            if leading and trailing:
+                words.append(literal)
+            elif trailing:
+                words.append(_START + literal)
+            elif leading:
+                words.append(literal + _END)
+            else:
+                exact.add(_exact_key(fold_name(term)))
+
+        self._exact = frozenset(exact)
+        self._affixes = _AhoCorasick(words) if words else None
+        self.pattern_count = len(words) + len(expressions) + len(patterns)
+        if expressions:
+            # Each part compiled alone, without groups or global flags: the alternation compiles too
+            patterns.insert(0, re.compile("|".join(expressions), re.IGNORECASE))
+        self._expressions: Tuple[Pattern[str], ...] = tuple(patterns)
+
+    def __len__(self) -> int:
+        return len(self._exact) + self.pattern_count
+
+    def matches(self, name: str) -> bool:
+        """
+        Check whether a software name is blacklisted.
+
+        Args:
+            name: Software name, e.g. the mention normalizedForm
+
+        Returns:
+            True if any blacklist entry matches the name
+        """
+        if not name:
+            return False
+        folded = fold_name(name)
+        if _exact_key(folded) in self._exact:
+            return True
+        if self._affixes is not None and self._affixes.search(_START + folded + _END):
+            return True
+        return any(pattern.search(folded) is not None for pattern in self._expressions)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self.matches(name)
+
+
+def find_short_entry_collisions(terms: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Find the names matched by a short exact entry besides the entries themselves.
+
+    Exact entries with fewer than MIN_SQUASHED_LENGTH letters and digits keep their
+    punctuation. Each of them is probed with its letters and digits alone and with common
+    punctuation around them, so a regression making "Py-" match "py" again is reported.
+
+    Args:
+        terms: Raw blacklist entries
+
+    Returns:
+        Names wrongly matched by each short exact entry, empty if there are none
+    """
+    exact = [term.strip() for term in terms if not invalid_term_reason(term) and _is_exact_entry(term.strip())]
+    entries = {fold_name(term) for term in exact}
+    collisions = {}
+    for term in exact:
+        squashed = squash_name(term)
+        if len(squashed) >= MIN_SQUASHED_LENGTH:
+            continue
+        matcher = BlacklistMatcher([term])
+        probes = {squashed, f"-{squashed}", f"{squashed}-", f"{squashed}:", ".".join(squashed)}
+        names = sorted(name for name in probes if fold_name(name) not in entries and matcher.matches(name))
+        if names:
+            collisions[term] = names
+    return collisions
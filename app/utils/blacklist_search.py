@@ -0,0 +1,122 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Length of the n-grams indexed for substring queries
+NGRAM_SIZE = 3
+
+
+def _ngrams(text: str) -> Iterator[str]:
+    for start in range(len(text) - NGRAM_SIZE + 1):
+        yield text[start:start + NGRAM_SIZE]
+
+
+def _contains(positions: List[int], position: int) -> bool:
+    """Membership test in a sorted posting list."""
+    index = bisect_left(positions, position)
+    return index < len(positions) and positions[index] == position
+
+
+class BlacklistSearchIndex:
+    """
+    Search index over one version of the blacklist terms.
+
+    Terms are kept in a single array sorted by (lowercase term, term), which is the
+    order of every result. Prefix queries are a binary search in that array; substring
+    queries intersect the posting lists of the query trigrams and check the few
+    candidates left. Results are paged with the last term returned as cursor.
+    Instances are immutable once built.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        """
+        Build the index.
+
+        Args:
+            terms: Blacklist terms
+        """
+        self._keys: List[Tuple[str, str]] = sorted((term.lower(), term) for term in terms)
+        self.terms: Tuple[str, ...] = tuple(term for _, term in self._keys)
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for position, (lower, _) in enumerate(self._keys):
+            for gram in set(_ngrams(lower)):
+                postings[gram].append(position)
+        # Positions are appended in increasing order, so every posting list is sorted
+        self._postings = dict(postings)
+
+    def _start(self, after: Optional[str]) -> int:
+        """Position of the first term after the cursor."""
+        return bisect_right(self._keys, (after.lower(), after)) if after is not None else 0
+
+    def _page(self, positions: Iterable[int], limit: int) -> Tuple[List[str], Optional[str]]:
+        limit = max(limit, 1)
+        page = []
+        for position in positions:
+            if len(page) == limit:
+                return page, page[-1]
+            page.append(self.terms[position])
+        return page, None
+
+    def page(self, after: Optional[str] = None, limit: int = 50) -> Tuple[List[str], Optional[str]]:
+        """
+        Page through all the terms.
+
+        Args:
+            after: Cursor returned by the previous page
+            limit: Page size
+
+        Returns:
+            Tuple of (terms, cursor of the next page or None on the last page)
+        """
+        return self._page(range(self._start(after), len(self.terms)), limit)
+
+    def prefix(self, prefix: str, after: Optional[str] = None, limit: int = 50) -> Tuple[List[str], Optional[str]]:
+        """
+        Page through the terms starting with `prefix`, ignoring case.
+
+        Args:
+            prefix: Prefix searched
+            after: Cursor returned by the previous page
+            limit: Page size
+
+        Returns:
+            Tuple of (terms, cursor of the next page or None on the last page)
+        """
+        prefix = prefix.lower()
+        start = max(bisect_left(self._keys, (prefix,)), self._start(after))
+
+        def positions() -> Iterator[int]:
+            for position in range(start, len(self._keys)):
+                if not self._keys[position][0].startswith(prefix):
+                    return
+                yield position
+
+        return self._page(positions(), limit)
+
+    def substring(self, query: str, after: Optional[str] = None,
+                  limit: int = 50) -> Tuple[List[str], Optional[str]]:
+        """
+        Page through the terms containing `query`, ignoring case.
+
+        Args:
+            query: Substring searched
+            after: Cursor returned by the previous page
+            limit: Page size
+
+        Returns:
+            Tuple of (terms, cursor of the next page or None on the last page)
+        """
+        query = query.lower()
+        start = self._start(after)
+
+        if len(query) < NGRAM_SIZE:
+            # Too short to be indexed, but such queries match early: scan until the page is full
+            candidates: Iterable[int] = range(start, len(self._keys))
+        else:
+            postings = sorted((self._postings.get(gram, []) for gram in set(_ngrams(query))), key=len)
+            shortest, others = postings[0], postings[1:]
+            candidates = (shortest[index] for index in range(bisect_left(shortest, start), len(shortest))
+                          if all(_contains(other, shortest[index]) for other in others))
+
+        return self._page((position for position in candidates if query in self._keys[position][0]), limit)
@@ -0,0 +1,108 @@
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from dotenv import dotenv_values, find_dotenv
+
+logger = logging.getLogger(__name__)
+
+# How often the .env modification time is checked, in seconds
+CONFIG_CHECK_INTERVAL_SECONDS = float(os.getenv("CONFIG_CHECK_INTERVAL", 2.0))
+
+
+class ConfigRegistry:
+    """
+    Environment configuration loaded once and reloaded only when it changes.
+
+    Values come from the process environment, overridden by the .env file as
+    load_dotenv(override=True) did. The file is parsed again when its modification time
+    changes (checked at most every CONFIG_CHECK_INTERVAL_SECONDS) or after SIGHUP, and
+    each reload bumps `version` so callers can rebuild what they derive from it.
+    """
+
+    def __init__(self, env_path: Optional[str] = None, check_interval: float = CONFIG_CHECK_INTERVAL_SECONDS):
+        """
+        Initialize the registry.
+
+        Args:
+            env_path: Path of the .env file, found like load_dotenv() does when omitted
+            check_interval: Minimum time between two modification time checks
+        """
+        self.env_path = env_path or os.getenv("DOTENV_PATH") or find_dotenv() or ".env"
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._values: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._reload_requested = True
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.env_path).st_mtime
+        except OSError:
+            return None
+
+    def _load(self) -> None:
+        """Parse the .env file and publish a new snapshot of the values."""
+        mtime = self._file_mtime()
+        values = dict(os.environ)
+        if mtime is not None:
+            values.update({key: value for key, value in dotenv_values(self.env_path).items() if value is not None})
+        # Replace rather than mutate, so readers holding the previous snapshot are unaffected
+        self._values = values
+        self._mtime = mtime
+        self.version += 1
+        logger.info(f"Configuration loaded from {self.env_path if mtime is not None else 'environment'} "
+                    f"(version {self.version})")
+
+    def snapshot(self) -> Tuple[int, Dict[str, str]]:
+        """
+        Get the current configuration, reloading it first if it changed.
+
+        Returns:
+            Tuple of (version, values); the values dict must not be modified
+        """
+        now = time.monotonic()
+        if self._reload_requested or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self._reload_requested or now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    if self._reload_requested or self._file_mtime() != self._mtime:
+                        self._reload_requested = False
+                        self._load()
+        return self.version, self._values
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Get a configuration value."""
+        return self.snapshot()[1].get(key, default)
+
+    def request_reload(self) -> None:
+        """Reload on next access, whatever the file modification time."""
+        self._reload_requested = True
+
+    def install_sighup_handler(self) -> bool:
+        """
+        Reload the configuration on SIGHUP, chaining any handler already installed.
+
+        Returns:
+            bool: True if the handler was installed (only possible from the main thread)
+        """
+        if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+            return False
+
+        previous = signal.getsignal(signal.SIGHUP)
+
+        def handle_sighup(signum, frame):
+            self.request_reload()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGHUP, handle_sighup)
+        return True
+
+
+config_registry = ConfigRegistry()
@@ -1,20 +1,238 @@
 import json
-import csv
+import hashlib
+import itertools
 import logging
+import os
+import random
+import re
 import requests
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Union
 from pyArango.connection import Connection
-from pyArango.theExceptions import CreationError
+from pyArango.theExceptions import AQLQueryError, CreationError, TransactionError
 from pyArango.database import Database
 from pyArango.collection import Collection
 from werkzeug.datastructures import FileStorage
 from flask import current_app
 
+from app.utils.blacklist_matcher import BlacklistMatcher
+from app.utils.json_stream import iter_json_array
+from app.utils.mention_dedup import Deduplicator
+from app.utils.pagination import PAGE_SIZE, clamp_limit
+from app.utils.response_cache import document_tag, invalidate, software_name_tag
+
 logger = logging.getLogger(__name__)
 
 # Global database manager instance
 db_manager: Union['DatabaseManager', None] = None
 
+# ArangoDB error number raised when a unique constraint (including _key) is violated
+ERROR_ARANGO_UNIQUE_CONSTRAINT_VIOLATED = 1210
+# ArangoDB error number raised when two transactions write the same document at the same time
+ERROR_ARANGO_CONFLICT = 1200
+
+# Collection holding outgoing notifications until the dispatcher sends them
+OUTBOX_COLLECTION = "notification_outbox"
+# Collection holding received COAR notifications until the inbox consumer processes them
+INBOX_COLLECTION = "inbox_notifications"
+# Collection remembering the ids of received notifications pruned from the inbox log, to keep rejecting redeliveries
+INBOX_RECEIVED_COLLECTION = "inbox_received_ids"
+# Collection mapping the id of every outgoing notification to the software mentions it covers
+NOTIFICATION_CORRELATION_COLLECTION = "notification_correlations"
+# Collection tracking background jobs and their progress
+JOBS_COLLECTION = "jobs"
+# Collection holding one entity per normalized software name, with counters over its mentions
+SOFTWARE_ENTITY_COLLECTION = "software_entities"
+# Counters of software entities that can rank them, each with its own index
+SOFTWARE_ENTITY_RANKINGS = ("mention_count", "document_count", "verified_count")
+# Collection holding the statistics counters, spread over STATS_SHARDS documents
+STATS_COLLECTION = "stats"
+# Number of documents the statistics counters are spread over, so that concurrent writers seldom meet
+STATS_SHARDS = int(os.getenv("STATS_SHARDS", 16))
+# Shards tried by one statistics write before giving up
+_STATS_WRITE_ATTEMPTS = 3
+
+# Number of software mentions written per AQL statement during ingestion
+INGEST_BATCH_SIZE = 500
+# Number of results fetched per round trip when reading query results
+AQL_BATCH_SIZE = int(os.getenv("AQL_BATCH_SIZE", 1000))
+# Seconds a streaming cursor is kept alive on the server between two batches
+AQL_CURSOR_TTL_SECONDS = int(os.getenv("AQL_CURSOR_TTL", 120))
+
+# Attribute names accepted in a `fields` projection, and how many can be requested
+_FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_\-]{0,63}$")
+MAX_PROJECTION_FIELDS = 32
+
+# Characters ArangoDB accepts in a document _key
+_VALID_KEY_PATTERN = re.compile(r"^[a-zA-Z0-9_\-:.@()+,=;$!*'%]{1,254}$")
+
+
+class DocumentExistsError(Exception):
+    """Raised when an uploaded document is already stored."""
+
+
+class InvalidDocumentError(ValueError):
+    """Raised when an uploaded document is not valid JSON or its mentions lack required fields."""
+
+
+def key_from_identifier(identifier: str) -> str:
+    """
+    Derive a deterministic _key from an external identifier.
+
+    Identifiers are used as-is when they are valid ArangoDB keys, otherwise
+    a SHA-1 digest of the identifier is used.
+
+    Args:
+        identifier: External identifier (HAL id, notification id, ...)
+
+    Returns:
+        The _key to use
+    """
+    if _VALID_KEY_PATTERN.match(identifier):
+        return identifier
+    return hashlib.sha1(identifier.encode("utf-8")).hexdigest()
+
+
+def parse_projection(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a `fields` query parameter into the attributes to return.
+
+    Args:
+        fields: Comma-separated top-level attribute names, e.g. "software_name,verification_by_author"
+
+    Returns:
+        Attribute names, or None when no projection is requested
+
+    Raises:
+        ValueError: If an attribute name is invalid or too many are requested
+    """
+    if fields is None or not fields.strip():
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if len(names) > MAX_PROJECTION_FIELDS:
+        raise ValueError(f"At most {MAX_PROJECTION_FIELDS} fields can be requested")
+    for name in names:
+        if not _FIELD_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid field name '{name}'")
+    return names
+
+
+def document_key_from_hal_id(hal_id: str) -> str:
+    """
+    Derive the deterministic `documents` _key for a HAL identifier.
+
+    Args:
+        hal_id: HAL document identifier (file_hal_id)
+
+    Returns:
+        The _key to use for the document
+    """
+    return key_from_identifier(hal_id)
+
+
+def software_entity_key(name: str) -> str:
+    """
+    Derive the `software_entities` _key of a normalized software name.
+
+    Args:
+        name: Normalized software name
+
+    Returns:
+        The _key of the entity
+    """
+    return key_from_identifier(name)
+
+
+def mention_stats(mentions: int, verified: int, rejected: int) -> Dict[str, int]:
+    """
+    Statistics deltas of mentions added (positive counts) or removed (negative counts).
+
+    Args:
+        mentions: Number of mentions
+        verified: How many of them are verified by their authors
+        rejected: How many of them are rejected by their authors
+
+    Returns:
+        Deltas of the mention counters, see DatabaseManager.record_stats
+    """
+    return {
+        "mentions": mentions,
+        "verified": verified,
+        "rejected": rejected,
+        "pending": mentions - verified - rejected,
+    }
+
+
+def notification_stat(provider: Optional[str], outcome: str) -> str:
+    """Name of the statistics counter of a notification outcome ('sent' or 'failed') for a provider."""
+    return f"notifications:{provider or 'unknown'}:{outcome}"
+
+
+# Applies verification changes of mentions to the counters of their entities, and sums them
+# up in `verification_delta` for the statistics. Expects a `changes` variable: list of
+# { entity_key, old, new, blacklisted } with verification_by_author before and after the update
+# (true: verified, false: rejected, null: pending). Blacklisted mentions are no longer counted.
+_ENTITY_VERIFICATION_AQL = f"""
+    LET counted_changes = changes[* FILTER CURRENT.blacklisted != true]
+    LET entity_updates = (
+        FOR change IN counted_changes
+            FILTER change.entity_key != null AND change.old != change.new
+            COLLECT entity_key = change.entity_key AGGREGATE
+                verified = SUM((change.new == true ? 1 : 0) - (change.old == true ? 1 : 0)),
+                rejected = SUM((change.new == false ? 1 : 0) - (change.old == false ? 1 : 0))
+            LET entity = DOCUMENT("{SOFTWARE_ENTITY_COLLECTION}", entity_key)
+            FILTER entity != null
+            UPDATE entity WITH {{
+                verified_count: entity.verified_count + verified,
+                rejected_count: entity.rejected_count + rejected,
+                pending_count: entity.pending_count - verified - rejected,
+                updated_at: DATE_NOW()
+            }} IN {SOFTWARE_ENTITY_COLLECTION} OPTIONS {{ exclusive: true }}
+            RETURN 1
+    )
+    LET verification_delta = {{
+        verified: SUM(counted_changes[* RETURN (CURRENT.new == true ? 1 : 0) - (CURRENT.old == true ? 1 : 0)]),
+        rejected: SUM(counted_changes[* RETURN (CURRENT.new == false ? 1 : 0) - (CURRENT.old == false ? 1 : 0)])
+    }}
+"""
+
+
+def is_unique_constraint_violation(error: Exception) -> bool:
+    """
+    Check whether an exception raised by pyArango is a unique constraint violation.
+
+    Args:
+        error: Exception raised by a query or a document write
+
+    Returns:
+        True if ArangoDB reported a unique constraint violation
+    """
+    errors = getattr(error, "errors", None)
+    return isinstance(errors, dict) and errors.get("errorNum") == ERROR_ARANGO_UNIQUE_CONSTRAINT_VIOLATED
+
+
+def is_write_conflict(error: Exception) -> bool:
+    """
+    Check whether an exception raised by pyArango is a write-write conflict.
+
+    Args:
+        error: Exception raised by a query or a document write
+
+    Returns:
+        True if ArangoDB reported a conflict with a concurrent write
+    """
+    errors = getattr(error, "errors", None)
+    return isinstance(errors, dict) and errors.get("errorNum") == ERROR_ARANGO_CONFLICT
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
 class DatabaseManager:
     """
@@ -129,12 +347,9 @@ class DatabaseManager:
             except Exception:
                 pass
 
-            # Get collection count
+            # Collection count from the list pyArango keeps, refreshed when a collection is created
             try:
-                db = self.get_database()
-                coll_info = db.fetchCollections()
-                if isinstance(coll_info, dict) and "result" in coll_info:
-                    info["collections"] = len(coll_info["result"])
+                info["collections"] = len(self.get_database().collections)
             except Exception:
                 pass
 
@@ -188,7 +403,7 @@ class DatabaseManager:
         return None
 
     def execute_aql_query(self, query: str, bind_vars: Optional[Dict[str, Any]] = None,
-                          raw_results: bool = False) -> Any:
+                          raw_results: bool = False, batch_size: int = AQL_BATCH_SIZE) -> Any:
         """
         Execute an AQL query.
 
@@ -196,6 +411,7 @@ class DatabaseManager:
             query: AQL query string
             bind_vars: Bind variables for the query
             raw_results: Whether to return raw results
+            batch_size: Number of results fetched per round trip
 
         Returns:
             Query results
@@ -205,180 +421,508 @@ class DatabaseManager:
         """
         try:
             db = self.get_database()
-            result = db.AQLQuery(query, bindVars=bind_vars or {}, rawResults=raw_results)
+            result = db.AQLQuery(query, bindVars=bind_vars or {}, rawResults=raw_results, batchSize=batch_size)
             logger.debug(f"Executed AQL query: {query[:100]}...")
             return result
         except Exception as e:
             logger.error(f"AQL query failed: {query[:100]}... Error: {e}")
             raise
 
-    def load_blacklist(self, csv_path: str = "./app/static/data/blacklist.csv") -> set:
+    def iter_aql_query(self, query: str, bind_vars: Optional[Dict[str, Any]] = None,
+                       batch_size: int = AQL_BATCH_SIZE, stream: bool = True) -> Iterator[Any]:
         """
-        Load blacklist terms from CSV file.
+        Execute an AQL query and iterate over its raw results lazily.
+
+        Only one batch of results is held in memory at a time. With `stream`, the server
+        also produces results as they are fetched instead of computing the whole result
+        first, so the first rows are available before the query finishes. The query is
+        sent, and its errors raised, when this method is called; a cursor left before its
+        end (the iterator is closed or garbage collected) is deleted on the server.
 
         Args:
-            csv_path: Path to the blacklist CSV file
+            query: AQL query string
+            bind_vars: Bind variables for the query
+            batch_size: Number of results fetched per round trip
+            stream: Whether to use a streaming cursor
 
         Returns:
-            Set of blacklisted terms
+            Iterator over the query results, as dictionaries
+
+        Raises:
+            Exception: If query execution fails
         """
-        blacklist = set()
         try:
-            with open(csv_path, newline="", encoding="utf-8") as csvfile:
-                reader = csv.reader(csvfile)
-                next(reader, None)  # skip header if exists
-                for row in reader:
-                    if row and row[0]:
-                        blacklist.add(row[0].strip())
-            logger.debug(f"Loaded {len(blacklist)} terms from blacklist")
+            db = self.get_database()
+            result = db.AQLQuery(query, bindVars=bind_vars or {}, rawResults=True, batchSize=batch_size,
+                                 options={"stream": stream}, ttl=AQL_CURSOR_TTL_SECONDS)
+            logger.debug(f"Streaming AQL query: {query[:100]}...")
         except Exception as e:
-            logger.warning(f"Failed to load blacklist from {csv_path}: {e}")
-
-        return blacklist
+            logger.error(f"AQL query failed: {query[:100]}... Error: {e}")
+            raise
+        return self._iter_cursor(result)
 
-    def remove_duplicates(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _iter_cursor(self, result: Any) -> Iterator[Any]:
+        """Yield the results of a pyArango query, deleting its server cursor if left early."""
+        exhausted = False
+        try:
+            for row in result:
+                yield row
+            exhausted = True
+        finally:
+            cursor = getattr(result, "cursor", None)
+            if not exhausted and cursor is not None and result.response.get("hasMore"):
+                try:
+                    self.connect().session.delete(cursor.getURL())
+                except Exception as e:
+                    logger.warning(f"Failed to delete AQL cursor {cursor.id}: {e}")
+
+    def begin_transaction(self, write: List[str], read: Optional[List[str]] = None,
+                          exclusive: Optional[List[str]] = None) -> str:
         """
-        Remove duplicate JSON objects by hashing.
+        Begin a server-side stream transaction.
 
         Args:
-            items: List of dictionaries to deduplicate
+            write: Collections written by the transaction
+            read: Collections only read by the transaction
+            exclusive: Collections written by the transaction and locked against other writers
 
         Returns:
-            List with duplicates removed
-        """
-        seen = set()
-        unique = []
-        for item in items:
-            key = json.dumps(item, sort_keys=True)
-            if key not in seen:
-                seen.add(key)
-                unique.append(item)
+            The transaction id, to pass to execute_aql_in_transaction and commit/abort
 
-        logger.debug(f"Removed {len(items) - len(unique)} duplicates")
-        return unique
+        Raises:
+            TransactionError: If the transaction cannot be started
+        """
+        db = self.get_database()
+        payload = {
+            "collections": {"write": write, "read": read or [], "exclusive": exclusive or []},
+            "allowImplicit": False
+        }
+        response = self.connect().session.post(f"{db.getTransactionURL()}/begin", data=json.dumps(payload))
+        data = response.json()
+        if response.status_code >= 400 or data.get("error"):
+            raise TransactionError(data.get("errorMessage", "Failed to begin transaction"), "begin", data)
+        return data["result"]["id"]
 
-    def document_exists(self, collection_name: str, key_field: str, key_value: str) -> bool:
+    def commit_transaction(self, transaction_id: str) -> None:
         """
-        Check if a document exists in a collection.
+        Commit a stream transaction.
 
         Args:
-            collection_name: Name of the collection
-            key_field: Field name to check
-            key_value: Value to match
+            transaction_id: Id returned by begin_transaction
 
-        Returns:
-            True if document exists, False otherwise
+        Raises:
+            TransactionError: If the commit fails
+        """
+        db = self.get_database()
+        response = self.connect().session.put(f"{db.getTransactionURL()}/{transaction_id}")
+        data = response.json()
+        if response.status_code >= 400 or data.get("error"):
+            raise TransactionError(data.get("errorMessage", "Failed to commit transaction"), "commit", data)
+
+    def abort_transaction(self, transaction_id: str) -> None:
+        """
+        Abort a stream transaction, discarding all its writes.
+
+        Args:
+            transaction_id: Id returned by begin_transaction
         """
         try:
-            query = f"FOR d IN {collection_name} FILTER d.{key_field} == @value RETURN 1"
-            result = self.execute_aql_query(query, bind_vars={"value": key_value}, raw_results=True)
-            return len(list(result)) > 0
+            db = self.get_database()
+            self.connect().session.delete(f"{db.getTransactionURL()}/{transaction_id}")
         except Exception as e:
-            logger.error(f"Failed to check document existence: {e}")
-            return False
+            logger.error(f"Failed to abort transaction {transaction_id}: {e}")
 
-    def insert_document_as_json(
-            self,
-            document_id: str,
-            file_json: Union[FileStorage, Dict[str, Any]],
-            blacklist_csv: str = "./app/static/data/blacklist.csv"
-    ) -> bool:
+    def execute_aql_in_transaction(self, query: str, bind_vars: Optional[Dict[str, Any]],
+                                   transaction_id: str) -> List[Any]:
         """
-        Insert a JSON file into ArangoDB with document, software, and edge collections.
+        Execute an AQL query inside a stream transaction.
 
         Args:
-            document_id: Unique identifier for the document
-            file_json: File object or dictionary containing the data
-            blacklist_csv: Path to blacklist CSV file
+            query: AQL query string
+            bind_vars: Bind variables for the query
+            transaction_id: Id returned by begin_transaction
 
         Returns:
-            True if inserted, False if already exists or failed
+            List of raw query results
+
+        Raises:
+            AQLQueryError: If query execution fails
         """
-        try:
-            # Get collections
-            documents_collection = self.check_or_create_collection("documents")
-            software_collection = self.check_or_create_collection("software")
-            doc_soft_edge = self.check_or_create_collection("edge_doc_to_software", "Edges")
+        db = self.get_database()
+        session = self.connect().session
+        headers = {"x-arango-trx-id": transaction_id}
+        payload = {"query": query, "bindVars": bind_vars or {}, "batchSize": 1000}
+
+        response = session.post(db.getCursorsURL(), data=json.dumps(payload, default=str), headers=headers)
+        data = response.json()
+        results = []
+        while True:
+            if response.status_code >= 400 or data.get("error"):
+                logger.error(f"AQL query failed in transaction {transaction_id}: {query[:100]}... "
+                             f"Error: {data.get('errorMessage')}")
+                raise AQLQueryError(data.get("errorMessage", "Query failed"), query, data)
+            results.extend(data.get("result", []))
+            if not data.get("hasMore"):
+                return results
+            response = session.put(f"{db.getCursorsURL()}/{data['id']}", headers=headers)
+            data = response.json()
+
+    def iter_unique(self, items: Iterable[Dict[str, Any]],
+                    deduplicator: Optional[Deduplicator] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield JSON objects, skipping duplicates.
 
-            # Load blacklist
-            blacklist = self.load_blacklist(blacklist_csv)
+        Only a 64-bit hash of each object seen is kept in memory.
 
-            # Process input
-            if hasattr(file_json, "read"):
-                data_json = json.load(file_json)
-            else:
-                data_json = file_json
+        Args:
+            items: Dictionaries to deduplicate
+            deduplicator: Deduplicator defining which fields identify an object and
+                counting the duplicates dropped; whole objects are compared by default
 
-            # Check if document already exists
-            if self.document_exists("documents", "file_hal_id", document_id):
-                logger.warning(f"Document with ID '{document_id}' already exists in DB. Skipping.")
-                return False
+        Yields:
+            Dictionaries not seen before
+        """
+        return (deduplicator or Deduplicator()).filter(items)
 
-            # Insert main document
-            document_document = documents_collection.createDocument({"file_hal_id": document_id})
-            document_document.save()
-            logger.debug(f"Created document with ID: {document_id}")
+    def iter_mentions_to_insert(self, mentions: Iterable[Dict[str, Any]],
+                                blacklist: BlacklistMatcher,
+                                deduplicator: Optional[Deduplicator] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily deduplicate and blacklist-filter raw mentions, renaming fields for storage.
+
+        Args:
+            mentions: Raw mentions, as found in the software.json `mentions` array
+            blacklist: Compiled blacklist the normalized names are checked against
+            deduplicator: Deduplicator counting the duplicates dropped, by default one
+                comparing the MENTION_DEDUP_FIELDS of the mentions
 
-            # Process mentions
-            mentions = self.remove_duplicates(data_json.get("mentions", []))
-            inserted_count = 0
+        Yields:
+            Mentions ready to be stored in the software collection, linked to their entity
+        """
+        for mention in self.iter_unique(mentions, deduplicator or Deduplicator.for_mentions()):
+            norm_name = mention["software-name"]["normalizedForm"]
+            if norm_name not in blacklist:
+                # Rename fields for consistency
+                mention["software_name"] = mention.pop("software-name")
+                mention["software_type"] = mention.pop("software-type")
+                mention["entity_key"] = software_entity_key(norm_name)
+                yield mention
+
+    def bulk_insert_document(self, document_id: str, mentions: Iterable[Dict[str, Any]],
+                             batch_size: int = INGEST_BATCH_SIZE,
+                             notify_providers: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Insert a document, its software mentions and the linking edges in bulk.
+
+        Mentions are consumed lazily and written in batches of `batch_size`, one AQL
+        statement per batch, so memory use does not depend on the number of mentions.
+        When they all fit in one batch the whole write is a single AQL statement;
+        otherwise the batches run in one stream transaction. Either way the write is
+        atomic: either everything is stored or nothing is.
+        The document _key is derived from the HAL identifier, so a concurrent or repeated
+        upload of the same document fails on the _key unique constraint instead of creating
+        a duplicate.
+
+        Outgoing notifications, one per software name and provider, are written to the
+        notification outbox as part of the same write, to be sent by the outbox dispatcher.
+        Each gets its notification id here, recorded in the correlation collection against
+        the software keys it covers so that replies can be resolved without a name match.
+        The counters of the software entities of the mentions are updated in the same write,
+        with an exclusive lock on the entity collection so concurrent uploads never conflict.
 
-            for mention in mentions:
-                norm_name = mention["software-name"]["normalizedForm"]
-                if norm_name not in blacklist:
-                    # Rename fields for consistency
-                    mention["software_name"] = mention.pop("software-name")
-                    mention["software_type"] = mention.pop("software-type")
+        Args:
+            document_id: HAL document identifier (file_hal_id)
+            mentions: Software mentions to store, already deduplicated and filtered
+            batch_size: Maximum number of mentions written per AQL statement
+            notify_providers: Providers to queue notifications for (ProviderType values)
+
+        Returns:
+            Dict with the created document, software, edge and outbox keys
+
+        Raises:
+            DocumentExistsError: If the document is already stored
+            InvalidDocumentError: If the mentions could not be read
+            Exception: If the write failed, after rolling it back
+        """
+        insert_document_aql = """
+            LET doc = FIRST(
+                INSERT { _key: @document_key, file_hal_id: @document_id } INTO documents
+                RETURN NEW
+            )
+
+            LET software = (
+                FOR mention IN @mentions
+                    INSERT mention INTO software
+                    RETURN {
+                        _id: NEW._id,
+                        _key: NEW._key,
+                        name: NEW.software_name.normalizedForm,
+                        context: NEW.context,
+                        entity_key: NEW.entity_key,
+                        verification: NEW.verification_by_author
+                    }
+            )
 
-                    # Insert software document
-                    software_document = software_collection.createDocument(mention)
-                    software_document.save()
+            LET edge_keys = (
+                FOR soft IN software
+                    INSERT { _from: doc._id, _to: soft._id } INTO edge_doc_to_software
+                    RETURN NEW._key
+            )
+        """
 
-                    # Create edge from document to software
-                    edge_doc_soft = doc_soft_edge.createEdge()
-                    edge_doc_soft['_from'] = document_document._id
-                    edge_doc_soft['_to'] = software_document._id
-                    edge_doc_soft.save()
+        enqueue_notifications_aql = f"""
+            LET outbox_keys = (
+                FOR soft IN software
+                    COLLECT software_name = soft.name INTO mentions_group = soft
+                    FOR provider IN @providers
+                        // urn:uuid ids are valid _keys, so key_from_identifier() maps them to themselves
+                        LET notification_id = CONCAT("urn:uuid:", UUID())
+                        INSERT {{
+                            _key: notification_id,
+                            notification_id: notification_id,
+                            document_id: @document_id,
+                            provider: provider,
+                            software_name: software_name,
+                            software_keys: mentions_group[*]._key,
+                            created_at: DATE_ISO8601(DATE_NOW())
+                        }} INTO {NOTIFICATION_CORRELATION_COLLECTION}
+                        INSERT {{
+                            notification_id: notification_id,
+                            document_id: @document_id,
+                            provider: provider,
+                            software_name: software_name,
+                            contexts: mentions_group[*].context,
+                            software_keys: mentions_group[*]._key,
+                            status: "pending",
+                            attempts: 0,
+                            created_at: DATE_ISO8601(DATE_NOW()),
+                            available_at: DATE_NOW()
+                        }} INTO {OUTBOX_COLLECTION}
+                        RETURN NEW._key
+            )
+        """
 
-                    inserted_count += 1
+        # Each software name of the document adds one document to its entity
+        update_entities_aql = f"""
+            LET entity_keys = (
+                FOR soft IN software
+                    FILTER soft.entity_key != null
+                    COLLECT entity_key = soft.entity_key, name = soft.name AGGREGATE
+                        mentions = COUNT(1),
+                        verified = SUM(soft.verification == true ? 1 : 0),
+                        rejected = SUM(soft.verification == false ? 1 : 0)
+                    UPSERT {{ _key: entity_key }}
+                        INSERT {{
+                            _key: entity_key,
+                            name: name,
+                            mention_count: mentions,
+                            document_count: 1,
+                            verified_count: verified,
+                            rejected_count: rejected,
+                            pending_count: mentions - verified - rejected,
+                            updated_at: DATE_NOW()
+                        }}
+                        UPDATE {{
+                            mention_count: OLD.mention_count + mentions,
+                            document_count: OLD.document_count + 1,
+                            verified_count: OLD.verified_count + verified,
+                            rejected_count: OLD.rejected_count + rejected,
+                            pending_count: OLD.pending_count + mentions - verified - rejected,
+                            updated_at: DATE_NOW()
+                        }}
+                        IN {SOFTWARE_ENTITY_COLLECTION} OPTIONS {{ exclusive: true }}
+                    RETURN NEW._key
+            )
+        """
 
-            logger.info(f"Inserted {inserted_count} software mentions for document with ID: {document_id}")
-            return True
+        return_created_aql = """
+            RETURN {
+                document_key: doc._key,
+                software_keys: software[*]._key,
+                edge_keys: edge_keys,
+                outbox_keys: outbox_keys
+            }
+        """
+
+        insert_mentions_query = """
+            LET software = (
+                FOR mention IN @mentions
+                    INSERT mention INTO software
+                    RETURN { _id: NEW._id, _key: NEW._key }
+            )
+
+            LET edge_keys = (
+                FOR soft IN software
+                    INSERT { _from: @document_handle, _to: soft._id } INTO edge_doc_to_software
+                    RETURN NEW._key
+            )
+
+            RETURN {
+                software_keys: software[*]._key,
+                edge_keys: edge_keys
+            }
+        """
+
+        finish_document_query = """
+            LET software = (
+                FOR soft IN 1..1 OUTBOUND @document_handle edge_doc_to_software
+                    RETURN {
+                        _key: soft._key,
+                        name: soft.software_name.normalizedForm,
+                        context: soft.context,
+                        entity_key: soft.entity_key,
+                        verification: soft.verification_by_author
+                    }
+            )
+        """ + enqueue_notifications_aql + update_entities_aql + """
+            RETURN outbox_keys
+        """
+
+        transaction_id = None
+        try:
+            document_key = document_key_from_hal_id(document_id)
+            document_handle = f"documents/{document_key}"
+            providers = notify_providers or []
+            batches = _batched(mentions, batch_size)
+            first_batch = next(batches, [])
+            next_batch = next(batches, None)
+
+            bind_vars = {
+                'document_key': document_key,
+                'document_id': document_id,
+                'mentions': first_batch
+            }
+
+            if next_batch is None:
+                query = insert_document_aql + enqueue_notifications_aql + update_entities_aql + return_created_aql
+                bind_vars['providers'] = providers
+                result = self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True)
+                return list(result)[0]
+
+            transaction_id = self.begin_transaction(
+                write=["documents", "software", "edge_doc_to_software", OUTBOX_COLLECTION,
+                       NOTIFICATION_CORRELATION_COLLECTION],
+                exclusive=[SOFTWARE_ENTITY_COLLECTION]
+            )
+            query = insert_document_aql + "LET outbox_keys = []" + return_created_aql
+            created = self.execute_aql_in_transaction(query, bind_vars, transaction_id)[0]
+
+            for batch in itertools.chain([next_batch], batches):
+                added = self.execute_aql_in_transaction(
+                    insert_mentions_query,
+                    {'document_handle': document_handle, 'mentions': batch},
+                    transaction_id
+                )[0]
+                created["software_keys"].extend(added["software_keys"])
+                created["edge_keys"].extend(added["edge_keys"])
+
+            # Notifications and entity counters are computed once, over all the mentions written
+            created["outbox_keys"] = self.execute_aql_in_transaction(
+                finish_document_query,
+                {'document_handle': document_handle, 'document_id': document_id, 'providers': providers},
+                transaction_id
+            )[0]
+
+            self.commit_transaction(transaction_id)
+            return created
 
         except Exception as e:
-            logger.error(f"Failed to insert JSON file: {e}")
-            return False
+            if transaction_id:
+                self.abort_transaction(transaction_id)
+            if is_unique_constraint_violation(e):
+                logger.warning(f"Document with ID '{document_id}' already exists in DB. Skipping.")
+                raise DocumentExistsError(document_id) from e
+            if not isinstance(e, InvalidDocumentError):
+                logger.error(f"Failed to bulk insert document {document_id}: {e}")
+            raise
 
-    def get_software_notifications(self, document_id: str) -> List[Dict[str, Any]]:
+    def insert_document_as_json(
+            self,
+            document_id: str,
+            file_json: Union[FileStorage, Dict[str, Any]],
+            blacklist: Optional[BlacklistMatcher] = None,
+            notify_providers: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
         """
-        Get software notifications for a HAL document.
+        Insert a JSON file into ArangoDB with document, software, and edge collections.
+
+        File uploads are parsed incrementally: mentions are read one at a time from the
+        stream, deduplicated and filtered on the fly and written in bounded batches, so
+        memory per upload stays roughly constant whatever the file size. Mentions are
+        deduplicated on the MENTION_DEDUP_FIELDS, so the same mention repeated with
+        different scores is stored once.
 
         Args:
-            document_id: HAL document identifier
+            document_id: Unique identifier for the document
+            file_json: File object or dictionary containing the data
+            blacklist: Compiled blacklist, the current snapshot of the blacklist manager by default
+            notify_providers: Providers to queue notifications for in the outbox
 
         Returns:
-            List of notification data
+            Dict with the created keys and the number of duplicate mentions dropped
+            (`duplicates_dropped`)
+
+        Raises:
+            DocumentExistsError: If the document is already stored
+            InvalidDocumentError: If the file is not valid JSON or a mention lacks a required field
+            Exception: If the database write failed
         """
         try:
-            query = """
-                FOR doc IN documents
-                    FILTER doc.file_hal_id == @document_id
-                    FOR edge IN edge_doc_to_software
-                        FILTER edge._from == doc._id
-                        LET mention = DOCUMENT(edge._to)
-                        COLLECT softwareName = mention.software_name.normalizedForm INTO mentionsGroup
-                        RETURN {
-                            softwareName: softwareName,
-                            contexts: mentionsGroup[*].mention.context
-                        }
-            """
+            # Make sure the collections exist before the bulk write
+            self.check_or_create_collection("documents")
+            self.check_or_create_collection("software")
+            self.check_or_create_collection("edge_doc_to_software", "Edges")
+            self.check_or_create_collection(OUTBOX_COLLECTION)
+            self.check_or_create_collection(NOTIFICATION_CORRELATION_COLLECTION)
+            self.check_or_create_collection(SOFTWARE_ENTITY_COLLECTION)
+            self.check_or_create_collection(STATS_COLLECTION)
+
+            # In-memory blacklist snapshot, refreshed by the manager when another worker changes it
+            if blacklist is None:
+                from app.utils.blacklist_manager import blacklist_manager
+                blacklist = blacklist_manager.get_matcher()
+
+            # Process input
+            if hasattr(file_json, "read"):
+                mentions = iter_json_array(file_json, "mentions")
+            else:
+                mentions = file_json.get("mentions", [])
 
-            result = self.execute_aql_query(query, bind_vars={'document_id': document_id}, raw_results=True)
-            return list(result)
+            deduplicator = Deduplicator.for_mentions()
+            names = set()
 
+            def track_names(to_insert: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+                # The file is parsed while it is written, so input errors surface here
+                while True:
+                    try:
+                        mention = next(to_insert)
+                    except StopIteration:
+                        return
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        raise InvalidDocumentError(f"Invalid document: {e}") from e
+                    names.add(mention["software_name"]["normalizedForm"])
+                    yield mention
+
+            created = self.bulk_insert_document(
+                document_id,
+                track_names(self.iter_mentions_to_insert(mentions, blacklist, deduplicator)),
+                notify_providers=notify_providers
+            )
+
+            invalidate(document_tag(document_id), *(software_name_tag(name) for name in names))
+            # Uploaded mentions are not verified yet
+            self.record_stats({"documents": 1, **mention_stats(len(created["software_keys"]), 0, 0)})
+
+            created["duplicates_dropped"] = deduplicator.duplicates
+            logger.info(f"Inserted {len(created['software_keys'])} software mentions for document with ID: "
+                        f"{document_id} ({deduplicator.duplicates} duplicates dropped)")
+            return created
+
+        except (DocumentExistsError, InvalidDocumentError):
+            raise
         except Exception as e:
-            logger.error(f"Failed to get software notifications for {document_id}: {e}")
-            return []
+            logger.error(f"Failed to insert JSON file: {e}")
+            raise
 
     def update_software_with_author_validation(self, document_id: str, software_name: str, accepted: bool) -> bool:
         """
@@ -394,13 +938,22 @@ class DatabaseManager:
         """
         try:
             query = """
-                FOR doc IN documents
-                    FILTER doc.file_hal_id == @hal_id
-                    FOR edge_soft IN edge_doc_to_software
-                        FILTER edge_soft._from == doc._id
-                        LET software = DOCUMENT(edge_soft._to)
-                        FILTER software.software_name.normalizedForm == @software_name
-                        UPDATE software WITH { verification_by_author: @verification } IN software
+                LET changes = (
+                    FOR doc IN documents
+                        FILTER doc.file_hal_id == @hal_id
+                        FOR mention IN 1..1 OUTBOUND doc edge_doc_to_software
+                            FILTER mention.software_name.normalizedForm == @software_name
+                            UPDATE mention WITH { verification_by_author: @verification } IN software
+                            RETURN {
+                                key: NEW._key,
+                                entity_key: NEW.entity_key,
+                                old: OLD.verification_by_author,
+                                new: NEW.verification_by_author,
+                                blacklisted: NEW.blacklisted
+                            }
+                )
+            """ + _ENTITY_VERIFICATION_AQL + """
+                RETURN { updated: changes[*].key, verification_delta: verification_delta }
             """
 
             bind_vars = {
@@ -409,10 +962,12 @@ class DatabaseManager:
                 'verification': accepted
             }
 
-            result = self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True)
-            updated_count = len(list(result))
+            result = list(self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True))[0]
+            updated_count = len(result['updated'])
 
             if updated_count > 0:
+                invalidate(document_tag(document_id), software_name_tag(software_name))
+                self._record_verification_stats(result['verification_delta'])
                 logger.info(f"Updated verification status for {updated_count} software entries "
                             f"(HAL: {document_id}, Software: {software_name}, Status: {accepted})")
             else:
@@ -424,6 +979,157 @@ class DatabaseManager:
             logger.error(f"Failed to update software verification: {e}")
             return False
 
+    def update_software_verification_by_notification(self, notification_id: str,
+                                                     accepted: bool) -> Optional[List[str]]:
+        """
+        Update the verification status of the software mentions covered by a sent notification.
+
+        The mentions are found through the correlation recorded when the notification was
+        queued: one key lookup, then an update of each covered software _key.
+
+        Args:
+            notification_id: Id of the notification we sent (the reply's inReplyTo)
+            accepted: Verification status
+
+        Returns:
+            Keys of the updated software entries, or None if the notification id is unknown
+            or the update failed
+        """
+        try:
+            query = f"""
+                LET correlation = DOCUMENT("{NOTIFICATION_CORRELATION_COLLECTION}", @key)
+                LET changes = (
+                    FOR software_key IN (correlation == null ? [] : correlation.software_keys)
+                        UPDATE software_key WITH {{ verification_by_author: @verification }} IN software
+                        OPTIONS {{ ignoreErrors: true }}
+                        RETURN {{
+                            key: NEW._key,
+                            entity_key: NEW.entity_key,
+                            old: OLD.verification_by_author,
+                            new: NEW.verification_by_author,
+                            blacklisted: NEW.blacklisted
+                        }}
+                )
+            """ + _ENTITY_VERIFICATION_AQL + """
+                RETURN {
+                    found: correlation != null,
+                    document_id: correlation.document_id,
+                    software_name: correlation.software_name,
+                    updated: changes[*].key,
+                    verification_delta: verification_delta
+                }
+            """
+
+            bind_vars = {
+                'key': key_from_identifier(notification_id),
+                'verification': accepted
+            }
+
+            result = list(self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True))[0]
+            if not result['found']:
+                logger.info(f"No correlation recorded for notification {notification_id}")
+                return None
+
+            if result['updated']:
+                invalidate(document_tag(result['document_id']), software_name_tag(result['software_name']))
+                self._record_verification_stats(result['verification_delta'])
+            logger.info(f"Updated verification status for {len(result['updated'])} software entries "
+                        f"(notification: {notification_id}, Status: {accepted})")
+            return result['updated']
+
+        except Exception as e:
+            logger.error(f"Failed to update software verification for notification {notification_id}: {e}")
+            return None
+
+    def bulk_update_software_verification(self, updates: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Apply many author verification updates in a single AQL statement.
+
+        Each update resolves its software mentions through the correlation of the
+        notification it answers when 'notification_id' is given and known, and by software
+        name within the document otherwise. When several updates touch the same mention,
+        the last one in the list wins, as if they had been applied one by one.
+
+        Args:
+            updates: Dicts with 'document_id', 'software_name', 'accepted' and optionally
+                'notification_id', in the order they should be applied
+
+        Returns:
+            One dict per update, in the same order, with the 'software_keys' it resolved to and
+            the number of them 'updated'; None if the statement failed
+        """
+        if not updates:
+            return []
+
+        try:
+            query = f"""
+                LET resolved = (
+                    FOR item IN @items
+                        LET correlation = item.correlation_key == null ? null
+                            : DOCUMENT("{NOTIFICATION_CORRELATION_COLLECTION}", item.correlation_key)
+                        LET software_keys = correlation != null ? correlation.software_keys : (
+                            FOR doc IN documents
+                                FILTER doc.file_hal_id == item.document_id
+                                FOR mention IN 1..1 OUTBOUND doc edge_doc_to_software
+                                    FILTER mention.software_name.normalizedForm == item.software_name
+                                    RETURN mention._key
+                        )
+                        RETURN {{ index: item.index, accepted: item.accepted, software_keys: software_keys }}
+                )
+                LET changes = (
+                    FOR item IN resolved
+                        FOR software_key IN item.software_keys
+                            COLLECT key = software_key INTO group = {{ index: item.index, accepted: item.accepted }}
+                            LET last = MAX(group[*].index)
+                            LET verification = FIRST(group[* FILTER CURRENT.index == last RETURN CURRENT.accepted])
+                            UPDATE key WITH {{ verification_by_author: verification }} IN software
+                            OPTIONS {{ ignoreErrors: true }}
+                            RETURN {{
+                                key: NEW._key,
+                                entity_key: NEW.entity_key,
+                                old: OLD.verification_by_author,
+                                new: NEW.verification_by_author,
+                                blacklisted: NEW.blacklisted
+                            }}
+                )
+            """ + _ENTITY_VERIFICATION_AQL + """
+                LET updated = changes[*].key
+                RETURN {
+                    results: (
+                        FOR item IN resolved
+                            SORT item.index
+                            LET software_keys = INTERSECTION(item.software_keys, updated)
+                            RETURN { software_keys: software_keys, updated: LENGTH(software_keys) }
+                    ),
+                    verification_delta: verification_delta
+                }
+            """
+
+            items = [
+                {
+                    'index': index,
+                    'document_id': update['document_id'],
+                    'software_name': update['software_name'],
+                    'accepted': bool(update['accepted']),
+                    'correlation_key': (key_from_identifier(update['notification_id'])
+                                        if update.get('notification_id') else None)
+                }
+                for index, update in enumerate(updates)
+            ]
+
+            batch = list(self.execute_aql_query(query, bind_vars={'items': items}, raw_results=True))[0]
+            results = batch['results']
+            self._record_verification_stats(batch['verification_delta'])
+            invalidate(*(tag for item, result in zip(items, results) if result['updated']
+                         for tag in (document_tag(item['document_id']), software_name_tag(item['software_name']))))
+            logger.info(f"Applied {len(updates)} verification updates in one batch "
+                        f"({sum(result['updated'] for result in results)} software entries updated)")
+            return results
+
+        except Exception as e:
+            logger.error(f"Failed to apply {len(updates)} software verification updates: {e}")
+            return None
+
     def get_collection_count(self, collection_name: str) -> int:
         """
         Get the count of documents in a collection.
@@ -443,12 +1149,17 @@ class DatabaseManager:
             logger.error(f"Failed to get collection count for {collection_name}: {e}")
             return 0
 
-    def get_document_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+    def get_document_by_id(self, id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """
         Get a document by id with related softwares
 
+        Mentions are read with a one-step traversal over the edge index and, when
+        `fields` is given, reduced to those attributes on the server. Mentions flagged as
+        blacklisted are left out.
+
         Args:
             id: Document id
+            fields: Attributes of the mentions to return, all of them by default
 
         Returns:
             Document data with related softwares or None if not found
@@ -457,18 +1168,18 @@ class DatabaseManager:
             query = """
                 FOR doc IN documents
                     FILTER doc.file_hal_id == @id
+                    LIMIT 1
                     LET mentions = (
-                        FOR edge IN edge_doc_to_software
-                            FILTER edge._from == doc._id
-                            LET software = DOCUMENT(edge._to)
-                            RETURN software
+                        FOR software IN 1..1 OUTBOUND doc edge_doc_to_software
+                            FILTER software.blacklisted != true
+                            RETURN @fields == null ? software : KEEP(software, @fields)
                     )
                     RETURN {
                         document: doc,
                         mentions: mentions
                     }
             """
-            result = self.execute_aql_query(query, bind_vars={'id': id}, raw_results=True)
+            result = self.execute_aql_query(query, bind_vars={'id': id, 'fields': fields}, raw_results=True)
             docs = list(result)
             if docs:
                 return docs[0]
@@ -481,6 +1192,11 @@ class DatabaseManager:
         """
         Delete a document and all its associated software mentions by file_hal_id.
 
+        The counters of the software entities of the mentions are decreased in the same
+        statement; entities left without mentions are kept with zero counters. Notifications
+        of the document not sent yet are cancelled and the correlations of its notifications
+        are dropped, so that no offer announces a mention that no longer exists.
+
         Args:
             document_id: HAL document identifier (file_hal_id)
 
@@ -503,6 +1219,29 @@ class DatabaseManager:
                             RETURN DOCUMENT(edge._to)
                 )
 
+                // Blacklisted mentions were already taken out of the counters
+                LET counted = software_to_delete[* FILTER CURRENT.blacklisted != true]
+
+                LET entity_updates = (
+                    FOR software IN counted
+                        FILTER software.entity_key != null
+                        COLLECT entity_key = software.entity_key AGGREGATE
+                            mentions = COUNT(1),
+                            verified = SUM(software.verification_by_author == true ? 1 : 0),
+                            rejected = SUM(software.verification_by_author == false ? 1 : 0)
+                        LET entity = DOCUMENT("software_entities", entity_key)
+                        FILTER entity != null
+                        UPDATE entity WITH {
+                            mention_count: entity.mention_count - mentions,
+                            document_count: entity.document_count - 1,
+                            verified_count: entity.verified_count - verified,
+                            rejected_count: entity.rejected_count - rejected,
+                            pending_count: entity.pending_count - (mentions - verified - rejected),
+                            updated_at: DATE_NOW()
+                        } IN software_entities OPTIONS { exclusive: true }
+                        RETURN 1
+                )
+
                 LET delete_edges = (
                     FOR edge IN edge_doc_to_software
                         FILTER edge._from IN DOCUMENT(doc)._id
@@ -520,18 +1259,64 @@ class DatabaseManager:
                         REMOVE d IN documents
                 )
 
+                LET notifications = (
+                    FOR entry IN notification_outbox
+                        FILTER entry.document_id == @document_id
+                        RETURN entry
+                )
+
+                LET cancel_notifications = (
+                    FOR entry IN notifications
+                        FILTER entry.status IN @unsent
+                        UPDATE entry WITH {
+                            status: @cancelled,
+                            cancelled_at: DATE_NOW(),
+                            last_error: "Document deleted"
+                        } IN notification_outbox
+                        RETURN 1
+                )
+
+                LET delete_correlations = (
+                    FOR entry IN notifications
+                        FILTER entry.notification_id != null
+                        REMOVE entry.notification_id IN notification_correlations OPTIONS { ignoreErrors: true }
+                )
+
                 RETURN {
                     deleted: true,
                     document_id: @document_id,
-                    software_deleted: COUNT(software_to_delete)
+                    software_deleted: COUNT(software_to_delete),
+                    software_names: UNIQUE(software_to_delete[*].software_name.normalizedForm),
+                    notifications_cancelled: LENGTH(cancel_notifications),
+                    stats: {
+                        documents: LENGTH(doc),
+                        mentions: LENGTH(counted),
+                        verified: LENGTH(counted[* FILTER CURRENT.verification_by_author == true]),
+                        rejected: LENGTH(counted[* FILTER CURRENT.verification_by_author == false])
+                    }
                 }
             """
 
-            result = self.execute_aql_query(query, bind_vars={'document_id': document_id}, raw_results=True)
+            from app.utils.outbox import STATUS_CANCELLED, STATUS_DEAD_LETTER, STATUS_PENDING, STATUS_SENDING
+
+            bind_vars = {
+                'document_id': document_id,
+                # Dead letters too: a replay would announce the deleted mentions
+                'unsent': [STATUS_PENDING, STATUS_SENDING, STATUS_DEAD_LETTER],
+                'cancelled': STATUS_CANCELLED
+            }
+            result = self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True)
             deletion_result = list(result)
 
             if deletion_result:
+                software_names = deletion_result[0].pop("software_names", None) or []
+                invalidate(document_tag(document_id), *(software_name_tag(name) for name in software_names))
                 software_count = deletion_result[0].get("software_deleted", 0)
+                stats = deletion_result[0].pop("stats")
+                self.record_stats({
+                    "documents": -stats["documents"],
+                    **mention_stats(-stats["mentions"], -stats["verified"], -stats["rejected"])
+                })
                 logger.info(f"Successfully deleted document {document_id} and {software_count} software entries")
                 return deletion_result[0]
             else:
@@ -542,73 +1327,429 @@ class DatabaseManager:
             logger.error(f"Failed to delete document {document_id}: {e}")
             return None
 
-    def get_software_by_normalized_name(self, name: str) -> List[Dict[str, Any]]:
+    def iter_documents(self, after: Optional[str] = None, limit: int = PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate lazily over a page of documents, ordered by HAL identifier, plus one look-ahead.
+
+        Documents are streamed from the server; the page is cut on the HAL identifier with
+        its unique index, so every page costs the same whatever its depth. Up to limit + 1
+        documents are returned: an extra document means that another page follows.
+
+        Args:
+            after: HAL identifier of the last document of the previous page
+            limit: Page size, capped to MAX_PAGE_SIZE
+
+        Returns:
+            Iterator over the documents
+        """
+        query = """
+            FOR doc IN documents
+                FILTER @after == null OR doc.file_hal_id > @after
+                SORT doc.file_hal_id
+                LIMIT @limit
+                RETURN doc
+        """
+        bind_vars = {'after': after, 'limit': clamp_limit(limit) + 1}
+        return self.iter_aql_query(query, bind_vars=bind_vars)
+
+    def get_software_entity(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the summary of a software name: its mention, document and verification counters.
+
+        A single primary-key lookup in the software entity collection.
+
+        Args:
+            name: Normalized software name
+
+        Returns:
+            Entity document, or None if the name was never ingested
+        """
+        try:
+            query = f"""
+                LET entity = DOCUMENT("{SOFTWARE_ENTITY_COLLECTION}", @key)
+                FILTER entity != null
+                RETURN UNSET(entity, "_id", "_rev")
+            """
+            result = list(self.execute_aql_query(query, bind_vars={'key': software_entity_key(name)},
+                                                 raw_results=True))
+            return result[0] if result else None
+
+        except Exception as e:
+            logger.error(f"Failed to get software entity {name}: {e}")
+            return None
+
+    def get_top_software(self, by: str = "mention_count", limit: int = PAGE_SIZE) -> List[Dict[str, Any]]:
         """
-        Get software documents by normalized name.
+        Get the software names with the highest value of a counter.
+
+        Reads the first entries of the index on the counter, so the cost depends on the
+        limit, not on the number of names.
+
+        Args:
+            by: Counter ranked on, one of SOFTWARE_ENTITY_RANKINGS
+            limit: Number of names returned, capped to MAX_PAGE_SIZE
+
+        Returns:
+            Entity documents, highest counter first
+        """
+        if by not in SOFTWARE_ENTITY_RANKINGS:
+            raise ValueError(f"Unknown ranking '{by}'")
+
+        try:
+            query = f"""
+                FOR entity IN {SOFTWARE_ENTITY_COLLECTION}
+                    SORT entity.{by} DESC
+                    FILTER entity.{by} > 0
+                    LIMIT @limit
+                    RETURN UNSET(entity, "_id", "_rev")
+            """
+            return list(self.execute_aql_query(query, bind_vars={'limit': clamp_limit(limit)}, raw_results=True))
+
+        except Exception as e:
+            logger.error(f"Failed to get top software by {by}: {e}")
+            return []
+
+    def rebuild_software_entities(self, batch_size: int = INGEST_BATCH_SIZE) -> int:
+        """
+        Recompute the software entities from the stored mentions and link every mention to its entity.
+
+        Counters are set to their absolute values, so this is idempotent; it is meant to
+        populate the entities of existing data and to repair them, while no upload runs.
+        Entities whose name no longer has any mention are reset to zero. Mentions flagged as
+        blacklisted are not counted.
+
+        Args:
+            batch_size: Number of names written per AQL statement
+
+        Returns:
+            int: Number of entities written
+        """
+        self.check_or_create_collection(SOFTWARE_ENTITY_COLLECTION)
+        aggregate_query = """
+            FOR soft IN software
+                FILTER soft.blacklisted != true
+                LET document = FIRST(
+                    FOR edge IN edge_doc_to_software
+                        FILTER edge._to == soft._id
+                        RETURN edge._from
+                )
+                COLLECT name = soft.software_name.normalizedForm AGGREGATE
+                    mentions = COUNT(1),
+                    documents = COUNT_DISTINCT(document),
+                    verified = SUM(soft.verification_by_author == true ? 1 : 0),
+                    rejected = SUM(soft.verification_by_author == false ? 1 : 0)
+                FILTER name != null
+                RETURN { name, mentions, documents, verified, rejected }
+        """
+        write_entities_query = f"""
+            FOR item IN @items
+                LET entity = {{
+                    name: item.name,
+                    mention_count: item.mentions,
+                    document_count: item.documents,
+                    verified_count: item.verified,
+                    rejected_count: item.rejected,
+                    pending_count: item.mentions - item.verified - item.rejected,
+                    updated_at: DATE_NOW()
+                }}
+                UPSERT {{ _key: item.key }}
+                    INSERT MERGE(entity, {{ _key: item.key }})
+                    REPLACE entity
+                    IN {SOFTWARE_ENTITY_COLLECTION} OPTIONS {{ exclusive: true }}
+        """
+        link_mentions_query = """
+            FOR item IN @items
+                FOR soft IN software
+                    FILTER soft.software_name.normalizedForm == item.name
+                    FILTER soft.entity_key != item.key
+                    UPDATE soft WITH { entity_key: item.key } IN software
+        """
+
+        reset_stale_query = f"""
+            FOR entity IN {SOFTWARE_ENTITY_COLLECTION}
+                FILTER entity.updated_at < @started_at
+                UPDATE entity WITH {{
+                    mention_count: 0,
+                    document_count: 0,
+                    verified_count: 0,
+                    rejected_count: 0,
+                    pending_count: 0,
+                    updated_at: DATE_NOW()
+                }} IN {SOFTWARE_ENTITY_COLLECTION} OPTIONS {{ exclusive: true }}
+        """
+
+        started_at = list(self.execute_aql_query("RETURN DATE_NOW()", raw_results=True))[0]
+        written = 0
+        # Not streamed: the whole aggregate is computed before the mentions are updated
+        groups = self.iter_aql_query(aggregate_query, stream=False)
+        for batch in _batched(groups, batch_size):
+            items = [dict(group, key=software_entity_key(group["name"])) for group in batch]
+            self.execute_aql_query(write_entities_query, bind_vars={'items': items})
+            self.execute_aql_query(link_mentions_query, bind_vars={'items': items})
+            written += len(items)
+        self.execute_aql_query(reset_stale_query, bind_vars={'started_at': started_at})
+
+        logger.info(f"Rebuilt {written} software entities")
+        return written
+
+    def record_stats(self, deltas: Dict[str, int]) -> None:
+        """
+        Add deltas to the statistics counters.
+
+        Counters are spread over STATS_SHARDS documents and each write updates one of them,
+        picked at random, so concurrent writers seldom touch the same document; a write that
+        conflicts with another one moves on to the next shard. Statistics are written after
+        the change they count and never fail it: errors are logged, and rebuild_stats
+        recomputes the counters from the data.
+
+        Args:
+            deltas: Increment of each counter, e.g. {"documents": 1, "mentions": 12}
+        """
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+
+        query = f"""
+            UPSERT {{ _key: @key }}
+                INSERT MERGE(@deltas, {{ _key: @key, updated_at: DATE_NOW() }})
+                UPDATE MERGE(
+                    ZIP(ATTRIBUTES(@deltas), ATTRIBUTES(@deltas)[* RETURN (OLD[CURRENT] || 0) + @deltas[CURRENT]]),
+                    {{ updated_at: DATE_NOW() }}
+                )
+                IN {STATS_COLLECTION}
+        """
+        shard = random.randrange(STATS_SHARDS)
+        for attempt in range(_STATS_WRITE_ATTEMPTS):
+            key = str((shard + attempt) % STATS_SHARDS)
+            try:
+                self.execute_aql_query(query, bind_vars={'key': key, 'deltas': deltas})
+                return
+            except Exception as e:
+                # Two writers inserting the same new shard also collide on its _key
+                if (is_write_conflict(e) or is_unique_constraint_violation(e)) \
+                        and attempt + 1 < _STATS_WRITE_ATTEMPTS:
+                    continue
+                logger.error(f"Failed to record statistics {deltas}: {e}")
+                return
+
+    def _record_verification_stats(self, delta: Dict[str, int]) -> None:
+        """Record the verification_delta computed by _ENTITY_VERIFICATION_AQL."""
+        self.record_stats(mention_stats(0, delta['verified'], delta['rejected']))
+
+    def get_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the statistics: documents, mentions by verification status and notification
+        outcomes by provider.
+
+        Sums the STATS_SHARDS counter documents, whatever the amount of data.
+
+        Returns:
+            Dict with 'documents', 'mentions', 'notifications' and 'updated_at' (epoch
+            milliseconds of the last change), or None if the counters cannot be read
+        """
+        try:
+            query = f"""
+                FOR shard IN {STATS_COLLECTION}
+                    RETURN UNSET(shard, "_key", "_id", "_rev")
+            """
+            totals: Dict[str, int] = {}
+            updated_at = None
+            for shard in self.execute_aql_query(query, raw_results=True):
+                shard_updated_at = shard.pop("updated_at", None)
+                if shard_updated_at is not None:
+                    updated_at = max(updated_at or 0, shard_updated_at)
+                for name, value in shard.items():
+                    totals[name] = totals.get(name, 0) + value
+
+            notifications: Dict[str, Dict[str, int]] = {}
+            for name, value in totals.items():
+                if name.startswith("notifications:"):
+                    _, provider, outcome = name.split(":", 2)
+                    notifications.setdefault(provider, {"sent": 0, "failed": 0})[outcome] = value
+
+            return {
+                "documents": totals.get("documents", 0),
+                "mentions": {
+                    "total": totals.get("mentions", 0),
+                    "verified": totals.get("verified", 0),
+                    "rejected": totals.get("rejected", 0),
+                    "pending": totals.get("pending", 0),
+                },
+                "notifications": notifications,
+                "updated_at": updated_at,
+            }
+
+        except Exception as e:
+            logger.error(f"Failed to get statistics: {e}")
+            return None
+
+    def rebuild_stats(self) -> Dict[str, int]:
+        """
+        Recompute the statistics counters from the stored data.
+
+        Documents and the mentions not flagged as blacklisted are counted again; notifications
+        sent are the sent outbox entries and failed ones the delivery attempts recorded on the
+        entries. The counters are written to a single shard and the others removed, so this
+        is meant to run while nothing is being written, e.g. from a migration.
+
+        Returns:
+            Dict: The counters written
+        """
+        from app.utils.outbox import STATUS_SENT
+
+        self.check_or_create_collection(STATS_COLLECTION)
+        query = f"""
+            LET mentions = FIRST(
+                FOR soft IN software
+                    FILTER soft.blacklisted != true
+                    COLLECT AGGREGATE
+                        total = COUNT(1),
+                        verified = SUM(soft.verification_by_author == true ? 1 : 0),
+                        rejected = SUM(soft.verification_by_author == false ? 1 : 0)
+                    RETURN {{ total, verified, rejected }}
+            )
+            LET notifications = (
+                FOR entry IN {OUTBOX_COLLECTION}
+                    LET is_sent = entry.status == @sent ? 1 : 0
+                    COLLECT provider = entry.provider AGGREGATE
+                        sent = SUM(is_sent),
+                        failed = SUM(MAX([0, (entry.attempts || 0) - is_sent]))
+                    RETURN {{ provider, sent, failed }}
+            )
+            RETURN {{ documents: LENGTH(documents), mentions, notifications }}
+        """
+        result = list(self.execute_aql_query(query, bind_vars={'sent': STATUS_SENT}, raw_results=True))[0]
+
+        mentions = result["mentions"] or {}
+        counters = {
+            "documents": result["documents"],
+            **mention_stats(mentions.get("total") or 0, mentions.get("verified") or 0,
+                            mentions.get("rejected") or 0)
+        }
+        for item in result["notifications"]:
+            counters[notification_stat(item["provider"], "sent")] = item["sent"]
+            counters[notification_stat(item["provider"], "failed")] = item["failed"]
+
+        self.execute_aql_query(f"FOR shard IN {STATS_COLLECTION} REMOVE shard IN {STATS_COLLECTION}")
+        self.execute_aql_query(
+            f"INSERT MERGE(@counters, {{ _key: '0', updated_at: DATE_NOW() }}) INTO {STATS_COLLECTION}",
+            bind_vars={'counters': counters}
+        )
+
+        logger.info(f"Rebuilt statistics: {counters}")
+        return counters
+
+    def get_software_by_normalized_name(self, name: str, after: Optional[str] = None,
+                                        limit: int = PAGE_SIZE) -> Dict[str, Any]:
+        """
+        Get a page of software documents by normalized name, ordered by _key.
+
+        Mentions flagged as blacklisted are left out.
 
         Args:
             name: Software name
+            after: Cursor returned as 'next_after' by the previous page
+            limit: Page size, capped to MAX_PAGE_SIZE
 
         Returns:
-            List of matching software documents
+            Dict with the matching 'software' and 'next_after' (None on the last page)
         """
+        limit = clamp_limit(limit)
         try:
+            # Served by idx_software_name_key: equality on the name, range and order on _key
             query = """
                 FOR soft IN software
                     FILTER soft.software_name.normalizedForm == @name
+                    FILTER @after == null OR soft._key > @after
+                    FILTER soft.blacklisted != true
+                    SORT soft._key
+                    LIMIT @limit
                     RETURN soft
             """
 
-            result = self.execute_aql_query(query, bind_vars={'name': name}, raw_results=True)
-            return list(result)
+            bind_vars = {'name': name, 'after': after, 'limit': limit + 1}
+            software = list(self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+            has_more = len(software) > limit
+            software = software[:limit]
+            return {"software": software, "next_after": software[-1]["_key"] if has_more else None}
 
         except Exception as e:
             logger.error(f"Failed to get software by normalized name {name}: {e}")
-            return []
+            return {"software": [], "next_after": None}
 
-    def get_document_software(self, id_document: str, id_software: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_document_software(self, id_document: str, id_software: Optional[str] = None,
+                              fields: Optional[List[str]] = None, after: Optional[str] = None,
+                              limit: int = PAGE_SIZE) -> Dict[str, Any]:
         """
-        Get software linked to a document.
+        Get a page of the software linked to a document, ordered by _key.
+
+        Software is read with a one-step traversal over the edge index and, when
+        `fields` is given, reduced to those attributes on the server. Mentions flagged as
+        blacklisted are left out.
 
         Args:
             id_document: Document ID
             id_software: Optional software ID for filtering
+            fields: Attributes to return, all of them by default
+            after: Cursor returned as 'next_after' by the previous page
+            limit: Page size, capped to MAX_PAGE_SIZE
 
         Returns:
-            List of software documents
+            Dict with the 'software' documents and 'next_after' (None on the last page)
         """
+        limit = clamp_limit(limit)
         try:
+            software_filter = "FILTER software._key == @software_id" if id_software else ""
+            query = f"""
+                FOR doc IN documents
+                    FILTER doc.file_hal_id == @id_document
+                    FOR software IN 1..1 OUTBOUND doc edge_doc_to_software
+                        {software_filter}
+                        FILTER software.blacklisted != true
+                        FILTER @after == null OR software._key > @after
+                        SORT software._key
+                        LIMIT @limit
+                        RETURN {{
+                            cursor: software._key,
+                            software: @fields == null ? software : KEEP(software, @fields)
+                        }}
+            """
+            bind_vars = {'id_document': id_document, 'fields': fields, 'after': after, 'limit': limit + 1}
             if id_software:
-                query = """
-                    FOR doc IN documents
-                        FILTER doc.file_hal_id == @id_document
-                        FOR edge_soft IN edge_doc_to_software
-                            FILTER edge_soft._from == doc._id
-                            LET software = DOCUMENT(edge_soft._to)
-                            FILTER software._key == @software_id
-                            RETURN software
-                """
-                result = self.execute_aql_query(
-                    query,
-                    bind_vars={'id_document': id_document, 'software_id': id_software},
-                    raw_results=True
-                )
-            else:
-                query = """
-                    FOR doc IN documents
-                        FILTER doc.file_hal_id == @id_document
-                        FOR edge_soft IN edge_doc_to_software
-                            FILTER edge_soft._from == doc._id
-                            LET software = DOCUMENT(edge_soft._to)
-                            RETURN software
-                """
-                result = self.execute_aql_query(query, bind_vars={'id_document': id_document}, raw_results=True)
-
-            return list(result)
+                bind_vars['software_id'] = id_software
+            rows = list(self.execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            return {
+                "software": [row["software"] for row in rows],
+                "next_after": rows[-1]["cursor"] if has_more else None,
+            }
 
         except Exception as e:
             logger.error(f"Failed to get document software: {e}")
-            return []
+            return {"software": [], "next_after": None}
+
+
+def migrate_on_startup(manager: DatabaseManager) -> None:
+    """
+    Apply the pending schema migrations a worker may apply when it starts.
+
+    Offline migrations are only applied to an empty database, they take longer than
+    a worker may spend booting on stored data: `flask migrate` applies them.
+
+    Args:
+        manager: Database manager instance
+
+    Raises:
+        Exception: If a schema migration fails or an offline one is pending; the application
+            must not run on a partially migrated schema
+    """
+    from app.utils.migrations import run_migrations
+    try:
+        run_migrations(manager, include_offline=False)
+    except Exception as e:
+        logger.critical(f"Schema migration failed, refusing to start: {e}")
+        raise
 
 
 def init_db(app):
@@ -620,6 +1761,10 @@ def init_db(app):
 
     Returns:
         DatabaseManager: The initialized database manager
+
+    Raises:
+        Exception: If a schema migration fails; the application must not run on a
+            partially migrated schema
     """
     global db_manager
 
@@ -634,6 +1779,11 @@ def init_db(app):
     # Initialize the database (creates if needed)
     db_manager.get_database()
 
+    # Bring collections and indexes up to the latest schema version. Flask commands load the app too:
+    # they migrate when they start instead, so that `flask migrate` can run what a worker refuses to
+    if app.config.get("RUN_MIGRATIONS_ON_STARTUP", True) and os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        migrate_on_startup(db_manager)
+
     logger.info(f"Database manager initialized for {app.config['ARANGO_DB']}")
     return db_manager
 
@@ -0,0 +1,156 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from app.utils.http_client import url_origin
+
+logger = logging.getLogger(__name__)
+
+# Retry policy for outgoing notifications
+MAX_DELIVERY_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 8))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("NOTIFY_RETRY_BASE_SECONDS", 30))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("NOTIFY_RETRY_MAX_SECONDS", 3600))
+
+# Circuit breaker: consecutive transient failures before an inbox is considered down,
+# and how long to fail fast before letting a probe request through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("NOTIFY_BREAKER_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("NOTIFY_BREAKER_RESET_SECONDS", 60))
+
+# HTTP statuses worth retrying besides 5xx: request timeout, too early, too many requests
+_RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+
+def is_retryable(status_code: Optional[int]) -> bool:
+    """
+    Tell whether a failed delivery may succeed later.
+
+    Args:
+        status_code: HTTP status of the response, None when no response was received
+            (timeout, connection error)
+
+    Returns:
+        bool: True for transport errors, 5xx and throttling responses, False for other 4xx
+    """
+    if status_code is None:
+        return True
+    return status_code >= 500 or status_code in _RETRYABLE_STATUS_CODES
+
+
+def retry_delay(attempts: int, retry_after: Optional[str] = None) -> float:
+    """
+    Delay before the next delivery attempt, using exponential backoff with jitter.
+
+    The delay is drawn between half and all of the exponential ceiling, so entries that
+    failed together do not all retry at the same moment.
+
+    Args:
+        attempts: Number of attempts already made (1 after the first failure)
+        retry_after: Retry-After header sent by the inbox, in seconds, if any
+
+    Returns:
+        float: Delay in seconds
+    """
+    ceiling = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** max(attempts - 1, 0)))
+    delay = random.uniform(ceiling / 2, ceiling)
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), RETRY_MAX_DELAY_SECONDS))
+        except ValueError:
+            # HTTP-date form of Retry-After, keep the computed backoff
+            pass
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Per-inbox circuit breaker.
+
+    Closed: requests go through. After BREAKER_FAILURE_THRESHOLD consecutive transient
+    failures the breaker opens and requests fail fast for BREAKER_RESET_SECONDS. Then a
+    single probe request is let through (half-open): success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Target the breaker protects, used in log messages
+            failure_threshold: Consecutive failures that open the breaker
+            reset_seconds: Time the breaker stays open before a probe request
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to the target now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def release(self) -> None:
+        """Give back a request allowed by allow_request() that was not sent."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def retry_at(self) -> float:
+        """Epoch seconds at which the breaker lets a probe through."""
+        with self._lock:
+            if self._opened_at is None:
+                return time.time()
+            return time.time() + max(self.reset_seconds - (time.monotonic() - self._opened_at), 0)
+
+    def record_success(self) -> None:
+        """Record a request the target answered, closing the breaker."""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Record a transient failure, opening the breaker past the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit for {self.name} opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """
+    Get the circuit breaker guarding a target inbox.
+
+    Args:
+        url: Target inbox URL
+
+    Returns:
+        CircuitBreaker: Breaker shared by every notification sent to the same server
+    """
+    origin = url_origin(url)
+    with _breakers_lock:
+        breaker = _breakers.get(origin)
+        if breaker is None:
+            breaker = _breakers[origin] = CircuitBreaker(origin)
+        return breaker
@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive connections kept open per target inbox
+HTTP_POOL_SIZE = int(os.getenv("NOTIFY_HTTP_POOL_SIZE", 10))
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def url_origin(url: str) -> str:
+    """Return the scheme://host:port part of a URL, used to share per-server state (pools, breakers, buckets)."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Get the pooled HTTP session used to reach a target inbox.
+
+    One session is kept per server, so consecutive notifications to the same inbox
+    reuse open keep-alive connections instead of paying a new TCP and TLS handshake.
+    Sessions are shared between the dispatch threads.
+
+    Args:
+        url: Target inbox URL
+
+    Returns:
+        requests.Session: Session with a connection pool sized for concurrent sends
+    """
+    origin = url_origin(url)
+    session = _sessions.get(origin)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[origin] = session
+            logger.debug(f"Created HTTP connection pool for {origin} (size {HTTP_POOL_SIZE})")
+        return session
+
+
+def close_sessions() -> None:
+    """Close every pooled session and its open connections."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,635 @@
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyArango.theExceptions import AQLQueryError
+
+from app.utils.db import get_db, INBOX_COLLECTION, INBOX_RECEIVED_COLLECTION, is_unique_constraint_violation, \
+    key_from_identifier
+from app.utils.delivery import MAX_DELIVERY_ATTEMPTS, retry_delay
+from app.utils.notification_handler import (accept_notification, extract_offer_id, reject_notification,
+                                            send_validation_to_viz)
+
+logger = logging.getLogger(__name__)
+
+# Inbox entry statuses
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_PROCESSED = "processed"
+STATUS_FAILED = "failed"
+# Recorded for the notification log only (e.g. sent by Software Heritage)
+STATUS_IGNORED = "ignored"
+
+# Notification types the consumer acts on; others are only recorded
+ACTIONABLE_TYPES = ("Accept", "Reject")
+
+CONSUMER_BATCH_SIZE = int(os.getenv("INBOX_CONSUMER_BATCH_SIZE", 100))
+CONSUMER_POLL_INTERVAL_SECONDS = float(os.getenv("INBOX_POLL_INTERVAL", 1.0))
+# Documents processed in parallel; entries of one document are always handled in order by one thread
+CONSUMER_PARTITIONS = int(os.getenv("INBOX_CONSUMER_PARTITIONS", 4))
+# After claiming some entries, wait this long for more of a burst so their database updates share one statement
+CONSUMER_COALESCE_WINDOW_SECONDS = float(os.getenv("INBOX_COALESCE_WINDOW", 0.2))
+# An entry claimed by a consumer that died is claimed again after this delay
+CLAIM_TIMEOUT_MS = 10 * 60 * 1000
+# Notification ids remembered by each worker to answer redeliveries without I/O
+DEDUP_CACHE_SIZE = int(os.getenv("INBOX_DEDUP_CACHE_SIZE", 10000))
+# Received notifications kept in the log; the oldest handled ones are pruned beyond this
+LOG_MAX_ENTRIES = int(os.getenv("INBOX_LOG_MAX_ENTRIES", 100000))
+LOG_PRUNE_INTERVAL_SECONDS = float(os.getenv("INBOX_LOG_PRUNE_INTERVAL", 300))
+# Days the id of a notification pruned from the log is remembered, so that its redeliveries are still ignored
+DEDUP_RETENTION_DAYS = float(os.getenv("INBOX_DEDUP_RETENTION_DAYS", 365))
+# Page size of the notification log
+LOG_PAGE_SIZE = 50
+LOG_MAX_PAGE_SIZE = 200
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class InvalidNotificationError(ValueError):
+    """Raised when a received notification lacks the fields needed to process it."""
+
+
+class RecentNotificationIds:
+    """
+    Bounded LRU mapping of recently stored notification ids to their inbox entry key.
+
+    It only spares the database lookup for redeliveries reaching the same worker; the
+    unique _key of the inbox entry catches the ones reaching other workers.
+    """
+
+    def __init__(self, capacity: int = DEDUP_CACHE_SIZE):
+        """
+        Initialize the cache.
+
+        Args:
+            capacity: Maximum number of ids remembered
+        """
+        self.capacity = capacity
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, notification_id: str) -> Optional[str]:
+        """Return the inbox entry key of a known notification id, None otherwise."""
+        with self._lock:
+            inbox_id = self._entries.get(notification_id)
+            if inbox_id is not None:
+                self._entries.move_to_end(notification_id)
+            return inbox_id
+
+    def add(self, notification_id: str, inbox_id: str) -> None:
+        """Remember a stored notification id, evicting the least recently seen one if full."""
+        with self._lock:
+            self._entries[notification_id] = inbox_id
+            self._entries.move_to_end(notification_id)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+recent_notification_ids = RecentNotificationIds()
+
+
+def _notification_id(notification: Any) -> Optional[str]:
+    notification_id = notification.get('id') if isinstance(notification, dict) else None
+    return notification_id if isinstance(notification_id, str) and notification_id else None
+
+
+def find_duplicate(notification: Any) -> Optional[str]:
+    """
+    Check whether this worker already stored a notification with the same id.
+
+    Args:
+        notification: Decoded JSON body of the inbox request
+
+    Returns:
+        Key of the existing inbox entry, or None if the id was not seen recently
+    """
+    notification_id = _notification_id(notification)
+    return recent_notification_ids.get(notification_id) if notification_id else None
+
+
+def parse_notification(notification: Any) -> Dict[str, Any]:
+    """
+    Validate a received COAR notification and extract the fields used for processing.
+
+    Args:
+        notification: Decoded JSON body of the inbox request
+
+    Returns:
+        Dict with 'type', 'actor_id', 'origin_id', 'document_id' and 'software_name'
+        (the last two only for Accept/Reject notifications)
+
+    Raises:
+        InvalidNotificationError: If the notification is malformed
+    """
+    if not isinstance(notification, dict):
+        raise InvalidNotificationError("Notification must be a JSON object")
+
+    notification_types = notification.get('type')
+    if not notification_types:
+        raise InvalidNotificationError("Missing notification type")
+    notification_type = notification_types[0] if isinstance(notification_types, list) else notification_types
+
+    actor = notification.get('actor')
+    origin = notification.get('origin')
+    parsed = {
+        'type': notification_type,
+        'actor_id': actor.get('id') if isinstance(actor, dict) else None,
+        'origin_id': origin.get('id') if isinstance(origin, dict) else None,
+        'document_id': None,
+        'software_name': None,
+    }
+
+    if notification_type in ACTIONABLE_TYPES:
+        try:
+            offer = notification['object']['object']
+            parsed['document_id'] = offer['id'].replace('oai:HAL:', '')
+            parsed['software_name'] = offer['sorg:citation']['name']
+        except (KeyError, TypeError, AttributeError) as e:
+            raise InvalidNotificationError(f"Invalid {notification_type} notification: missing {e}")
+
+    return parsed
+
+
+def store_notification(notification: Dict[str, Any], parsed: Dict[str, Any],
+                       ignored: bool = False) -> Tuple[str, bool]:
+    """
+    Durably record a received notification for the inbox consumer.
+
+    The entry _key is derived from the notification id, so a redelivered notification
+    is rejected by the unique key whichever worker receives it, with nothing written.
+    Once the entry is pruned from the log, its id is still found among the received ids
+    for DEDUP_RETENTION_DAYS.
+
+    Args:
+        notification: Notification payload
+        parsed: Fields extracted by parse_notification
+        ignored: Only record the notification in the log, never process it
+
+    Returns:
+        Tuple of (key of the inbox entry, True if the notification was already stored)
+    """
+    now = time.time()
+    if ignored:
+        status = STATUS_IGNORED
+    else:
+        status = STATUS_PENDING if parsed['type'] in ACTIONABLE_TYPES else STATUS_PROCESSED
+    notification_id = _notification_id(notification)
+    entry = {
+        "notification": notification,
+        "notification_id": notification_id,
+        "type": parsed['type'],
+        "actor_id": parsed['actor_id'],
+        "origin_id": parsed['origin_id'],
+        "document_id": parsed['document_id'],
+        "software_name": parsed['software_name'],
+        "received_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        # Orders the entries of a document; microseconds keep same-millisecond entries apart and stay below 2^53,
+        # so JSON clients read the value exactly
+        "seq": time.time_ns() // 1000,
+        "status": status,
+        "attempts": 0,
+        "available_at": int(now * 1000),
+    }
+    if notification_id:
+        entry["_key"] = key_from_identifier(notification_id)
+
+    query = f"""
+        LET received = @key == null ? null : DOCUMENT("{INBOX_RECEIVED_COLLECTION}", @key)
+        FILTER received == null
+        INSERT @entry INTO {INBOX_COLLECTION}
+        RETURN NEW._key
+    """
+    try:
+        bind_vars = {"entry": entry, "key": entry.get("_key")}
+        result = list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+        if result:
+            inbox_id, duplicate = result[0], False
+        else:
+            logger.info(f"Notification {notification_id} was already received (pruned from the log)")
+            inbox_id, duplicate = entry["_key"], True
+    except AQLQueryError as e:
+        if not (notification_id and is_unique_constraint_violation(e)):
+            raise
+        logger.info(f"Notification {notification_id} was already received")
+        inbox_id, duplicate = entry["_key"], True
+
+    if notification_id:
+        recent_notification_ids.add(notification_id, inbox_id)
+    return inbox_id, duplicate
+
+
+def claim_inbox_entries(limit: int = CONSUMER_BATCH_SIZE, worker_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Atomically claim due inbox entries, without breaking the order of any document.
+
+    Entries of a document are skipped while another entry of the same document is being
+    processed by another consumer or waits for a retry, so a later Reject is never applied
+    before an earlier Accept.
+
+    Args:
+        limit: Maximum number of entries to claim
+        worker_id: Identifier of the consumer, stored on the claimed entries
+
+    Returns:
+        List of claimed inbox entries, in reception order
+    """
+    query = f"""
+        LET now = DATE_NOW()
+        LET busy = (
+            FOR entry IN {INBOX_COLLECTION}
+                FILTER (entry.status == @processing AND entry.claimed_at >= now - @claim_timeout)
+                    OR (entry.status == @pending AND entry.available_at > now)
+                RETURN DISTINCT entry.document_id
+        )
+        FOR entry IN {INBOX_COLLECTION}
+            FILTER (entry.status == @pending AND entry.available_at <= now)
+                OR (entry.status == @processing AND entry.claimed_at < now - @claim_timeout)
+            FILTER entry.document_id NOT IN busy
+            SORT entry.seq
+            LIMIT @limit
+            UPDATE entry WITH {{
+                status: @processing,
+                claimed_by: @worker_id,
+                claimed_at: now
+            }} IN {INBOX_COLLECTION} OPTIONS {{ exclusive: true }}
+            RETURN NEW
+    """
+    bind_vars = {
+        "pending": STATUS_PENDING,
+        "processing": STATUS_PROCESSING,
+        "claim_timeout": CLAIM_TIMEOUT_MS,
+        "limit": limit,
+        "worker_id": worker_id or f"{socket.gethostname()}:{os.getpid()}",
+    }
+    result = get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True)
+    return sorted(result, key=lambda entry: entry["seq"])
+
+
+def claim_coalesced(limit: int = CONSUMER_BATCH_SIZE, worker_id: Optional[str] = None,
+                    window: float = CONSUMER_COALESCE_WINDOW_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Claim due inbox entries, giving a burst `window` seconds to fill the batch.
+
+    Nothing is waited for when no entry is due or the first claim already filled the batch.
+
+    Args:
+        limit: Maximum number of entries to claim
+        worker_id: Identifier of the consumer
+        window: Seconds to wait for more entries after a partial claim
+
+    Returns:
+        List of claimed inbox entries, in reception order
+    """
+    entries = claim_inbox_entries(limit, worker_id)
+    if entries and len(entries) < limit and window > 0:
+        time.sleep(window)
+        entries.extend(claim_inbox_entries(limit - len(entries), worker_id))
+        entries.sort(key=lambda entry: entry["seq"])
+    return entries
+
+
+def apply_verifications(entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply the database updates of claimed Accept/Reject entries as one bulk statement.
+
+    Args:
+        entries: Claimed inbox entries, in reception order
+
+    Returns:
+        Dict mapping the key of each entry updated in this batch to the fields to store
+        on it; 'error' is set for every entry if the statement failed
+    """
+    pending = [entry for entry in entries if entry["type"] in ACTIONABLE_TYPES and not entry.get("db_updated")]
+    if not pending:
+        return {}
+
+    updates = [
+        {
+            "document_id": entry["document_id"],
+            "software_name": entry["software_name"],
+            "accepted": entry["type"] == "Accept",
+            "notification_id": extract_offer_id(entry["notification"]),
+        }
+        for entry in pending
+    ]
+    results = get_db().bulk_update_software_verification(updates)
+    if results is None:
+        return {entry["_key"]: {"error": "Verification update failed"} for entry in pending}
+
+    return {
+        entry["_key"]: {
+            "db_updated": True,
+            "software_updated": result["updated"] > 0,
+            "software_keys": result["software_keys"],
+        }
+        for entry, result in zip(pending, results)
+    }
+
+
+def process_entry(entry: Dict[str, Any], verification: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Apply an Accept/Reject notification: update the database, then push the result to Software Viz.
+
+    Steps already done by a previous attempt are skipped, so a retry after a Software Viz
+    failure does not update the database again.
+
+    Args:
+        entry: Claimed inbox entry
+        verification: Outcome of the database update already applied for this entry by
+            apply_verifications; the update is made here when omitted
+
+    Returns:
+        Dict of fields to store on the entry; 'error' is set if a step failed
+    """
+    accepted = entry["type"] == "Accept"
+    changes: Dict[str, Any] = {}
+
+    if not entry.get("db_updated"):
+        if verification is None:
+            handler = accept_notification if accepted else reject_notification
+            changes["software_updated"] = handler(entry["notification"])
+            changes["db_updated"] = True
+        else:
+            changes.update(verification)
+            if "error" in changes:
+                return changes
+
+    if not entry.get("viz_notified"):
+        if not send_validation_to_viz(entry["document_id"], entry["software_name"], accepted):
+            changes["error"] = "Software Viz push failed"
+            return changes
+        changes["viz_notified"] = True
+
+    return changes
+
+
+def _process_partition(entries: List[Dict[str, Any]],
+                       verifications: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Process the entries of a partition sequentially and return their updates.
+
+    Once an entry of a document fails, the following entries of that document are
+    released so they are retried after it, in order; only the database update they
+    already received in the bulk statement is recorded on them.
+    """
+    results = []
+    blocked = set()
+
+    for entry in entries:
+        document_id = entry.get("document_id")
+        verification = verifications.get(entry["_key"])
+        if document_id in blocked:
+            changes = {"status": STATUS_PENDING}
+            if verification and "error" not in verification:
+                changes.update(verification)
+            results.append({"key": entry["_key"], "changes": changes})
+            continue
+
+        try:
+            changes = process_entry(entry, verification)
+        except Exception as e:
+            logger.error(f"Exception processing inbox entry {entry['_key']}: {e}")
+            changes = {"error": str(e)}
+
+        attempts = entry.get("attempts", 0) + 1
+        changes.update(attempts=attempts, last_attempt_at=_now_ms())
+        if "error" not in changes:
+            changes.update(status=STATUS_PROCESSED, processed_at=_now_ms(), error=None)
+        elif attempts < MAX_DELIVERY_ATTEMPTS:
+            blocked.add(document_id)
+            changes.update(status=STATUS_PENDING, available_at=_now_ms() + int(retry_delay(attempts) * 1000))
+        else:
+            logger.error(f"Giving up on inbox entry {entry['_key']} after {attempts} attempts: {changes['error']}")
+            changes.update(status=STATUS_FAILED)
+        results.append({"key": entry["_key"], "changes": changes})
+
+    return results
+
+
+def consume_pending(limit: int = CONSUMER_BATCH_SIZE, worker_id: Optional[str] = None,
+                    partitions: int = CONSUMER_PARTITIONS) -> Dict[str, int]:
+    """
+    Claim due inbox entries and process them, several documents at a time.
+
+    The database updates of the whole batch are applied first, in one bulk statement.
+    Entries are then partitioned by a hash of their document id: each partition is handled
+    by one thread in reception order, so per-document ordering is preserved while
+    different documents progress in parallel.
+
+    Args:
+        limit: Maximum number of entries handled in this round
+        worker_id: Identifier of the consumer
+        partitions: Number of threads
+
+    Returns:
+        Dict: {'success_count': int, 'failure_count': int, 'total_count': int}
+    """
+    entries = claim_coalesced(limit, worker_id)
+    if not entries:
+        return {'success_count': 0, 'failure_count': 0, 'total_count': 0}
+
+    verifications = apply_verifications(entries)
+
+    by_partition: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for entry in entries:
+        partition = zlib.crc32((entry.get("document_id") or "").encode("utf-8")) % partitions
+        by_partition[partition].append(entry)
+
+    with ThreadPoolExecutor(max_workers=min(partitions, len(by_partition)), thread_name_prefix="inbox") as executor:
+        partition_results = executor.map(lambda partition: _process_partition(partition, verifications),
+                                         by_partition.values())
+        results = [result for partition_result in partition_results for result in partition_result]
+
+    query = f"""
+        FOR result IN @results
+            UPDATE result.key WITH result.changes IN {INBOX_COLLECTION}
+    """
+    get_db().execute_aql_query(query, bind_vars={"results": results})
+
+    success_count = sum(1 for result in results if result["changes"]["status"] == STATUS_PROCESSED)
+    failure_count = len(results) - success_count
+    logger.info(f"Inbox consumer: {success_count} processed, {failure_count} failed or deferred (total: {len(results)})")
+    return {'success_count': success_count, 'failure_count': failure_count, 'total_count': len(results)}
+
+
+def parse_log_cursor(cursor: str) -> Tuple[int, Optional[str]]:
+    """
+    Parse a 'next_before' cursor of the notification log.
+
+    Args:
+        cursor: Cursor of the form "<seq>:<_key>"; a bare sequence is accepted too
+
+    Returns:
+        Reception sequence and _key of the last entry of the previous page (None for a bare sequence)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    seq, _, key = cursor.partition(":")
+    return int(seq), key or None
+
+
+def list_notifications(notification_type: Optional[str] = None, document_id: Optional[str] = None,
+                       before: Optional[str] = None, limit: int = LOG_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Get a page of the notification log, newest first.
+
+    Pages are cut on the reception sequence, ties broken on the _key, rather than with an
+    offset, so every page costs the same whatever its depth. The cursor is a string, so
+    JSON clients pass it back unchanged.
+
+    Args:
+        notification_type: Only list notifications of this type (e.g. Accept)
+        document_id: Only list notifications about this HAL document
+        before: Cursor returned as 'next_before' by the previous page
+        limit: Page size, capped to LOG_MAX_PAGE_SIZE
+
+    Returns:
+        Dict with 'notifications' and 'next_before' (None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = max(1, min(limit, LOG_MAX_PAGE_SIZE))
+    filters = []
+    bind_vars: Dict[str, Any] = {"limit": limit + 1}
+    if notification_type:
+        filters.append("FILTER entry.type == @type")
+        bind_vars["type"] = notification_type
+    if document_id:
+        filters.append("FILTER entry.document_id == @document_id")
+        bind_vars["document_id"] = document_id
+    if before is not None:
+        before_seq, before_key = parse_log_cursor(before)
+        if before_key is None:
+            filters.append("FILTER entry.seq < @before_seq")
+        else:
+            # The range on seq uses the index, the _key breaks ties between entries received in the same microsecond
+            filters.append("FILTER entry.seq <= @before_seq")
+            filters.append("FILTER entry.seq < @before_seq OR entry._key < @before_key")
+            bind_vars["before_key"] = before_key
+        bind_vars["before_seq"] = before_seq
+
+    filter_clause = "\n            ".join(filters)
+    query = f"""
+        FOR entry IN {INBOX_COLLECTION}
+            {filter_clause}
+            SORT entry.seq DESC, entry._key DESC
+            LIMIT @limit
+            RETURN KEEP(entry, "_key", "notification", "type", "actor_id", "document_id",
+                        "software_name", "received_at", "seq", "status", "software_updated")
+    """
+    entries = list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return {
+        "notifications": entries,
+        "next_before": f"{entries[-1]['seq']}:{entries[-1]['_key']}" if has_more else None,
+    }
+
+
+def prune_notification_log(max_entries: int = LOG_MAX_ENTRIES) -> int:
+    """
+    Remove the oldest handled notifications beyond the log capacity.
+
+    Entries still waiting to be processed are never removed. The ids of the removed
+    notifications are kept in the received ids, in the same statement, so that their
+    redeliveries keep being recognized.
+
+    Args:
+        max_entries: Number of notifications kept
+
+    Returns:
+        int: Number of notifications removed
+    """
+    collection = get_db().get_collection(INBOX_COLLECTION)
+    excess = collection.count() - max_entries if collection else 0
+    if excess <= 0:
+        return 0
+
+    query = f"""
+        FOR entry IN {INBOX_COLLECTION}
+            FILTER entry.status IN @handled
+            SORT entry.seq
+            LIMIT @excess
+            REMOVE entry IN {INBOX_COLLECTION}
+            LET received = (
+                FILTER entry.notification_id != null
+                INSERT {{ _key: entry._key, pruned_at: DATE_NOW() }} INTO {INBOX_RECEIVED_COLLECTION}
+                OPTIONS {{ ignoreErrors: true }}
+                RETURN 1
+            )
+            RETURN 1
+    """
+    bind_vars = {"handled": [STATUS_PROCESSED, STATUS_FAILED, STATUS_IGNORED], "excess": excess}
+    removed = sum(1 for _ in get_db().iter_aql_query(query, bind_vars=bind_vars, stream=False))
+    logger.info(f"Pruned {removed} notifications from the inbox log (capacity {max_entries})")
+    return removed
+
+
+def prune_received_ids(retention_days: float = DEDUP_RETENTION_DAYS) -> int:
+    """
+    Forget the ids of notifications pruned from the log more than `retention_days` ago.
+
+    Args:
+        retention_days: Days a pruned notification id is remembered
+
+    Returns:
+        int: Number of ids removed
+    """
+    query = f"""
+        FOR received IN {INBOX_RECEIVED_COLLECTION}
+            FILTER received.pruned_at < DATE_NOW() - @retention_ms
+            REMOVE received IN {INBOX_RECEIVED_COLLECTION}
+            RETURN 1
+    """
+    bind_vars = {"retention_ms": int(retention_days * 24 * 3600 * 1000)}
+    removed = sum(1 for _ in get_db().iter_aql_query(query, bind_vars=bind_vars, stream=False))
+    if removed:
+        logger.info(f"Forgot {removed} received notification ids older than {retention_days} days")
+    return removed
+
+
+def run_consumer(batch_size: int = CONSUMER_BATCH_SIZE,
+                 poll_interval: float = CONSUMER_POLL_INTERVAL_SECONDS,
+                 once: bool = False) -> None:
+    """
+    Process received notifications until interrupted, pruning the notification log periodically.
+
+    Args:
+        batch_size: Maximum number of entries claimed per round
+        poll_interval: Seconds to wait when nothing is due
+        once: Stop once nothing is due instead of polling forever
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Inbox consumer {worker_id} started")
+    pruned_at: Optional[float] = None
+
+    while True:
+        try:
+            summary = consume_pending(batch_size, worker_id)
+        except Exception as e:
+            logger.error(f"Inbox consumer round failed: {e}")
+            summary = {'total_count': 0}
+
+        if pruned_at is None or time.monotonic() - pruned_at >= LOG_PRUNE_INTERVAL_SECONDS:
+            pruned_at = time.monotonic()
+            try:
+                prune_notification_log()
+                prune_received_ids()
+            except Exception as e:
+                logger.error(f"Failed to prune the notification log: {e}")
+
+        if summary['total_count'] == 0:
+            if once:
+                return
+            time.sleep(poll_interval)
@@ -0,0 +1,228 @@
+import codecs
+import json
+import re
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Size of the chunks read from the upload stream
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\r\n"
+# Next character that can change the nesting state outside of a string
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+# Next character that can end a string or escape the following one
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class _JsonStreamReader:
+    """
+    Minimal incremental JSON reader working on a text or binary stream.
+
+    Only the text of the value being read is kept in memory: consumed input is
+    dropped each time a new chunk is read, so skipping a large value costs no memory.
+    """
+
+    def __init__(self, stream: IO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._read = stream.read
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Read the next chunk, dropping the consumed text. Returns False at end of stream."""
+        chunk = ""
+        while not chunk:
+            if self._eof:
+                return False
+            data = self._read(self._chunk_size)
+            self._eof = not data
+            if isinstance(data, bytes):
+                # A multi-byte character split across chunks decodes to nothing until completed
+                data = self._decoder.decode(data, final=self._eof)
+            chunk = data
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it ('' at end of stream)."""
+        while True:
+            while self._pos < len(self._buf):
+                char = self._buf[self._pos]
+                if char not in _WHITESPACE:
+                    return char
+                self._pos += 1
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consume the next non-whitespace character, which must be `char`."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON: expected '{char}', found '{found or 'end of input'}'")
+        self._pos += 1
+
+    def read_value(self, capture: bool = True) -> Optional[str]:
+        """
+        Consume one JSON value.
+
+        Args:
+            capture: Whether to return the text of the value or just skip it
+
+        Returns:
+            The raw JSON text of the value, or None when not captured
+        """
+        self.peek()
+        pieces: List[str] = []
+        start = self._pos
+        depth = 0
+        in_string = False
+        consumed = False
+
+        while True:
+            buf = self._buf
+            pos = self._pos
+            end = len(buf)
+            done = False
+
+            while pos < end:
+                if in_string:
+                    match = _STRING_SPECIAL.search(buf, pos)
+                    if match is None:
+                        pos = end
+                        break
+                    pos = match.start()
+                    if buf[pos] == "\\":
+                        if pos + 1 >= end:
+                            # The escaped character is in the next chunk
+                            break
+                        pos += 2
+                        continue
+                    in_string = False
+                    pos += 1
+                    if depth == 0:
+                        done = True
+                        break
+                    continue
+
+                char = buf[pos]
+                if char == '"':
+                    in_string = True
+                    pos += 1
+                elif char in "{[":
+                    depth += 1
+                    pos += 1
+                elif char in "}]":
+                    if depth == 0:
+                        # End of the enclosing container after a scalar value
+                        done = True
+                        break
+                    depth -= 1
+                    pos += 1
+                    if depth == 0:
+                        done = True
+                        break
+                elif depth > 0:
+                    match = _STRUCTURAL.search(buf, pos)
+                    pos = match.start() if match else end
+                elif char == "," or char in _WHITESPACE:
+                    done = True
+                    break
+                else:
+                    pos += 1
+
+            self._pos = pos
+            if done:
+                break
+            consumed = consumed or pos > start
+            if capture:
+                pieces.append(buf[start:pos])
+            if not self._fill():
+                if depth == 0 and not in_string and consumed:
+                    break
+                raise ValueError("Invalid JSON: unexpected end of input")
+            start = self._pos
+
+        if not capture:
+            return None
+        pieces.append(self._buf[start:self._pos])
+        return "".join(pieces)
+
+
+def iter_json_array(stream: IO, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Lazily yield the items of the array stored under `key` in a top-level JSON object.
+
+    Other top-level values are skipped without being decoded and reading stops at the
+    end of the array, so memory use depends on the largest item, not on the file size.
+
+    Args:
+        stream: Text or binary (UTF-8) stream positioned at the start of the JSON document
+        key: Top-level key holding the array
+        chunk_size: Number of characters or bytes read at a time
+
+    Yields:
+        The decoded array items, one at a time
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    reader = _JsonStreamReader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        name = json.loads(reader.read_value())
+        reader.expect(":")
+
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield json.loads(reader.read_value())
+                    if reader.peek() != ",":
+                        break
+                    reader.expect(",")
+            reader.expect("]")
+            return
+
+        reader.read_value(capture=False)
+        if reader.peek() != ",":
+            reader.expect("}")
+            return
+        reader.expect(",")
+
+
+def dump_json_page(head: Dict[str, Any], key: str, items: Iterable[Any], limit: int,
+                   cursor: Callable[[Any], Any]) -> Iterator[str]:
+    """
+    Serialize a page of results as a JSON object, one item at a time.
+
+    The object holds the `head` fields, the page under `key` and the `next_after`
+    cursor. `items` may hold one item more than `limit`, meaning that another page
+    follows; the cursor is then taken from the last item of the page. Only the current
+    item is in memory, so the response can be sent while the query is still running.
+
+    Args:
+        head: Fields written before the page
+        key: Name of the page array
+        items: Up to limit + 1 items
+        limit: Page size
+        cursor: Function returning the cursor of an item
+
+    Yields:
+        Pieces of the JSON text
+    """
+    yield json.dumps(head)[:-1] + (", " if head else "") + json.dumps(key) + ": ["
+    last = None
+    count = 0
+    for item in items:
+        if count == limit:
+            yield "], " + json.dumps("next_after") + ": " + json.dumps(cursor(last)) + "}"
+            return
+        yield ("," if count else "") + json.dumps(item)
+        last = item
+        count += 1
+    yield "], " + json.dumps("next_after") + ": null}"
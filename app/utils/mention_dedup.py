@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Fields identifying a mention, as comma-separated dotted paths into the raw mention.
+# "*" compares whole mentions instead.
+DEFAULT_MENTION_DEDUP_FIELDS = (
+    "software-name.normalizedForm,context,software-name.offsetStart,software-name.offsetEnd"
+)
+MENTION_DEDUP_FIELDS = os.getenv("MENTION_DEDUP_FIELDS", DEFAULT_MENTION_DEDUP_FIELDS)
+WHOLE_OBJECT = "*"
+
+
+def parse_fields(spec: str) -> Optional[List[Tuple[str, ...]]]:
+    """
+    Parse a dedup field specification.
+
+    Args:
+        spec: Comma-separated dotted paths, e.g. "software-name.normalizedForm,context"
+
+    Returns:
+        List of paths split on dots, or None to compare whole objects ("*" or empty)
+    """
+    paths = [tuple(field.strip().split(".")) for field in spec.split(",") if field.strip()]
+    if not paths or any(path == (WHOLE_OBJECT,) for path in paths):
+        return None
+    return paths
+
+
+def _hashable(value: Any) -> Any:
+    # Nested structures are only serialized when a configured field points at one
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+class Deduplicator:
+    """
+    Streaming deduplication of JSON objects on a tuple of their fields.
+
+    The key of an object is the built-in (SipHash) hash of the tuple of its field
+    values; fields are read directly, so nothing is serialized unless a field holds a
+    nested structure or whole objects are compared. Only the 64-bit hashes seen are
+    kept in memory. Counts are updated as items are consumed.
+    """
+
+    def __init__(self, fields: Optional[Sequence[Tuple[str, ...]]] = None):
+        """
+        Create a deduplicator.
+
+        Args:
+            fields: Paths of the fields identifying an object, None to compare whole objects
+        """
+        self.fields = list(fields) if fields else None
+        self._seen = set()
+        self.kept = 0
+        self.duplicates = 0
+
+    @classmethod
+    def for_mentions(cls, spec: str = MENTION_DEDUP_FIELDS) -> "Deduplicator":
+        """
+        Create a deduplicator for raw software mentions.
+
+        Args:
+            spec: Field specification, MENTION_DEDUP_FIELDS by default
+
+        Returns:
+            Deduplicator
+        """
+        return cls(parse_fields(spec))
+
+    def key(self, item: Dict[str, Any]) -> int:
+        """
+        Hash the identifying fields of an object; missing fields count as None.
+
+        Args:
+            item: Object to hash
+
+        Returns:
+            64-bit hash
+        """
+        if self.fields is None:
+            return hash(json.dumps(item, sort_keys=True))
+
+        values = []
+        for path in self.fields:
+            value = item
+            for part in path:
+                value = value.get(part) if isinstance(value, dict) else None
+            values.append(_hashable(value))
+        return hash(tuple(values))
+
+    def filter(self, items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield the objects whose key was not seen before; the first one is kept.
+
+        Args:
+            items: Objects to deduplicate
+
+        Yields:
+            Objects not seen before
+        """
+        seen = self._seen
+        for item in items:
+            key = self.key(item)
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            self.kept += 1
+            yield item
@@ -0,0 +1,558 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, TYPE_CHECKING
+
+from pyArango.theExceptions import DocumentNotFoundError, UniqueConstrainViolation
+
+if TYPE_CHECKING:
+    from app.utils.db import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Collection holding the applied schema version and the migration lock
+SCHEMA_COLLECTION = "schema_migrations"
+SCHEMA_STATE_KEY = "schema"
+SCHEMA_LOCK_KEY = "lock"
+
+# A lock older than this is considered abandoned by a crashed worker
+LOCK_TIMEOUT_SECONDS = 300
+LOCK_POLL_INTERVAL_SECONDS = 0.5
+# The holder refreshes the lock this often while a migration runs, so a long one is never taken for abandoned
+LOCK_REFRESH_INTERVAL_SECONDS = LOCK_TIMEOUT_SECONDS / 5
+# Collections scanned by offline migrations: while they are empty, a worker can apply them as it starts
+OFFLINE_DATA_COLLECTIONS = ("documents", "software")
+
+
+class OfflineMigrationPending(RuntimeError):
+    """Raised when a worker starts while a migration that must run before the workers is pending."""
+
+
+class Migration:
+    """
+    A single, idempotent schema migration.
+
+    Migrations are applied in version order and each one must be safe to run again,
+    since a worker may crash after applying it but before recording the new version.
+    Offline migrations scan the stored data and can take longer than a worker may spend
+    booting, so a worker only applies them to an empty database; otherwise `flask migrate`
+    applies them before the workers start.
+    """
+
+    def __init__(self, version: int, description: str, apply: Callable[['DatabaseManager'], None],
+                 offline: bool = False):
+        """
+        Initialize the migration.
+
+        Args:
+            version: Schema version reached once the migration is applied
+            description: Short human-readable description
+            apply: Callable performing the migration against a DatabaseManager
+            offline: Whether the migration must not be applied when a worker starts on stored data
+        """
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.offline = offline
+
+
+class DuplicateDocumentsError(RuntimeError):
+    """Raised when documents share a file_hal_id, which prevents the unique index from being created."""
+
+
+def find_duplicate_documents(db_manager: 'DatabaseManager') -> List[Dict[str, Any]]:
+    """
+    Find the documents stored several times under the same file_hal_id.
+
+    Legacy uploads racing on the same HAL id stored the same document several times. For each
+    HAL id the copy with the most mentions is to be kept (the one keyed on the HAL id on a tie),
+    the others being copies of it.
+
+    Args:
+        db_manager: Database manager instance
+
+    Returns:
+        One dict per duplicated HAL id with the key to keep and the keys to remove with their
+        mention counts; documents without any file_hal_id are grouped under a None HAL id and
+        none of them is kept, they cannot be told apart
+    """
+    from app.utils.db import document_key_from_hal_id
+
+    query = """
+        FOR doc IN documents
+            COLLECT hal_id = doc.file_hal_id INTO copies = doc._key
+            FILTER LENGTH(copies) > 1
+            RETURN {
+                hal_id: hal_id,
+                copies: (
+                    FOR key IN copies
+                        LET mentions = LENGTH(
+                            FOR edge IN edge_doc_to_software
+                                FILTER edge._from == CONCAT("documents/", key)
+                                RETURN 1
+                        )
+                        RETURN { key: key, mentions: mentions }
+                )
+            }
+    """
+    duplicates = []
+    for group in db_manager.execute_aql_query(query, raw_results=True):
+        kept = None
+        if group["hal_id"] is not None:
+            own_key = document_key_from_hal_id(group["hal_id"])
+            kept = max(group["copies"], key=lambda copy: (copy["mentions"], copy["key"] == own_key))
+        duplicates.append({
+            "hal_id": group["hal_id"],
+            "keep": kept["key"] if kept else None,
+            "remove": sorted((copy for copy in group["copies"] if copy is not kept), key=lambda copy: copy["key"])
+        })
+    return duplicates
+
+
+def remove_duplicate_documents(db_manager: 'DatabaseManager', duplicates: List[Dict[str, Any]]) -> int:
+    """
+    Remove the extra copies of duplicated documents with their edges and mentions.
+
+    Documents without any file_hal_id are left alone: they have to be fixed by hand.
+
+    Args:
+        db_manager: Database manager instance
+        duplicates: Groups returned by find_duplicate_documents
+
+    Returns:
+        Number of documents removed
+    """
+    remove_query = """
+        FOR key IN @keys
+            LET mentions = (
+                FOR edge IN edge_doc_to_software
+                    FILTER edge._from == CONCAT("documents/", key)
+                    REMOVE edge IN edge_doc_to_software
+                    RETURN PARSE_IDENTIFIER(OLD._to).key
+            )
+            LET removed_mentions = (
+                FOR mention_key IN mentions
+                    REMOVE mention_key IN software OPTIONS { ignoreErrors: true }
+                    RETURN 1
+            )
+            REMOVE key IN documents
+            RETURN LENGTH(removed_mentions)
+    """
+
+    removed = 0
+    for group in duplicates:
+        if group["hal_id"] is None:
+            continue
+        keys = [copy["key"] for copy in group["remove"]]
+        mentions = sum(db_manager.execute_aql_query(remove_query, bind_vars={"keys": keys}, raw_results=True))
+        logger.warning(f"Removed {len(keys)} duplicate documents of {group['hal_id']} ({keys}) and their "
+                       f"{mentions} mentions, kept {group['keep']}")
+        removed += len(keys)
+    return removed
+
+
+def _check_duplicate_documents(db_manager: 'DatabaseManager') -> None:
+    """
+    Refuse to go on while documents share a file_hal_id.
+
+    Raises:
+        DuplicateDocumentsError: Listing the duplicated HAL ids
+    """
+    duplicates = find_duplicate_documents(db_manager)
+    if duplicates:
+        hal_ids = sorted(str(group["hal_id"]) for group in duplicates)
+        raise DuplicateDocumentsError(
+            f"{len(hal_ids)} HAL ids are stored in several documents, the unique index cannot be created: "
+            f"{hal_ids}. Review and remove the copies with `flask --app app.app remove-duplicate-documents`"
+        )
+
+
+def _drop_indexes(collection: Any, names: List[str]) -> None:
+    """Drop the named indexes of a collection, skipping those already gone."""
+    collection.getIndexes()
+    for name in names:
+        index = collection.indexes_by_name.get(name)
+        if index is not None:
+            index.delete()
+            logger.info(f"Dropped index {name} of {collection.name}")
+
+
+def _create_base_indexes(db_manager: 'DatabaseManager') -> None:
+    """Create the core collections and the indexes used by HAL id and software name lookups."""
+    documents = db_manager.check_or_create_collection("documents")
+    software = db_manager.check_or_create_collection("software")
+    db_manager.check_or_create_collection("edge_doc_to_software", "Edges")
+    _check_duplicate_documents(db_manager)
+
+    # FILTER doc.file_hal_id == @id, and rejects duplicates of legacy auto-keyed documents
+    documents.ensurePersistentIndex(["file_hal_id"], unique=True, sparse=False,
+                                    name="idx_documents_file_hal_id")
+    # FILTER soft.software_name.normalizedForm == @name
+    software.ensurePersistentIndex(["software_name.normalizedForm"], unique=False, sparse=False,
+                                   name="idx_software_normalized_name")
+    software.ensurePersistentIndex(["verification_by_author"], unique=False, sparse=True,
+                                   name="idx_software_verification")
+
+
+def _create_notification_outbox(db_manager: 'DatabaseManager') -> None:
+    """Create the notification outbox and the indexes used to claim and poll its entries."""
+    from app.utils.db import OUTBOX_COLLECTION
+
+    outbox = db_manager.check_or_create_collection(OUTBOX_COLLECTION)
+    # Dispatcher claims: FILTER entry.status == "pending" AND entry.available_at <= now
+    outbox.ensurePersistentIndex(["status", "available_at"], unique=False, sparse=False,
+                                 name="idx_outbox_status_available_at")
+    # Upload polling: FILTER entry.document_id == @document_id
+    outbox.ensurePersistentIndex(["document_id"], unique=False, sparse=False,
+                                 name="idx_outbox_document_id")
+
+
+def _create_inbox(db_manager: 'DatabaseManager') -> None:
+    """Create the collection of received notifications and the indexes used by the inbox consumer."""
+    from app.utils.db import INBOX_COLLECTION
+
+    inbox = db_manager.check_or_create_collection(INBOX_COLLECTION)
+    # Consumer claims: FILTER entry.status == "pending" AND entry.available_at <= now
+    inbox.ensurePersistentIndex(["status", "available_at"], unique=False, sparse=False,
+                                name="idx_inbox_status_available_at")
+    inbox.ensurePersistentIndex(["document_id"], unique=False, sparse=True,
+                                name="idx_inbox_document_id")
+
+
+def _create_notification_log_indexes(db_manager: 'DatabaseManager') -> None:
+    """Create the time indexes used to page through and prune the log of received notifications."""
+    from app.utils.db import INBOX_COLLECTION
+
+    inbox = db_manager.check_or_create_collection(INBOX_COLLECTION)
+    # SORT entry.seq DESC, with optional type or document filters
+    inbox.ensurePersistentIndex(["seq"], unique=False, sparse=False, name="idx_inbox_seq")
+    inbox.ensurePersistentIndex(["type", "seq"], unique=False, sparse=False, name="idx_inbox_type_seq")
+    inbox.ensurePersistentIndex(["document_id", "seq"], unique=False, sparse=False,
+                                name="idx_inbox_document_seq")
+
+
+def _create_notification_correlations(db_manager: 'DatabaseManager') -> None:
+    """Create the collection mapping sent notification ids to the software mentions they cover."""
+    from app.utils.db import NOTIFICATION_CORRELATION_COLLECTION
+
+    # Replies are resolved by _key (the notification id): the primary index is enough
+    db_manager.check_or_create_collection(NOTIFICATION_CORRELATION_COLLECTION)
+
+
+def _create_jobs(db_manager: 'DatabaseManager') -> None:
+    """Create the collection tracking background jobs."""
+    from app.utils.db import JOBS_COLLECTION
+
+    jobs = db_manager.check_or_create_collection(JOBS_COLLECTION)
+    # Job listing: FILTER job.type == @type SORT job.created_at DESC
+    jobs.ensurePersistentIndex(["type", "created_at"], unique=False, sparse=False, name="idx_jobs_type_created_at")
+
+
+def _create_pagination_indexes(db_manager: 'DatabaseManager') -> None:
+    """Create the indexes that let list endpoints cut pages on a key instead of an offset."""
+    from app.utils.db import OUTBOX_COLLECTION
+
+    software = db_manager.check_or_create_collection("software")
+    # FILTER soft.software_name.normalizedForm == @name AND soft._key > @after SORT soft._key
+    software.ensurePersistentIndex(["software_name.normalizedForm", "_key"], unique=False, sparse=False,
+                                   name="idx_software_name_key")
+    outbox = db_manager.check_or_create_collection(OUTBOX_COLLECTION)
+    # Dead letters: FILTER entry.status == "dead_letter" SORT entry.dead_lettered_at DESC, entry._key DESC
+    outbox.ensurePersistentIndex(["status", "dead_lettered_at"], unique=False, sparse=False,
+                                 name="idx_outbox_status_dead_lettered_at")
+    # Documents are paged on file_hal_id with idx_documents_file_hal_id
+
+
+def _create_software_entities(db_manager: 'DatabaseManager') -> None:
+    """Create the software entity collection and its ranking indexes, and compute it from the stored mentions."""
+    from app.utils.db import SOFTWARE_ENTITY_COLLECTION, SOFTWARE_ENTITY_RANKINGS
+
+    entities = db_manager.check_or_create_collection(SOFTWARE_ENTITY_COLLECTION)
+    # Top software: SORT entity.<counter> DESC LIMIT @limit
+    for counter in SOFTWARE_ENTITY_RANKINGS:
+        entities.ensurePersistentIndex([counter], unique=False, sparse=False,
+                                       name=f"idx_software_entities_{counter}")
+    software = db_manager.check_or_create_collection("software")
+    # All the mentions of an entity, e.g. its verified ones
+    software.ensurePersistentIndex(["entity_key", "verification_by_author"], unique=False, sparse=False,
+                                   name="idx_software_entity_verification")
+    db_manager.rebuild_software_entities()
+
+
+def _create_received_ids(db_manager: 'DatabaseManager') -> None:
+    """Create the collection of received notification ids kept after the log is pruned."""
+    from app.utils.db import INBOX_RECEIVED_COLLECTION
+
+    received = db_manager.check_or_create_collection(INBOX_RECEIVED_COLLECTION)
+    # Expiry: FILTER received.pruned_at < @before; redeliveries are looked up by _key
+    received.ensurePersistentIndex(["pruned_at"], unique=False, sparse=False, name="idx_inbox_received_pruned_at")
+
+
+def _store_notification_seq_in_microseconds(db_manager: 'DatabaseManager') -> None:
+    """Store the reception sequence of received notifications in microseconds and index it with its _key tiebreak."""
+    from app.utils.db import INBOX_COLLECTION
+
+    inbox = db_manager.check_or_create_collection(INBOX_COLLECTION)
+    # Sequences were stored in nanoseconds, above 2^53; the log is capped, so the update is bounded
+    query = f"""
+        FOR entry IN {INBOX_COLLECTION}
+            FILTER entry.seq > @max_microseconds
+            UPDATE entry WITH {{ seq: FLOOR(entry.seq / 1000) }} IN {INBOX_COLLECTION}
+    """
+    db_manager.execute_aql_query(query, bind_vars={"max_microseconds": 10 ** 17})
+    # SORT entry.seq DESC, entry._key DESC, with optional type or document filters
+    inbox.ensurePersistentIndex(["seq", "_key"], unique=False, sparse=False, name="idx_inbox_seq_key")
+    inbox.ensurePersistentIndex(["type", "seq", "_key"], unique=False, sparse=False, name="idx_inbox_type_seq_key")
+    inbox.ensurePersistentIndex(["document_id", "seq", "_key"], unique=False, sparse=False,
+                                name="idx_inbox_document_seq_key")
+    # Prefixes of the indexes above, which serve their queries too
+    _drop_indexes(inbox, ["idx_inbox_seq", "idx_inbox_type_seq", "idx_inbox_document_seq"])
+
+
+def _drop_software_name_index(db_manager: 'DatabaseManager') -> None:
+    """Drop the software name index, a prefix of the [name, _key] index of migration 7 that serves the same lookups."""
+    _drop_indexes(db_manager.check_or_create_collection("software"), ["idx_software_normalized_name"])
+
+
+def _create_stats(db_manager: 'DatabaseManager') -> None:
+    """Create the statistics collection and compute its counters from the stored data."""
+    from app.utils.db import STATS_COLLECTION
+
+    db_manager.check_or_create_collection(STATS_COLLECTION)
+    db_manager.rebuild_stats()
+
+
+# Ordered list of migrations; append new ones with the next version number
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create core collections and lookup indexes", _create_base_indexes),
+    Migration(2, "Create the notification outbox", _create_notification_outbox),
+    Migration(3, "Create the inbox of received notifications", _create_inbox),
+    Migration(4, "Index the notification log by reception time", _create_notification_log_indexes),
+    Migration(5, "Create the correlation index of sent notifications", _create_notification_correlations),
+    Migration(6, "Create the background jobs collection", _create_jobs),
+    Migration(7, "Index the keys list endpoints are paged on", _create_pagination_indexes),
+    Migration(8, "Create software entities with mention counters", _create_software_entities, offline=True),
+    Migration(9, "Create the statistics counters", _create_stats, offline=True),
+    Migration(10, "Remember the ids of notifications pruned from the inbox log", _create_received_ids),
+    Migration(11, "Store the notification log sequence in microseconds", _store_notification_seq_in_microseconds),
+    Migration(12, "Drop the software name index superseded by the [name, _key] index", _drop_software_name_index),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _has_stored_data(db_manager: 'DatabaseManager') -> bool:
+    """Check whether the collections scanned by offline migrations hold any document."""
+    for name in OFFLINE_DATA_COLLECTIONS:
+        collection = db_manager.get_collection(name)
+        if collection is not None and collection.count() > 0:
+            return True
+    return False
+
+
+def get_schema_version(db_manager: 'DatabaseManager') -> int:
+    """
+    Get the schema version recorded in the database.
+
+    Args:
+        db_manager: Database manager instance
+
+    Returns:
+        Applied schema version, 0 if no migration was ever applied
+    """
+    collection = db_manager.get_collection(SCHEMA_COLLECTION)
+    if collection is None:
+        return 0
+    try:
+        state = collection.fetchDocument(SCHEMA_STATE_KEY, rawResults=True)
+        return int(state.get("version", 0))
+    except DocumentNotFoundError:
+        return 0
+
+
+def _acquire_lock(db_manager: 'DatabaseManager', owner: str) -> bool:
+    """
+    Try to take the migration lock.
+
+    The lock is a document with a fixed _key, so only one worker can insert it.
+    A lock left behind by a crashed worker is removed once it is older than the timeout.
+    """
+    query = """
+        FOR lock IN @@collection
+            FILTER lock._key == @key AND lock.acquired_at_epoch < @stale_before
+            REMOVE lock IN @@collection
+    """
+    db_manager.execute_aql_query(query, bind_vars={
+        "@collection": SCHEMA_COLLECTION,
+        "key": SCHEMA_LOCK_KEY,
+        "stale_before": time.time() - LOCK_TIMEOUT_SECONDS
+    })
+
+    collection = db_manager.check_or_create_collection(SCHEMA_COLLECTION)
+    try:
+        lock = collection.createDocument({
+            "_key": SCHEMA_LOCK_KEY,
+            "owner": owner,
+            "acquired_at": _now(),
+            "acquired_at_epoch": time.time()
+        })
+        lock.save()
+        return True
+    except UniqueConstrainViolation:
+        return False
+
+
+def _refresh_lock(db_manager: 'DatabaseManager', owner: str) -> bool:
+    """Move the acquisition time of the migration lock forward if it is still held by this worker."""
+    query = """
+        FOR lock IN @@collection
+            FILTER lock._key == @key AND lock.owner == @owner
+            UPDATE lock WITH { acquired_at_epoch: @now } IN @@collection
+            RETURN 1
+    """
+    refreshed = db_manager.execute_aql_query(query, bind_vars={
+        "@collection": SCHEMA_COLLECTION,
+        "key": SCHEMA_LOCK_KEY,
+        "owner": owner,
+        "now": time.time()
+    }, raw_results=True)
+    return len(list(refreshed)) > 0
+
+
+@contextmanager
+def _keep_lock(db_manager: 'DatabaseManager', owner: str) -> Iterator[None]:
+    """Refresh the migration lock in the background while the block runs, e.g. a single long query."""
+    stopped = threading.Event()
+
+    def refresh() -> None:
+        while not stopped.wait(LOCK_REFRESH_INTERVAL_SECONDS):
+            try:
+                if not _refresh_lock(db_manager, owner):
+                    logger.error("Migration lock lost: another worker may be migrating the schema too")
+            except Exception as e:
+                logger.warning(f"Failed to refresh migration lock: {e}")
+
+    thread = threading.Thread(target=refresh, name="migration-lock", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _release_lock(db_manager: 'DatabaseManager', owner: str) -> None:
+    """Release the migration lock if it is still held by this worker."""
+    query = """
+        FOR lock IN @@collection
+            FILTER lock._key == @key AND lock.owner == @owner
+            REMOVE lock IN @@collection
+    """
+    try:
+        db_manager.execute_aql_query(query, bind_vars={
+            "@collection": SCHEMA_COLLECTION,
+            "key": SCHEMA_LOCK_KEY,
+            "owner": owner
+        })
+    except Exception as e:
+        logger.warning(f"Failed to release migration lock: {e}")
+
+
+def _record_version(db_manager: 'DatabaseManager', migration: Migration) -> None:
+    """Record a migration as applied, never moving the schema version backwards."""
+    query = """
+        UPSERT { _key: @key }
+            INSERT { _key: @key, version: @version, applied: [@entry] }
+            UPDATE {
+                version: MAX([OLD.version, @version]),
+                applied: PUSH(OLD.applied, @entry)
+            }
+            IN @@collection
+    """
+    db_manager.execute_aql_query(query, bind_vars={
+        "@collection": SCHEMA_COLLECTION,
+        "key": SCHEMA_STATE_KEY,
+        "version": migration.version,
+        "entry": {
+            "version": migration.version,
+            "description": migration.description,
+            "applied_at": _now()
+        }
+    })
+
+
+def run_migrations(db_manager: 'DatabaseManager', owner: Optional[str] = None,
+                   wait_timeout: float = LOCK_TIMEOUT_SECONDS, include_offline: bool = True) -> Dict[str, Any]:
+    """
+    Apply pending schema migrations.
+
+    Safe to call from several workers at once: one worker takes the lock and applies
+    the migrations while the others wait until the schema version is up to date.
+    The lock is refreshed while each migration runs.
+
+    Args:
+        db_manager: Database manager instance
+        owner: Identifier of the caller, stored in the lock document
+        wait_timeout: Maximum time in seconds to wait for another worker holding the lock
+        include_offline: Whether offline migrations may be applied to stored data; False when a worker starts
+
+    Returns:
+        Dict with the schema version before and after, and the applied migration versions
+
+    Raises:
+        OfflineMigrationPending: If include_offline is False and an offline migration is pending
+            while documents or software mentions are stored
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    db_manager.check_or_create_collection(SCHEMA_COLLECTION)
+
+    initial_version = get_schema_version(db_manager)
+    if initial_version >= LATEST_SCHEMA_VERSION:
+        logger.info(f"Database schema is up to date (version {initial_version})")
+        return {"from_version": initial_version, "to_version": initial_version, "applied": []}
+
+    if not include_offline:
+        offline = [migration.version for migration in MIGRATIONS
+                   if migration.offline and migration.version > initial_version]
+        # On an empty database they have nothing to scan
+        if offline and _has_stored_data(db_manager):
+            raise OfflineMigrationPending(
+                f"Schema migrations {offline} scan the stored data and must be applied before the workers start: "
+                f"run `flask --app app.app migrate`"
+            )
+
+    deadline = time.monotonic() + wait_timeout
+    while not _acquire_lock(db_manager, owner):
+        if get_schema_version(db_manager) >= LATEST_SCHEMA_VERSION:
+            version = get_schema_version(db_manager)
+            logger.info(f"Database schema migrated by another worker (version {version})")
+            return {"from_version": initial_version, "to_version": version, "applied": []}
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timed out waiting for the schema migration lock")
+        time.sleep(LOCK_POLL_INTERVAL_SECONDS)
+
+    applied = []
+    try:
+        current_version = get_schema_version(db_manager)
+        for migration in MIGRATIONS:
+            if migration.version <= current_version:
+                continue
+            logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+            with _keep_lock(db_manager, owner):
+                migration.apply(db_manager)
+            _record_version(db_manager, migration)
+            applied.append(migration.version)
+    finally:
+        _release_lock(db_manager, owner)
+
+    final_version = get_schema_version(db_manager)
+    logger.info(f"Database schema migrated from version {initial_version} to {final_version}")
+    return {"from_version": initial_version, "to_version": final_version, "applied": applied}
@@ -1,17 +1,18 @@
 import logging
-import os
-from typing import Dict, Any, Optional
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 from enum import Enum
 
-from dotenv import load_dotenv
-
 from app.classes.ActionReviewNotifier import ActionReviewNotifier
 from app.classes.RelationshipAnnounceNotifier import RelationshipAnnounceNotifier
+from app.utils.config_registry import config_registry
 from app.utils.db import get_db
+from app.utils.delivery import get_circuit_breaker, is_retryable
+from app.utils.http_client import get_session
+from app.utils.rate_limit import get_rate_limiter
 
 logger = logging.getLogger(__name__)
 
-
 class ProviderType(Enum):
     """Enumeration of supported data providers."""
     SW_VIZ = "software_viz"
@@ -96,6 +97,40 @@ def extract_notification_data(notification: Dict[str, Any]) -> tuple[str, str]:
         raise ValueError(f"Invalid notification format: missing {e}")
 
 
+def extract_offer_id(notification: Dict[str, Any]) -> Optional[str]:
+    """Get the id of the notification we sent that a reply answers (inReplyTo, or the embedded offer id)."""
+    offer_id = notification.get('inReplyTo')
+    if not offer_id and isinstance(notification.get('object'), dict):
+        offer_id = notification['object'].get('id')
+    return offer_id if isinstance(offer_id, str) and offer_id else None
+
+
+def apply_author_validation(notification: Dict[str, Any], accepted: bool) -> bool:
+    """
+    Record the author's answer on the software mentions a reply is about.
+
+    The mentions are resolved through the id of the notification we sent, which maps to
+    their exact keys. Replies to notifications sent before ids were recorded fall back to
+    matching the software name within the document.
+
+    Args:
+        notification: COAR Accept or Reject notification payload
+        accepted: Verification status
+
+    Returns:
+        bool: True if at least one software entry was updated, False otherwise
+    """
+    db_manager = get_db()
+    offer_id = extract_offer_id(notification)
+    if offer_id:
+        updated = db_manager.update_software_verification_by_notification(offer_id, accepted)
+        if updated is not None:
+            return bool(updated)
+
+    document_id, software_name = extract_notification_data(notification)
+    return db_manager.update_software_with_author_validation(document_id, software_name, accepted)
+
+
 def accept_notification(notification: Dict[str, Any]) -> bool:
     """
     Handle notification acceptance by marking software as verified by author.
@@ -107,10 +142,9 @@ def accept_notification(notification: Dict[str, Any]) -> bool:
         bool: True if update was successful, False otherwise
     """
     try:
-        db_manager = get_db()
         document_id, software_name = extract_notification_data(notification)
         logger.info(f"Accepting notification for HAL: {document_id}, Software: {software_name}")
-        return db_manager.update_software_with_author_validation(document_id, software_name, True)
+        return apply_author_validation(notification, True)
     except (ValueError, KeyError) as e:
         logger.error(f"Failed to accept notification: {e}")
         return False
@@ -127,204 +161,211 @@ def reject_notification(notification: Dict[str, Any]) -> bool:
         bool: True if update was successful, False otherwise
     """
     try:
-        db_manager = get_db()
         document_id, software_name = extract_notification_data(notification)
         logger.info(f"Rejecting notification for HAL: {document_id}, Software: {software_name}")
-        return db_manager.update_software_with_author_validation(document_id, software_name, False)
+        return apply_author_validation(notification, False)
     except (ValueError, KeyError) as e:
         logger.error(f"Failed to reject notification: {e}")
         return False
 
 
-def get_software_notifications(document_id: str) -> list[Dict[str, Any]]:
+def _env_number(env: Dict[str, str], name: str, default: Union[int, float], cast: Callable[[str], Any]):
     """
-    Retrieve software notifications for a given HAL document.
-
-    Args:
-        hal_filename: HAL filename without extension
+    Parse a numeric setting of a configuration snapshot.
 
-    Returns:
-        List of notification data for software mentions in the document
+    A malformed value is logged and replaced by the default instead of failing every send.
+    Snapshots are parsed once per registry version, so the warning is logged once per reload.
     """
+    value = env.get(name)
+    if value is None or value == '':
+        return default
     try:
-        from app.utils.db import get_db
-        db_manager = get_db()
-        return db_manager.get_software_notifications(document_id)
+        return cast(value)
+    except ValueError:
+        logger.warning(f"Invalid {name}={value!r}, using the default {default}")
+        return default
+
+
+def _build_provider_configs(env: Dict[str, str]) -> Dict[ProviderType, Dict[str, Any]]:
+    """Build the configuration of every provider from a configuration snapshot."""
+    logger.debug(f"HAL_TOKEN from environment: {'set' if env.get('HAL_TOKEN') else 'NOT SET'}")
+    logger.debug(f"SWH_TOKEN from environment: {'set' if env.get('SWH_TOKEN') else 'NOT SET'}")
+    logger.debug(f"SW_VIZ_TOKEN from environment: {'set' if env.get('SW_VIZ_TOKEN') else 'NOT SET'}")
+    return {
+        ProviderType.HAL: {
+            'base_url': env.get('HAL_BASE_URL', 'https://inria.hal.science'),
+            'inbox_url': env.get('HAL_INBOX_URL', 'https://inbox-preprod.archives-ouvertes.fr/'),
+            'token': env.get('HAL_TOKEN'),
+            # Requests per second to the inbox, shared by every worker on the node (0 disables)
+            'rate_limit': _env_number(env, 'HAL_RATE_LIMIT', 5.0, float),
+            'rate_burst': _env_number(env, 'HAL_RATE_BURST', 10, int),
+        },
+        ProviderType.SOFTWARE_HERITAGE: {
+            'base_url': env.get('SWH_BASE_URL', 'https://archive.softwareheritage.org'),
+            'inbox_url': env.get('SWH_INBOX_URL', 'https://inbox.staging.swh.network/'),
+            'token': env.get('SWH_TOKEN'),
+            'rate_limit': _env_number(env, 'SWH_RATE_LIMIT', 5.0, float),
+            'rate_burst': _env_number(env, 'SWH_RATE_BURST', 10, int),
+        },
+        ProviderType.SW_VIZ: {
+            'base_url': env.get('SW_VIZ_URL', 'http://coar-viz:8080'),
+            'token': env.get('SW_VIZ_TOKEN'),
+        },
+    }
 
-    except Exception as e:
-        logger.error(f"Failed to retrieve software notifications for {document_id}: {e}")
-        return []
+
+# Provider configurations built from the registry snapshot of the given version
+_provider_configs: Tuple[int, Dict[ProviderType, Dict[str, Any]]] = (-1, {})
 
 
-def get_notification_config_for_provider(provider: ProviderType) -> Dict[str, str]:
+def get_notification_config_for_provider(provider: ProviderType) -> Dict[str, Any]:
     """
     Get notification configuration for a specific provider.
 
+    The configuration is built once per version of the configuration registry, which
+    reloads .env when it changes or on SIGHUP, so this performs no file I/O.
+
     Args:
         provider: The provider type
 
     Returns:
-        Dict containing provider-specific configuration
+        Dict containing provider-specific configuration (shared, must not be modified)
     """
+    global _provider_configs
+
+    version, env = config_registry.snapshot()
+    built_version, configs = _provider_configs
+    if built_version != version:
+        configs = _build_provider_configs(env)
+        _provider_configs = (version, configs)
+
+    return configs.get(provider, {})
+
+
+def _build_hal_notifier(document_id: str, notification: Dict[str, Any], config: Dict[str, Any]) -> ActionReviewNotifier:
+    """Build the ActionReview notification sent to HAL for one software mention."""
+    return ActionReviewNotifier(
+        document_id,
+        actor_id="https://datalake.inria.fr",
+        actor_name="Inria DataLake",
+        origin_inbox="https://prod-datadcis-api.inria.fr/coar/inbox",
+        software_name=notification.get('softwareName', 'Unknown software'),
+        software_repo=None,
+        mention_type="software",
+        mention_context=notification.get('contexts', []),
+        target_id=config['base_url'],
+        target_inbox=config['inbox_url'],
+        token=config['token'],
+        session=get_session(config['inbox_url']),
+        notification_id=notification.get('notificationId')
+    )
+
+
+def _build_swh_notifier(document_id: str, notification: Dict[str, Any], config: Dict[str, Any]) -> RelationshipAnnounceNotifier:
+    """Build the RelationshipAnnounce notification sent to Software Heritage for one software mention."""
+    return RelationshipAnnounceNotifier(
+        document_id,
+        "https://prod-datadcis-api.inria.fr/coar",
+        "Inria DataLake",
+        "https://prod-datadcis-api.inria.fr/coar/inbox",
+        notification.get('softwareName'),
+        target_id="https://www.softwareheritage.org",
+        target_inbox=config['inbox_url'],
+        token=config['token'],
+        session=get_session(config['inbox_url']),
+        notification_id=notification.get('notificationId')
+    )
+
+
+_NOTIFIER_BUILDERS = {
+    ProviderType.HAL: ("HAL", _build_hal_notifier),
+    ProviderType.SOFTWARE_HERITAGE: ("SWH", _build_swh_notifier),
+}
+
+
+def _retry_after_seconds(retry_after: Optional[str], default: float) -> float:
+    """Parse a Retry-After header given in seconds, falling back to `default`."""
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return default
 
-    load_dotenv(override=True)
-    config = {}
 
-    if provider == ProviderType.HAL:
-        hal_token = os.getenv('HAL_TOKEN')
-        logger.debug(f"HAL_TOKEN from environment: {'set' if hal_token else 'NOT SET'}")
-        config.update({
-            'base_url': os.getenv('HAL_BASE_URL', 'https://inria.hal.science'),
-            'inbox_url': os.getenv('HAL_INBOX_URL', 'https://inbox-preprod.archives-ouvertes.fr/'),
-            'token': hal_token,
-        })
-    elif provider == ProviderType.SOFTWARE_HERITAGE:
-        swh_token = os.getenv('SWH_TOKEN')
-        logger.debug(f"SWH_TOKEN from environment: {'set' if swh_token else 'NOT SET'}")
-        config.update({
-            'base_url': os.getenv('SWH_BASE_URL', 'https://archive.softwareheritage.org'),
-            'inbox_url': os.getenv('SWH_INBOX_URL', 'https://inbox.staging.swh.network/'),
-            'token': swh_token,
-        })
-    elif provider == ProviderType.SW_VIZ:
-        sw_viz_token = os.getenv('SW_VIZ_TOKEN')
-        logger.debug(f"SW_VIZ_TOKEN from environment: {'set' if sw_viz_token else 'NOT SET'}")
-        config.update({
-            'base_url': os.getenv('SW_VIZ_URL', 'http://coar-viz:8080'),
-            'token': sw_viz_token,
-        })
-
-    return config
-
-
-def send_notifications_to_swh(document_id: str, notifications=None) -> Dict[str, Any]:
+def _deliver(provider_label: str, notifier, software_name: str, config: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Send COAR notifications specifically to Software Heritage for software mentions.
+    Send one notification through the circuit breaker and rate limiter of its target inbox.
 
     Args:
-        document_id: document identifier
-        notifications: List of notification data for software mentions in the document
+        provider_label: Provider name used in log messages
+        notifier: ActionReviewNotifier or RelationshipAnnounceNotifier to send
+        software_name: Software the notification is about, used in log messages
+        config: Provider configuration, for the rate limits
 
     Returns:
-        Dict: {'success_count': int, 'failure_count': int, 'total_count': int}
+        Dict: {'delivered': bool, 'retryable': bool, 'status_code': int or None,
+               'error': str or None, 'retry_after': str or None, 'circuit_open': bool,
+               'throttled': bool}; 'retry_at' (epoch seconds) is set when nothing was sent
+               because the circuit is open or no rate limit token was available in time
     """
-    try:
-        if not document_id:
-            logger.error("Invalid document ID provided")
-            return {'success_count': 0, 'failure_count': 0, 'total_count': 0}
-
-        logger.info(f"Processing Software Heritage notifications for document: {document_id}")
-
-        if not notifications:
-            logger.warning(f"No software retrieved for {document_id}. No notifications will be sent.")
-            return {'success_count': 0, 'failure_count': 0, 'total_count': 0}
-
-        config = get_notification_config_for_provider(ProviderType.SOFTWARE_HERITAGE)
-
-        success_count = 0
-        failure_count = 0
-
-        for notification in notifications:
-            software_name = notification.get('softwareName')
-            try:
-                notifier = RelationshipAnnounceNotifier(
-                    document_id,
-                    "https://prod-datadcis-api.inria.fr/coar",
-                    "Inria DataLake",
-                    "https://prod-datadcis-api.inria.fr/coar/inbox",
-                    software_name,
-                    target_id="https://www.softwareheritage.org",
-                    target_inbox=config['inbox_url'],
-                    token=config['token']
-                )
-                response = notifier.send()
-
-                if response and 200 <= response.status_code < 300:
-                    success_count += 1
-                    logger.debug(f"Successfully sent SWH notification for software: {software_name}")
-                else:
-                    failure_count += 1
-                    status = response.status_code if response else "No response"
-                    logger.error(f"Failed to send SWH notification for software {software_name}: HTTP {status}")
-
-            except Exception as e:
-                failure_count += 1
-                logger.error(f"Exception processing SWH notification for software {software_name}: {e}")
-
-        total_count = len(notifications)
-        logger.info(f"SWH notifications for {document_id}: {success_count} successful, {failure_count} failed (total: {total_count})")
-
-        return {'success_count': success_count, 'failure_count': failure_count, 'total_count': total_count}
-
-    except Exception as e:
-        logger.error(f"Failed to process Software Heritage notifications for {document_id}: {e}")
-        return {'success_count': 0, 'failure_count': len(notifications) if notifications else 0, 'total_count': len(notifications) if notifications else 0}
+    breaker = get_circuit_breaker(notifier.target_inbox)
+    if not breaker.allow_request():
+        return {'delivered': False, 'retryable': True, 'status_code': None, 'retry_after': None,
+                'error': f"Circuit open for {breaker.name}", 'circuit_open': True, 'throttled': False,
+                'retry_at': breaker.retry_at()}
+
+    limiter = get_rate_limiter(notifier.target_inbox, config['rate_limit'], config['rate_burst'])
+    wait = limiter.acquire() if limiter else None
+    if wait is not None:
+        breaker.release()
+        return {'delivered': False, 'retryable': True, 'status_code': None, 'retry_after': None,
+                'error': f"Rate limit reached for {limiter.name}", 'circuit_open': False, 'throttled': True,
+                'retry_at': time.time() + wait}
+
+    response = notifier.send()
+    if response and 200 <= response.status_code < 300:
+        breaker.record_success()
+        logger.debug(f"Successfully sent {provider_label} notification for software: {software_name}")
+        return {'delivered': True, 'retryable': False, 'status_code': response.status_code,
+                'error': None, 'retry_after': None, 'circuit_open': False, 'throttled': False}
+
+    retryable = is_retryable(notifier.last_status_code)
+    if notifier.last_status_code == 429:
+        # The inbox is up but throttling us: slow every worker down instead of opening the circuit
+        breaker.record_success()
+        if limiter:
+            limiter.penalize(_retry_after_seconds(notifier.retry_after, limiter.burst / limiter.rate))
+    elif retryable:
+        breaker.record_failure()
+    else:
+        # The inbox answered: it is up, the notification itself was refused
+        breaker.record_success()
+    status = notifier.last_status_code or notifier.last_error or "No response"
+    logger.error(f"Failed to send {provider_label} notification for software {software_name} "
+                 f"({'retryable' if retryable else 'permanent'}): {status}")
+    return {'delivered': False, 'retryable': retryable, 'status_code': notifier.last_status_code,
+            'error': notifier.last_error or f"HTTP {notifier.last_status_code}",
+            'retry_after': notifier.retry_after, 'circuit_open': False, 'throttled': False}
 
 
-def send_notifications_to_hal(document_id: str, notifications=None) -> Dict[str, Any]:
+def deliver_notification(provider: ProviderType, document_id: str, notification: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Send COAR notifications to HAL for software mentions in a document.
+    Send a single notification and report whether a failure is worth retrying.
 
     Args:
+        provider: Target provider (HAL or Software Heritage)
         document_id: document identifier
-        notifications: List of notification data for software mentions in the document
+        notification: Notification data ({'softwareName': str, 'contexts': list}, and the
+            'notificationId' assigned when it was queued)
 
     Returns:
-        Dict: {'success_count': int, 'failure_count': int, 'total_count': int}
+        Dict: Delivery outcome, {'delivered': bool, 'retryable': bool, 'status_code': int or None,
+              'error': str or None, 'retry_after': str or None, 'circuit_open': bool, 'throttled': bool};
+              'retry_at' (epoch seconds) is set when nothing was sent
     """
-    try:
-        if not document_id:
-            logger.error("Invalid document ID provided")
-            return {'success_count': 0, 'failure_count': 0, 'total_count': 0}
-
-        logger.info(f"Processing notifications for HAL for document: {document_id}")
-
-        if not notifications:
-            logger.warning(f"No software retrieved for {document_id}. No notifications will be sent.")
-            return {'success_count': 0, 'failure_count': 0, 'total_count': 0}
-
-        config = get_notification_config_for_provider(ProviderType.HAL)
-
-        success_count = 0
-        failure_count = 0
-
-        for notification in notifications:
-            software_name = notification.get('softwareName', 'Unknown software')
-            try:
-                notifier = ActionReviewNotifier(
-                    document_id,
-                    actor_id="https://datalake.inria.fr",
-                    actor_name="Inria DataLake",
-                    origin_inbox="https://prod-datadcis-api.inria.fr/coar/inbox",
-                    software_name=software_name,
-                    software_repo=None,
-                    mention_type="software",
-                    mention_context=notification.get('contexts', []),
-                    target_id=config['base_url'],
-                    target_inbox=config['inbox_url'],
-                    token=config['token']
-                )
-                response = notifier.send()
-                if response and 200 <= response.status_code < 300:
-                    success_count += 1
-                    logger.debug(f"Successfully sent HAL notification for software: {software_name}")
-                else:
-                    failure_count += 1
-                    status = response.status_code if response else "No response"
-                    logger.error(f"Failed to send HAL notification for software {software_name}: HTTP {status}")
-
-            except Exception as e:
-                failure_count += 1
-                logger.error(f"Exception processing HAL notification for software {software_name}: {e}")
-
-        total_count = len(notifications)
-        logger.info(f"HAL notifications for {document_id}: {success_count} successful, {failure_count} failed (total: {total_count})")
-
-        return {'success_count': success_count, 'failure_count': failure_count, 'total_count': total_count}
-
-    except Exception as e:
-        logger.error(f"Failed to process notifications for document_id {document_id}: {e}")
-        return {'success_count': 0, 'failure_count': len(notifications) if notifications else 0, 'total_count': len(notifications) if notifications else 0}
+    provider_label, build_notifier = _NOTIFIER_BUILDERS[provider]
+    config = get_notification_config_for_provider(provider)
+    return _deliver(provider_label, build_notifier(document_id, notification, config),
+                    notification.get('softwareName', 'Unknown software'), config)
 
 
 def send_validation_to_viz(document_id: str, software_name: str, accepted: bool = True):
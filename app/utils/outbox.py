@@ -0,0 +1,353 @@
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.utils.db import get_db, notification_stat, OUTBOX_COLLECTION
+from app.utils.delivery import MAX_DELIVERY_ATTEMPTS, retry_delay
+from app.utils.notification_handler import ProviderType, deliver_notification
+from app.utils.pagination import clamp_limit
+
+logger = logging.getLogger(__name__)
+
+# Outbox entry statuses
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+# Dead-letter: permanently refused, or still failing after MAX_DELIVERY_ATTEMPTS; replayable
+STATUS_DEAD_LETTER = "dead_letter"
+# Withdrawn before being sent, e.g. because the software name was blacklisted afterwards
+STATUS_CANCELLED = "cancelled"
+
+# Providers notifications are queued for on document ingestion
+OUTBOX_PROVIDERS = [ProviderType.HAL.value, ProviderType.SOFTWARE_HERITAGE.value]
+
+DISPATCH_BATCH_SIZE = int(os.getenv("OUTBOX_DISPATCH_BATCH_SIZE", 50))
+DISPATCH_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL", 2.0))
+# Outbox entries sent at the same time by one dispatcher
+DISPATCH_CONCURRENCY = int(os.getenv("OUTBOX_DISPATCH_CONCURRENCY", 16))
+# An entry claimed by a dispatcher that died is claimed again after this delay
+CLAIM_TIMEOUT_MS = 10 * 60 * 1000
+
+
+def claim_outbox_entries(limit: int = DISPATCH_BATCH_SIZE, worker_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Atomically claim the oldest outbox entries that are due.
+
+    Entries move from 'pending' to 'sending' in a single AQL statement, so two
+    dispatchers never claim the same entry. Entries left in 'sending' by a dispatcher
+    that died are claimed again after CLAIM_TIMEOUT_MS.
+
+    Args:
+        limit: Maximum number of entries to claim
+        worker_id: Identifier of the dispatcher, stored on the claimed entries
+
+    Returns:
+        List of claimed outbox entries
+    """
+    query = f"""
+        FOR entry IN {OUTBOX_COLLECTION}
+            FILTER (entry.status == @pending AND entry.available_at <= DATE_NOW())
+                OR (entry.status == @sending AND entry.claimed_at < DATE_NOW() - @claim_timeout)
+            SORT entry.available_at
+            LIMIT @limit
+            UPDATE entry WITH {{
+                status: @sending,
+                claimed_by: @worker_id,
+                claimed_at: DATE_NOW()
+            }} IN {OUTBOX_COLLECTION}
+            RETURN NEW
+    """
+    bind_vars = {
+        "pending": STATUS_PENDING,
+        "sending": STATUS_SENDING,
+        "claim_timeout": CLAIM_TIMEOUT_MS,
+        "limit": limit,
+        "worker_id": worker_id or f"{socket.gethostname()}:{os.getpid()}",
+    }
+    result = get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True)
+    return list(result)
+
+
+def dispatch_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send the notification described by an outbox entry.
+
+    Args:
+        entry: Claimed outbox entry
+
+    Returns:
+        Dict: Delivery outcome, see notification_handler.deliver_notification
+    """
+    try:
+        provider = ProviderType(entry.get("provider"))
+    except ValueError:
+        logger.error(f"No sender for provider '{entry.get('provider')}' (outbox entry {entry['_key']})")
+        return {"delivered": False, "retryable": False, "error": f"Unknown provider '{entry.get('provider')}'"}
+
+    notification = {
+        "softwareName": entry["software_name"],
+        "contexts": entry.get("contexts", []),
+        # Assigned and correlated with the software keys when the entry was queued
+        "notificationId": entry.get("notification_id"),
+    }
+    return deliver_notification(provider, entry["document_id"], notification)
+
+
+def _outcome_changes(entry: Dict[str, Any], outcome: Dict[str, Any], now_ms: int) -> Dict[str, Any]:
+    """
+    Compute the outbox update for a delivery outcome.
+
+    Delivered entries are marked sent. Retryable failures go back to pending with an
+    exponential backoff, until MAX_DELIVERY_ATTEMPTS is reached. Permanent failures and
+    exhausted entries are dead-lettered. When nothing was sent (open circuit, rate limit),
+    the entry is rescheduled without counting an attempt.
+    """
+    if outcome.get("retry_at") is not None:
+        return {
+            "status": STATUS_PENDING,
+            "available_at": int(outcome["retry_at"] * 1000),
+            "last_error": outcome["error"],
+        }
+
+    attempts = entry.get("attempts", 0) + 1
+    changes = {
+        "attempts": attempts,
+        "last_attempt_at": now_ms,
+        "last_error": outcome.get("error"),
+        "last_status_code": outcome.get("status_code"),
+    }
+    if outcome["delivered"]:
+        changes.update(status=STATUS_SENT, sent_at=now_ms)
+    elif outcome.get("retryable") and attempts < MAX_DELIVERY_ATTEMPTS:
+        delay_ms = int(retry_delay(attempts, outcome.get("retry_after")) * 1000)
+        changes.update(status=STATUS_PENDING, available_at=now_ms + delay_ms)
+    else:
+        changes.update(status=STATUS_DEAD_LETTER, dead_lettered_at=now_ms)
+    return changes
+
+
+def _record_results(results: List[Dict[str, Any]]) -> None:
+    """Write the outcome of a dispatch round back to the outbox in one statement."""
+    if not results:
+        return
+    query = f"""
+        FOR result IN @results
+            LET entry = DOCUMENT("{OUTBOX_COLLECTION}", result.key)
+            // Entries cancelled while they were sent, e.g. those of a deleted document, stay cancelled
+            FILTER entry != null AND entry.status != @cancelled
+            UPDATE entry WITH result.changes IN {OUTBOX_COLLECTION}
+    """
+    get_db().execute_aql_query(query, bind_vars={"results": results, "cancelled": STATUS_CANCELLED})
+
+
+def dispatch_pending(limit: int = DISPATCH_BATCH_SIZE, worker_id: Optional[str] = None) -> Dict[str, int]:
+    """
+    Claim due outbox entries, send them and record the outcome.
+
+    Delivered notifications and failed delivery attempts are added to the statistics of
+    their provider; entries rescheduled without being sent are not counted.
+
+    Args:
+        limit: Maximum number of entries handled in this round
+        worker_id: Identifier of the dispatcher
+
+    Returns:
+        Dict: {'success_count': int, 'failure_count': int, 'total_count': int}
+    """
+    entries = claim_outbox_entries(limit, worker_id)
+    success_count = 0
+    failure_count = 0
+    results = []
+
+    def attempt(entry: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return dispatch_entry(entry)
+        except Exception as e:
+            logger.error(f"Exception dispatching outbox entry {entry['_key']}: {e}")
+            return {"delivered": False, "retryable": True, "error": str(e)}
+
+    # Entries for HAL and Software Heritage are sent side by side, each provider
+    # reusing its pooled keep-alive connections
+    if entries:
+        with ThreadPoolExecutor(max_workers=min(DISPATCH_CONCURRENCY, len(entries)),
+                                thread_name_prefix="outbox") as executor:
+            outcomes = list(executor.map(attempt, entries))
+    else:
+        outcomes = []
+
+    now_ms = int(time.time() * 1000)
+    stats: Dict[str, int] = {}
+    for entry, outcome in zip(entries, outcomes):
+        if outcome["delivered"]:
+            success_count += 1
+        else:
+            failure_count += 1
+        if outcome["delivered"] or outcome.get("retry_at") is None:
+            stat = notification_stat(entry.get("provider"), "sent" if outcome["delivered"] else "failed")
+            stats[stat] = stats.get(stat, 0) + 1
+        results.append({"key": entry["_key"], "changes": _outcome_changes(entry, outcome, now_ms)})
+
+    _record_results(results)
+    get_db().record_stats(stats)
+
+    if entries:
+        logger.info(f"Outbox dispatch: {success_count} sent, {failure_count} failed or rescheduled (total: {len(entries)})")
+    return {'success_count': success_count, 'failure_count': failure_count, 'total_count': len(entries)}
+
+
+def run_dispatcher(batch_size: int = DISPATCH_BATCH_SIZE,
+                   poll_interval: float = DISPATCH_POLL_INTERVAL_SECONDS,
+                   once: bool = False) -> None:
+    """
+    Drain the outbox until interrupted.
+
+    Args:
+        batch_size: Maximum number of entries claimed per round
+        poll_interval: Seconds to wait when the outbox has nothing due
+        once: Stop after the outbox has nothing due instead of polling forever
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Outbox dispatcher {worker_id} started")
+
+    while True:
+        try:
+            summary = dispatch_pending(batch_size, worker_id)
+        except Exception as e:
+            logger.error(f"Outbox dispatch round failed: {e}")
+            summary = {'total_count': 0}
+
+        if summary['total_count'] == 0:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def get_outbox_status(document_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the delivery status of the notifications queued for a document.
+
+    Args:
+        document_id: HAL document identifier
+
+    Returns:
+        Dict with per-status counts and entries, or None if nothing was queued
+    """
+    query = f"""
+        FOR entry IN {OUTBOX_COLLECTION}
+            FILTER entry.document_id == @document_id
+            SORT entry.provider, entry.software_name
+            RETURN KEEP(entry, "_key", "notification_id", "provider", "software_name", "status",
+                        "attempts", "created_at", "sent_at", "available_at", "last_error")
+    """
+    result = get_db().execute_aql_query(query, bind_vars={"document_id": document_id}, raw_results=True)
+    entries = list(result)
+    if not entries:
+        return None
+
+    counts = {STATUS_PENDING: 0, STATUS_SENDING: 0, STATUS_SENT: 0, STATUS_DEAD_LETTER: 0, STATUS_CANCELLED: 0}
+    for entry in entries:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+    return {
+        "document_id": document_id,
+        "complete": counts[STATUS_PENDING] == 0 and counts[STATUS_SENDING] == 0,
+        "counts": counts,
+        "total_count": len(entries),
+        "entries": entries,
+    }
+
+
+def list_dead_letters(document_id: Optional[str] = None, limit: int = 100,
+                      after: Optional[str] = None) -> Dict[str, Any]:
+    """
+    List dead-lettered outbox entries, most recent first.
+
+    Pages are cut on (dead_lettered_at, _key) rather than with an offset, so every page
+    costs the same whatever its depth.
+
+    Args:
+        document_id: Only list the entries of this document
+        limit: Page size, capped to MAX_PAGE_SIZE
+        after: Cursor returned as 'next_after' by the previous page
+
+    Returns:
+        Dict with the dead-lettered 'entries' and 'next_after' (None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = clamp_limit(limit)
+    before_at, before_key = None, None
+    if after:
+        before_at, before_key = after.split(":", 1)
+        before_at = int(before_at)
+
+    query = f"""
+        FOR entry IN {OUTBOX_COLLECTION}
+            FILTER entry.status == @dead_letter
+            FILTER @document_id == null OR entry.document_id == @document_id
+            FILTER @before_at == null OR entry.dead_lettered_at < @before_at
+                OR (entry.dead_lettered_at == @before_at AND entry._key < @before_key)
+            SORT entry.dead_lettered_at DESC, entry._key DESC
+            LIMIT @limit
+            RETURN KEEP(entry, "_key", "document_id", "provider", "software_name", "attempts",
+                        "last_error", "last_status_code", "dead_lettered_at")
+    """
+    bind_vars = {
+        "dead_letter": STATUS_DEAD_LETTER,
+        "document_id": document_id,
+        "before_at": before_at,
+        "before_key": before_key,
+        "limit": limit + 1,
+    }
+    entries = list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    last = entries[-1] if has_more else None
+    return {
+        "entries": entries,
+        "next_after": f"{last['dead_lettered_at']}:{last['_key']}" if last else None,
+    }
+
+
+def replay_dead_letters(keys: Optional[List[str]] = None, document_id: Optional[str] = None,
+                        provider: Optional[str] = None) -> int:
+    """
+    Queue dead-lettered entries again, with a fresh attempt budget.
+
+    Args:
+        keys: Only replay these outbox entries
+        document_id: Only replay the entries of this document
+        provider: Only replay the entries for this provider
+
+    Returns:
+        int: Number of entries queued again
+    """
+    query = f"""
+        FOR entry IN {OUTBOX_COLLECTION}
+            FILTER entry.status == @dead_letter
+            FILTER @keys == null OR entry._key IN @keys
+            FILTER @document_id == null OR entry.document_id == @document_id
+            FILTER @provider == null OR entry.provider == @provider
+            UPDATE entry WITH {{
+                status: @pending,
+                attempts: 0,
+                available_at: DATE_NOW(),
+                replayed_at: DATE_NOW(),
+                replay_count: (entry.replay_count || 0) + 1
+            }} IN {OUTBOX_COLLECTION}
+            RETURN NEW._key
+    """
+    bind_vars = {
+        "dead_letter": STATUS_DEAD_LETTER,
+        "pending": STATUS_PENDING,
+        "keys": keys,
+        "document_id": document_id,
+        "provider": provider,
+    }
+    replayed = list(get_db().execute_aql_query(query, bind_vars=bind_vars, raw_results=True))
+    logger.info(f"Replayed {len(replayed)} dead-lettered outbox entries")
+    return len(replayed)
@@ -0,0 +1,39 @@
+from typing import Dict, Optional
+
+from flask import request, url_for
+
+# Default and maximum number of items returned by one page of a list endpoint
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def clamp_limit(limit: Optional[int], default: int = PAGE_SIZE) -> int:
+    """
+    Bound a requested page size.
+
+    Args:
+        limit: Requested page size, None for the default
+        default: Page size used when none is requested
+
+    Returns:
+        Page size between 1 and MAX_PAGE_SIZE
+    """
+    return max(1, min(limit if limit is not None else default, MAX_PAGE_SIZE))
+
+
+def next_page_headers(next_after: Optional[str], limit: int) -> Dict[str, str]:
+    """
+    Headers pointing list endpoints that return a bare JSON array to their next page.
+
+    Args:
+        next_after: Cursor of the next page, None on the last page
+        limit: Page size
+
+    Returns:
+        `X-Next-After` and `Link: <...>; rel="next"` headers, empty on the last page
+    """
+    if next_after is None:
+        return {}
+    args = dict(request.args, after=next_after, limit=limit)
+    url = url_for(request.endpoint, **request.view_args, **args)
+    return {"X-Next-After": next_after, "Link": f'<{url}>; rel="next"'}
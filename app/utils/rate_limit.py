@@ -0,0 +1,136 @@
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.utils.http_client import url_origin
+
+logger = logging.getLogger(__name__)
+
+# Directory holding one bucket file per target; every process sharing it shares the budget
+RATE_LIMIT_STATE_DIR = os.getenv("NOTIFY_RATE_LIMIT_DIR", "/tmp/coar-notify-ratelimit")
+# Longest time a send waits for a token before it is deferred
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("NOTIFY_RATE_LIMIT_MAX_WAIT", 5))
+
+# Bucket file layout: available tokens, last refill time (epoch seconds)
+_STATE = struct.Struct("dd")
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in a small file, shared by all processes on the node.
+
+    Each acquisition takes an exclusive flock on the file, refills the bucket for the
+    time elapsed since the last refill and takes one token, so the combined rate of every
+    gunicorn worker and dispatcher stays under `rate` requests per second, with bursts of
+    up to `burst` requests.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, state_dir: str = RATE_LIMIT_STATE_DIR):
+        """
+        Initialize the bucket.
+
+        Args:
+            name: Target the bucket limits, e.g. the inbox origin
+            rate: Tokens added per second
+            burst: Bucket capacity
+            state_dir: Directory of the shared bucket files
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        os.makedirs(state_dir, exist_ok=True)
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(state_dir, f"{digest}.bucket")
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        # flock is held per open file, so threads of this process also need a lock
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[Tuple[float, float]]:
+        """Hold the bucket lock and yield (tokens refilled up to now, now)."""
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                data = os.pread(self._fd, _STATE.size, 0)
+                if len(data) == _STATE.size:
+                    tokens, updated_at = _STATE.unpack(data)
+                    tokens = min(self.burst, tokens + max(now - updated_at, 0) * self.rate)
+                else:
+                    tokens = float(self.burst)
+                yield tokens, now
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _write(self, tokens: float, now: float) -> None:
+        """Store the bucket state, only while holding the lock."""
+        os.pwrite(self._fd, _STATE.pack(tokens, now), 0)
+
+    def acquire(self, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS) -> Optional[float]:
+        """
+        Take one token, waiting for the bucket to refill if needed.
+
+        Args:
+            max_wait: Longest time to wait, in seconds
+
+        Returns:
+            None once a token was taken, otherwise the number of seconds after which
+            a token should be available
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._locked() as (tokens, now):
+                if tokens >= 1:
+                    self._write(tokens - 1, now)
+                    return None
+                wait = (1 - tokens) / self.rate
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                return wait
+            time.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """
+        Empty the bucket for `seconds`, e.g. after the target answered 429 Too Many Requests.
+
+        Args:
+            seconds: Time during which no token is handed out
+        """
+        with self._locked() as (tokens, now):
+            self._write(min(tokens, -seconds * self.rate), now)
+        logger.warning(f"Rate limit for {self.name} paused for {seconds:.0f}s after throttling")
+
+
+_buckets: Dict[str, SharedTokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(url: str, rate: float, burst: int) -> Optional[SharedTokenBucket]:
+    """
+    Get the shared token bucket limiting requests to a target inbox.
+
+    Args:
+        url: Target inbox URL
+        rate: Requests per second allowed to the target, 0 or less disables limiting
+        burst: Requests allowed at once after an idle period
+
+    Returns:
+        SharedTokenBucket, or None when the target is not rate limited
+    """
+    if rate <= 0:
+        return None
+    origin = url_origin(url)
+    with _buckets_lock:
+        bucket = _buckets.get(origin)
+        if bucket is None:
+            bucket = _buckets[origin] = SharedTokenBucket(origin, rate, burst)
+        else:
+            # Limits may change when the provider configuration is reloaded
+            bucket.rate, bucket.burst = rate, max(burst, 1)
+        return bucket
@@ -0,0 +1,292 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Iterable, NamedTuple, Optional, Tuple
+
+from flask import Response, make_response, request
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached response may be served; 0 disables the cache
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+# Bounds of the per-worker cache
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Directory of the generation table shared by every process writing or caching the data
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "/tmp/coar-notify-cache")
+# Number of generation counters; tags hashing to the same counter are invalidated together
+RESPONSE_CACHE_SLOTS = 65536
+
+_COUNTER = struct.Struct("Q")
+# Headers of the view response set again on every cached response
+_REBUILT_HEADERS = frozenset(("content-type", "content-length", "etag", "cache-control"))
+
+
+def document_tag(hal_id: str) -> str:
+    """Tag of the responses built from a document and its software mentions."""
+    return f"document:{hal_id}"
+
+
+def software_name_tag(name: str) -> str:
+    """Tag of the responses built from the software mentions with a normalized name."""
+    return f"software_name:{name}"
+
+
+class GenerationTable:
+    """
+    Invalidation counters shared by all processes on the node.
+
+    Each tag hashes to one 64-bit counter in a memory-mapped file. Writers increment the
+    counters of the tags they touched, under an exclusive flock; readers read them from the
+    mapping without any system call. A response cached with the counters of its tags is
+    valid as long as they have not moved. When the file cannot be used, counters are kept
+    in process memory and invalidation only reaches the current process.
+    """
+
+    def __init__(self, state_dir: str = RESPONSE_CACHE_DIR, slots: int = RESPONSE_CACHE_SLOTS):
+        """
+        Open or create the table.
+
+        Args:
+            state_dir: Directory of the shared file
+            slots: Number of counters
+        """
+        self.slots = slots
+        self._fd: Optional[int] = None
+        # flock is held per open file, so threads of this process also need a lock
+        self._thread_lock = threading.Lock()
+        size = slots * _COUNTER.size
+        try:
+            os.makedirs(state_dir, exist_ok=True)
+            self._fd = os.open(os.path.join(state_dir, "generations"), os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._counters = mmap.mmap(self._fd, size)
+        except OSError as e:
+            logger.warning(f"Response cache invalidation limited to this process, "
+                           f"cannot use {state_dir}: {e}")
+            self._fd = None
+            self._counters = bytearray(size)
+
+    def _offset(self, tag: str) -> int:
+        return (zlib.crc32(tag.encode("utf-8")) % self.slots) * _COUNTER.size
+
+    def read(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        """
+        Read the counters of some tags.
+
+        Args:
+            tags: Cache tags
+
+        Returns:
+            Counter of each tag, in order
+        """
+        return tuple(_COUNTER.unpack_from(self._counters, self._offset(tag))[0] for tag in tags)
+
+    def bump(self, tags: Iterable[str]) -> None:
+        """
+        Increment the counters of some tags, invalidating the responses built from them.
+
+        Args:
+            tags: Cache tags
+        """
+        offsets = {self._offset(tag) for tag in tags}
+        if not offsets:
+            return
+        with self._thread_lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for offset in offsets:
+                    value = _COUNTER.unpack_from(self._counters, offset)[0]
+                    _COUNTER.pack_into(self._counters, offset, (value + 1) & 0xFFFFFFFFFFFFFFFF)
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    mimetype: str
+    headers: Tuple[Tuple[str, str], ...]
+    etag: str
+    tags: Tuple[str, ...]
+    generations: Tuple[int, ...]
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    LRU cache of JSON responses, bounded in entries and bytes, with a TTL.
+
+    Entries are tagged with the data they were built from and dropped as soon as a
+    write bumps one of their tags in the generation table, in any process.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES, generations: Optional[GenerationTable] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds an entry may be served, 0 disables the cache
+            max_entries: Maximum number of entries
+            max_bytes: Maximum total size of the cached bodies
+            generations: Shared invalidation counters, created on first use by default
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._generations = generations
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @property
+    def generations(self) -> GenerationTable:
+        if self._generations is None:
+            with self._lock:
+                if self._generations is None:
+                    self._generations = GenerationTable()
+        return self._generations
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.body)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Get a cached response if it is neither expired nor invalidated.
+
+        Args:
+            key: Cache key (request path and query string)
+
+        Returns:
+            CachedResponse or None
+        """
+        generations = self.generations
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.monotonic() and generations.read(entry.tags) == entry.generations:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                self._pop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        """
+        Store a response, evicting the least recently used ones beyond the bounds.
+
+        Args:
+            key: Cache key
+            entry: Response to cache
+        """
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = entry
+            self._size += len(entry.body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """
+        Invalidate the responses built from some data, in every process.
+
+        Never raises: a failed invalidation is logged and left to the TTL.
+
+        Args:
+            tags: Tags of the data written
+        """
+        try:
+            self.generations.bump(tags)
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached responses: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# Global response cache of this worker
+response_cache = ResponseCache()
+
+
+def invalidate(*tags: str) -> None:
+    """
+    Invalidate the cached responses built from some data.
+
+    Args:
+        tags: Tags of the data written, see document_tag and software_name_tag
+    """
+    response_cache.invalidate(tags)
+
+
+def _conditional(entry: CachedResponse) -> Response:
+    response = Response(entry.body, mimetype=entry.mimetype, headers=list(entry.headers))
+    response.set_etag(entry.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    # Answers 304 without a body when If-None-Match matches
+    return response.make_conditional(request)
+
+
+def cached_response(tags: Callable[..., Iterable[str]]) -> Callable:
+    """
+    Cache the successful responses of a read endpoint and validate them with strong ETags.
+
+    Args:
+        tags: Function receiving the view arguments and returning the tags of the data
+            the response is built from
+
+    Returns:
+        Decorator for a Flask view
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled:
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            entry = response_cache.get(key)
+            if entry is not None:
+                return _conditional(entry)
+
+            entry_tags = tuple(tags(*args, **kwargs))
+            # Read before the database so that a write racing with the view invalidates the entry
+            generations = response_cache.generations.read(entry_tags)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            body = response.get_data()
+            headers = tuple((name, value) for name, value in response.headers.items()
+                            if name.lower() not in _REBUILT_HEADERS)
+            entry = CachedResponse(
+                body, response.mimetype, headers, hashlib.blake2b(body, digest_size=16).hexdigest(),
+                entry_tags, generations, time.monotonic() + response_cache.ttl
+            )
+            response_cache.put(key, entry)
+            return _conditional(entry)
+        return wrapper
+    return decorator